@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Compare decoding play state movement packets with and without pooled
+instances. Each tick decodes a batch of packets, handles them, then drops
+or releases them, like a server draining its inbound queue.
+
+usage: bench.py [source] [ticks] [batch]
+"""
+
+import gc
+import io
+import sys
+import time
+import types
+
+import mcproto
+
+POOLED = ['play315.sb.player.*', 'play315.cb.client.keepalive']
+
+def generate(src, pooled, pool_size):
+	code = mcproto.compiler.compile(src)
+	gen = mcproto.pygen.PyGenerator(pooled=pooled, pool_size=pool_size)
+	gen.visit(code)
+
+	module = types.ModuleType('bench_pooled' if pooled else 'bench_plain')
+	exec(compile(gen.emit(), module.__name__, 'exec'), vars(module))
+	return module
+
+def packets(module, batch):
+	player = module.play315.sb.player
+	frames = []
+	for i in range(batch):
+		if i % 3 == 0:
+			packet = player.move(i, 64.0, -i, i % 2 == 0)
+		elif i % 3 == 1:
+			packet = player.look(i % 360, 0.0, True)
+		else:
+			packet = player.look_move(i, 64.0, -i, i % 360, 0.0, False)
+		f = io.BytesIO()
+		packet.dump(f)
+		frames.append(f.getvalue())
+	return frames
+
+def run(module, frames, ticks, release):
+	load = module.play315.sb.load
+	collections = [0, 0, 0]
+
+	def count(phase, info):
+		if phase == 'start':
+			collections[info['generation']] += 1
+
+	gc.collect()
+	gc.callbacks.append(count)
+	try:
+		start = time.perf_counter()
+		for _ in range(ticks):
+			queue = [load(frame)[0] for frame in frames]
+			for packet in queue:
+				packet.on_ground
+				if release:
+					packet.release()
+		elapsed = time.perf_counter() - start
+	finally:
+		gc.callbacks.remove(count)
+
+	return elapsed, collections
+
+def main():
+	src = sys.argv[1] if len(sys.argv) > 1 else 'src/mc315.mcproto'
+	ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+	batch = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+
+	plain = generate(src, [], batch)
+	pooled = generate(src, POOLED, batch)
+	frames = packets(plain, batch)
+
+	print('%d ticks of %d packets' % (ticks, batch))
+	for name, module, release in (('plain', plain, False), ('pooled', pooled, True)):
+		elapsed, collections = run(module, frames, ticks, release)
+		print('%-8s %8.1f ns/packet  gc collections gen0=%d gen1=%d gen2=%d' \
+		      % (name, elapsed * 1e9 / (ticks * batch), *collections))
+
+if __name__ == '__main__':
+	main()
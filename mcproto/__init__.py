@@ -4,4 +4,17 @@ from .types import *
 from .namespace import *
 from .compiler import *
 from .gen import *
+from .pygen import *
+from .capture import *
+from .parallel import *
+from .ring import *
+from .profiling import *
+from .instrument import *
+from .nbt import *
+from .metadata import *
+from .slot import *
+from .layout import *
+from .prune import *
+from .transcode import *
 
+from .outbound import *
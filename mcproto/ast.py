@@ -1,33 +1,86 @@
 import ast
+import bisect
 
-__all__ = ['Node', 'Identifier',
+__all__ = ['Source', 'Node', 'Identifier',
 		'Value', 'Number', 'String',
 		'TypeSpec', 'TypeDef',
 		'VariantDef', 'NamespaceDef', 'ConstraintDef', 'FieldDef']
 
+class Source:
+	"""
+	A source file. Nodes only keep an offset into it, the line starts are
+	indexed the first time a line and column are asked for.
+	"""
+
+	def __init__(self, name, src):
+		self.name = name
+		self.src = src
+		self._lines = None
+
+	def position(self, offset):
+		if self._lines is None:
+			lines = [0]
+			find = self.src.find
+			off = find('\n')
+			while off >= 0:
+				lines.append(off + 1)
+				off = find('\n', off + 1)
+			self._lines = lines
+
+		lineno = bisect.bisect_right(self._lines, offset)
+		return lineno, offset - self._lines[lineno - 1]
+
+	def __getstate__(self):
+		return (self.name, self.src)
+
+	def __setstate__(self, state):
+		self.name, self.src = state
+		self._lines = None
+
+	def __repr__(self):
+		return 'Source(%r)' % self.name
+
 class Node:
+	__slots__ = ('_source', 'offset')
 	_fields = ()
 
-	def __init__(self, **kwargs):
-		self._srcname = kwargs.get('_srcname', None)
-		self.lineno = kwargs.get('lineno', None)
-		self.col_offset = kwargs.get('col_offset', None)
+	def __init__(self, source=None, offset=None):
+		self._source = source
+		self.offset = offset
+
+	@property
+	def _srcname(self):
+		if self._source is None:
+			return None
+		return self._source.name
+
+	@property
+	def lineno(self):
+		if self._source is None or self.offset is None:
+			return None
+		return self._source.position(self.offset)[0]
+
+	@property
+	def col_offset(self):
+		if self._source is None or self.offset is None:
+			return None
+		return self._source.position(self.offset)[1]
 
 	@property
 	def pos_dict(self):
-		return {'_srcname': self._srcname, \
-			'lineno': self.lineno, \
-			'col_offset': self.col_offset}
+		return {'source': self._source, 'offset': self.offset}
 
 	@property
 	def pos(self):
-		return '%s:%r col %r' % (self._srcname, \
-					 self.lineno, \
-					 self.col_offset)
+		if self._source is None or self.offset is None:
+			return '%s:None col None' % self._srcname
+		lineno, col_offset = self._source.position(self.offset)
+		return '%s:%r col %r' % (self._source.name, lineno, col_offset)
 
 class Identifier(Node):
-	def __init__(self, name=None, **kwargs):
-		super().__init__(**kwargs)
+	__slots__ = ('name', )
+	def __init__(self, name=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.name = name
 
 	def __repr__(self):
@@ -37,10 +90,11 @@ class Identifier(Node):
 		return self.name
 
 class Value(Node):
+	__slots__ = ('value', 'token')
 	_type=None
 
-	def __init__(self, value=None, token=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, value=None, token=None, source=None, offset=None):
+		super().__init__(source, offset)
 
 		if token is not None and value is None:
 			value = ast.literal_eval(token)
@@ -52,11 +106,9 @@ class Value(Node):
 		self.token = token
 
 class Number(Value):
+	__slots__ = ()
 	_type=int
 
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, _type=int, **kwargs)
-
 	def __repr__(self):
 		return 'Number(%r)' % self.value
 
@@ -64,11 +116,9 @@ class Number(Value):
 		return self.value
 
 class String(Value):
+	__slots__ = ()
 	_type=str
 
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, _type=str, **kwargs)
-
 	def __repr__(self):
 		return 'String(%r)' % self.value
 
@@ -76,20 +126,22 @@ class String(Value):
 		return self.value
 
 class TypeSpec(Node):
+	__slots__ = ('args', )
 	_fields = ('args', )
 
-	def __init__(self, args=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, args=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.args = args
 
 	def __repr__(self):
 		return 'TypeSpec(%r)' % self.args
 
 class TypeDef(Node):
+	__slots__ = ('name', 'spec')
 	_fields = ('name', 'spec')
 
-	def __init__(self, name=None, spec=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, name=None, spec=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.name = name
 		self.spec = spec
 
@@ -97,10 +149,11 @@ class TypeDef(Node):
 		return 'TypeDef(%r, %r)' % (self.name, self.spec)
 
 class VariantDef(Node):
+	__slots__ = ('name', 'body')
 	_fields = ('name', 'body')
 
-	def __init__(self, name=None, body=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, name=None, body=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.name = name
 		self.body = body
 
@@ -108,10 +161,11 @@ class VariantDef(Node):
 		return 'VariantDef(%r, %r)' % (self.name, self.body)
 
 class NamespaceDef(Node):
+	__slots__ = ('name', 'body')
 	_fields = ('name', 'body')
 
-	def __init__(self, name=None, body=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, name=None, body=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.name = name
 		self.body = body
 
@@ -119,10 +173,11 @@ class NamespaceDef(Node):
 		return 'NamespaceDef(%r, %r)' % (self.name, self.body)
 
 class ConstraintDef(Node):
+	__slots__ = ('left', 'right')
 	_fields = ('left', 'right')
 
-	def __init__(self, left=None, right=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, left=None, right=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.left = left
 		self.right = right
 
@@ -130,10 +185,11 @@ class ConstraintDef(Node):
 		return 'ConstraintDef(%r, %r)' % (self.left, self.right)
 
 class FieldDef(Node):
+	__slots__ = ('names', 'field_type')
 	_fields = ('names', 'field_type')
 
-	def __init__(self, names=None, field_type=None, **kwargs):
-		super().__init__(**kwargs)
+	def __init__(self, names=None, field_type=None, source=None, offset=None):
+		super().__init__(source, offset)
 		self.names = names
 		self.field_type = field_type
 
@@ -0,0 +1,411 @@
+"""
+Packet capture files.
+
+A capture stores unframed packets (packet id + body, as handed to the
+decoders) together with a timestamp, direction and protocol state.
+
+All integers are big-endian.
+
+=== Layout ===
+
+header:
+ - magic		8 bytes, b'MCPCAP\\r\\n'
+ - version		ushort
+ - reserved		ushort
+ - index offset		ulong, 0 if the capture was not closed
+
+records, in capture order:
+ - timestamp		long, nanoseconds since the epoch
+ - direction		ubyte, index into DIRECTIONS
+ - state		ubyte, index into the state table
+ - packet id		int
+ - length		uint
+ - payload		<length> bytes
+
+index:
+ - record count		ulong
+ - state count		uint
+ - key count		uint
+ - states		ubyte length + utf8 name, for each state
+ - entries		(timestamp : long, record offset : ulong),
+			sorted by timestamp
+ - keys			(state : ubyte, direction : ubyte, packet id : int,
+			 first : uint, count : uint), sorted
+ - postings		entry number : uint, grouped by key
+
+Opening a capture maps the file and reads only the header, the state table
+and the key table. Entries and postings are read straight out of the map
+when a query touches them, so the cost of opening a capture does not depend
+on its size.
+"""
+
+import collections
+import mmap
+import struct
+import time
+
+from .lib import load_varint
+
+__all__ = ['CaptureWriter', 'CaptureReader', 'CaptureRecord', 'Replayer']
+
+MAGIC = b'MCPCAP\r\n'
+VERSION = 1
+
+DIRECTIONS = ('sb', 'cb')
+
+HEADER = struct.Struct('>8sHHQ')
+RECORD = struct.Struct('>qBBiI')
+INDEX = struct.Struct('>QII')
+ENTRY = struct.Struct('>qQ')
+KEY = struct.Struct('>BBiII')
+POSTING = struct.Struct('>I')
+
+CaptureRecord = collections.namedtuple('CaptureRecord',
+		['timestamp', 'direction', 'state', 'packet_id', 'payload'])
+
+def _direction(direction):
+	try:
+		return DIRECTIONS.index(direction)
+	except ValueError:
+		raise ValueError('unknown direction %r' % direction) from None
+
+def _build_index(entries, states):
+	# entries is a list of (timestamp, offset, state, direction, packet_id)
+	# in capture order
+	entries = sorted(entries, key=lambda entry: entry[0])
+
+	postings = collections.OrderedDict()
+	for num, (_, _, state, direction, packet_id) in enumerate(entries):
+		postings.setdefault((state, direction, packet_id), []).append(num)
+
+	out = bytearray(INDEX.pack(len(entries), len(states), len(postings)))
+
+	for state in states:
+		name = state.encode('utf8')
+		out.append(len(name))
+		out += name
+
+	for timestamp, offset, _, _, _ in entries:
+		out += ENTRY.pack(timestamp, offset)
+
+	first = 0
+	for key in sorted(postings):
+		out += KEY.pack(*key, first, len(postings[key]))
+		first += len(postings[key])
+
+	for key in sorted(postings):
+		for num in postings[key]:
+			out += POSTING.pack(num)
+
+	return bytes(out)
+
+class CaptureWriter:
+	def __init__(self, path):
+		self._file = open(path, 'wb')
+		self._file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+		self._offset = HEADER.size
+		self._states = []
+		self._state_ids = {}
+		self._entries = []
+
+	def _state(self, state):
+		num = self._state_ids.get(state, None)
+		if num is None:
+			if len(self._states) > 0xff:
+				raise ValueError('too many states')
+			if len(state.encode('utf8')) > 0xff:
+				raise ValueError('state name too long %r' % state)
+			num = self._state_ids[state] = len(self._states)
+			self._states.append(state)
+		return num
+
+	def write(self, state, direction, payload, packet_id=None, timestamp=None):
+		if self._file is None:
+			raise ValueError('write to closed capture')
+
+		if packet_id is None:
+			packet_id, _ = load_varint(payload)
+
+		if timestamp is None:
+			timestamp = time.time_ns()
+
+		state_id = self._state(state)
+		direction_id = _direction(direction)
+
+		self._file.write(RECORD.pack(timestamp, direction_id, state_id,
+					     packet_id, len(payload)))
+		self._file.write(payload)
+
+		self._entries.append((timestamp, self._offset, state_id,
+				      direction_id, packet_id))
+		self._offset += RECORD.size + len(payload)
+
+	def close(self):
+		if self._file is None:
+			return
+
+		self._file.write(_build_index(self._entries, self._states))
+
+		# backpatch the index offset
+		self._file.seek(0)
+		self._file.write(HEADER.pack(MAGIC, VERSION, 0, self._offset))
+		self._file.close()
+		self._file = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+class CaptureReader:
+	def __init__(self, path):
+		self._file = open(path, 'rb')
+		try:
+			self._map = mmap.mmap(self._file.fileno(), 0,
+					      access=mmap.ACCESS_READ)
+		except ValueError:
+			self._file.close()
+			raise ValueError('empty capture %r' % path) from None
+
+		if len(self._map) < HEADER.size:
+			self.close()
+			raise ValueError('truncated capture %r' % path)
+
+		magic, version, _, index_offset = HEADER.unpack_from(self._map)
+		if magic != MAGIC:
+			self.close()
+			raise ValueError('not a capture %r' % path)
+		if version != VERSION:
+			self.close()
+			raise ValueError('unsupported capture version %d' % version)
+
+		if index_offset:
+			self._index = self._map
+		else:
+			# the writer did not finish, recover by scanning
+			index_offset = 0
+			self._index = self._scan()
+
+		self._load_index(index_offset)
+
+	def _scan(self):
+		entries = []
+		offset = HEADER.size
+		states = {}
+		end = len(self._map)
+
+		while offset + RECORD.size <= end:
+			timestamp, direction, state, packet_id, length = \
+					RECORD.unpack_from(self._map, offset)
+			if offset + RECORD.size + length > end:
+				break
+			states[state] = '#%d' % state
+			entries.append((timestamp, offset, state, direction, packet_id))
+			offset += RECORD.size + length
+
+		# state names are only written with the index
+		states = [states.get(num, '#%d' % num)
+			  for num in range(max(states, default=-1) + 1)]
+
+		return _build_index(entries, states)
+
+	def _load_index(self, offset):
+		self._count, nstates, nkeys = INDEX.unpack_from(self._index, offset)
+		offset += INDEX.size
+
+		self.states = []
+		for _ in range(nstates):
+			length = self._index[offset]
+			name = bytes(self._index[offset + 1:offset + 1 + length])
+			self.states.append(name.decode('utf8'))
+			offset += 1 + length
+
+		self._entries = offset
+		offset += self._count * ENTRY.size
+
+		self._keys = {}
+		for _ in range(nkeys):
+			state, direction, packet_id, first, count = \
+					KEY.unpack_from(self._index, offset)
+			self._keys[state, direction, packet_id] = (first, count)
+			offset += KEY.size
+
+		self._postings = offset
+
+	def _timestamp(self, num):
+		return ENTRY.unpack_from(self._index,
+					 self._entries + num * ENTRY.size)[0]
+
+	def _posting(self, num):
+		return POSTING.unpack_from(self._index,
+					   self._postings + num * POSTING.size)[0]
+
+	def __len__(self):
+		return self._count
+
+	def __getitem__(self, num):
+		if num < 0:
+			num += self._count
+		if not 0 <= num < self._count:
+			raise IndexError(num)
+
+		_, offset = ENTRY.unpack_from(self._index,
+					      self._entries + num * ENTRY.size)
+		timestamp, direction, state, packet_id, length = \
+				RECORD.unpack_from(self._map, offset)
+		offset += RECORD.size
+
+		return CaptureRecord(timestamp, DIRECTIONS[direction],
+				     self.states[state], packet_id,
+				     memoryview(self._map)[offset:offset + length])
+
+	def __iter__(self):
+		return self.select()
+
+	def _bisect(self, lo, hi, timestamp, get):
+		# get maps a position to an entry number, entry numbers are
+		# sorted by timestamp so this is a plain bisect
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self._timestamp(get(mid)) < timestamp:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	def _range(self, lo, hi, start, end, get):
+		if start is not None:
+			lo = self._bisect(lo, hi, start, get)
+		if end is not None:
+			hi = self._bisect(lo, hi, end, get)
+		return lo, hi
+
+	def select(self, packet_id=None, state=None, direction=None,
+		   start=None, end=None):
+		"""
+		Yield the records matching every given filter in timestamp order.
+
+		start and end are timestamps in nanoseconds, end is exclusive.
+		"""
+
+		if packet_id is None and state is None and direction is None:
+			lo, hi = self._range(0, self._count, start, end, int)
+			for num in range(lo, hi):
+				yield self[num]
+			return
+
+		if state is not None and state not in self.states:
+			return
+
+		state_id = None if state is None else self.states.index(state)
+		direction_id = None if direction is None else _direction(direction)
+
+		# each key is a sorted run of entry numbers, merge the runs
+		runs = []
+		for (key_state, key_direction, key_id), (first, count) \
+				in self._keys.items():
+			if state_id is not None and key_state != state_id:
+				continue
+			if direction_id is not None and key_direction != direction_id:
+				continue
+			if packet_id is not None and key_id != packet_id:
+				continue
+
+			lo, hi = self._range(first, first + count, start, end,
+					     self._posting)
+			runs.append(range(lo, hi))
+
+		if len(runs) == 1:
+			for pos in runs[0]:
+				yield self[self._posting(pos)]
+			return
+
+		nums = []
+		for run in runs:
+			nums.extend(self._posting(pos) for pos in run)
+		nums.sort()
+
+		for num in nums:
+			yield self[num]
+
+	def close(self):
+		if self._map is not None:
+			try:
+				self._map.close()
+			except BufferError:
+				# records still hold payloads, the map is
+				# released with the last of them
+				pass
+			self._map = None
+		self._index = None
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+class Replayer:
+	"""
+	Feed captured records to decoders.
+
+	decoders maps (state, direction) to a callable taking the payload.
+	Records without a decoder are yielded with a packet of None.
+
+	speed=None replays as fast as possible, otherwise the original timing
+	is reproduced scaled by speed (2.0 replays twice as fast).
+	"""
+
+	def __init__(self, records, decoders, speed=None,
+		     clock=time.monotonic, sleep=time.sleep):
+		if speed is not None and speed <= 0:
+			raise ValueError('speed must be positive')
+
+		self.records = records
+		self.decoders = decoders
+		self.speed = speed
+		self.clock = clock
+		self.sleep = sleep
+
+	def __iter__(self):
+		origin = None
+		started = None
+
+		for record in self.records:
+			if self.speed is not None:
+				if origin is None:
+					origin = record.timestamp
+					started = self.clock()
+
+				due = started + (record.timestamp - origin) / 1e9 / self.speed
+				delay = due - self.clock()
+				if delay > 0:
+					self.sleep(delay)
+
+			decoder = self.decoders.get((record.state, record.direction), None)
+			packet = None if decoder is None else decoder(record.payload)
+
+			yield record, packet
+
+def main():
+	import sys
+
+	if len(sys.argv) <= 1:
+		print('usage: %s <capture> [packet id]' % sys.argv[0])
+		return
+
+	packet_id = int(sys.argv[2], 0) if len(sys.argv) > 2 else None
+
+	with CaptureReader(sys.argv[1]) as capture:
+		for record in capture.select(packet_id=packet_id):
+			print('%d %s %s 0x%02x %d' % (record.timestamp,
+						      record.state,
+						      record.direction,
+						      record.packet_id,
+						      len(record.payload)))
+			record.payload.release()
+
+if __name__ == '__main__':
+	main()
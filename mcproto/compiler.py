@@ -1,30 +1,131 @@
 import collections
 import collections.abc
+import multiprocessing
 import re
 
-from .parser import parse
+from .parser import parse, MCProtoLexer
 from .ast import *
 from .types import *
 from .namespace import *
+from .instrument import count_nodes
 
 __all__ = ['MCProtoCompiler']
 
+def merge(bodies):
+	"""
+	Merge the top level statements of several parsed files into one body.
+
+	Namespaces of the same name in different files are merged recursively,
+	any other name defined twice, or a namespace defined twice in one
+	file, is a duplicate as it is for a single file.
+	"""
+
+	merged = []
+	first = {}
+	namespaces = collections.OrderedDict()
+
+	for body in bodies:
+		seen = set()
+		for child in body or ():
+			if not (hasattr(child, 'name') and child.name):
+				merged.append(child)
+				continue
+
+			name = str(child.name)
+			prev = first.get(name, None)
+
+			if prev is None:
+				first[name] = child
+				merged.append(child)
+				if isinstance(child, NamespaceDef):
+					namespaces[name] = [child.body]
+			elif isinstance(prev, NamespaceDef) \
+			     and isinstance(child, NamespaceDef) \
+			     and name not in seen:
+				namespaces[name].append(child.body)
+			else:
+				raise ValueError('duplicate %r at %s' \
+						  % (name, child.pos))
+			seen.add(name)
+
+	for name, parts in namespaces.items():
+		if len(parts) < 2:
+			continue
+		prev = first[name]
+		merged[merged.index(prev)] = NamespaceDef(prev.name,
+							  merge(parts),
+							  **prev.pos_dict)
+
+	return merged
+
+def _parse(name):
+	return parse(name)
+
 class MCProtoCompiler:
-	def __init__(self):
+	def __init__(self, pool=None, instrument=None):
 		self.namespace = MCProtoNamespace()
-		self.type_factory = MCProtoTypeFactory(self)
+		self.type_factory = MCProtoTypeFactory(self, pool)
+		# an Instrument measuring the passes, see instrument.py
+		self.instrument = instrument
+
+	@property
+	def pool(self):
+		return self.type_factory.pool
 
 	def _globals(self, *args, **kwargs):
 		return self.namespace
 
 	def compile(self, name, src=None):
-		self.build_namespace(parse(name, src), factory=self._globals)
+		self.build_namespace(self.parse(name, src), factory=self._globals)
+
+	def parse(self, name, src=None):
+		if self.instrument is None:
+			return parse(name, src)
+
+		if src is None:
+			with open(name, 'r') as f:
+				src = f.read()
+
+		# the parser lexes as it goes, lex once more to time it alone
+		with self.instrument.measure('lex', 'tokens') as stats:
+			tokens = sum(1 for _ in MCProtoLexer(name, src))
+		stats.count += tokens
+
+		with self.instrument.measure('parse', 'nodes') as stats:
+			body = parse(name, src)
+		stats.count += count_nodes(body)
+		return body
+
+	def compile_many(self, names, processes=None):
+		"""
+		Compile several files into one namespace, parsing them on a
+		process pool. See merge() for how the files are combined.
+		"""
+
+		names = list(names)
+		if processes == 1 or len(names) < 2 or self.instrument is not None:
+			# instrumented passes must run in this process
+			bodies = [self.parse(name) for name in names]
+		else:
+			with multiprocessing.Pool(processes) as workers:
+				bodies = workers.map(_parse, names)
+
+		# a single file is built as compile() builds it
+		body = bodies[0] if len(bodies) == 1 else merge(bodies)
+		self.build_namespace(body, factory=self._globals)
 
 	def build_namespace(self,
 			    body,
 			    parent=None,
 			    name=None,
 			    factory=MCProtoNamespace):
+		if self.instrument is None:
+			return self._build_namespace(body, parent, name, factory)
+		with self.instrument.measure('build_namespace', 'namespaces') as stats:
+			stats.count += 1
+			return self._build_namespace(body, parent, name, factory)
+
+	def _build_namespace(self, body, parent, name, factory):
 		dest = factory(parent=parent, name=name)
 
 		if not body:
@@ -75,11 +176,32 @@ class MCProtoCompiler:
 		return dest
 
 	def build_type(self, spec, parent):
-		return self.type_factory(spec, parent)
+		if self.instrument is None:
+			return self.type_factory(spec, parent)
+		with self.instrument.measure('build_type', 'types') as stats:
+			stats.count += 1
+			return self.type_factory(spec, parent)
+
+	def generate(self, generator):
+		"""Run a generator, like PyGenerator, and return what it emits."""
+		if self.instrument is None:
+			generator.visit(self.namespace)
+			return generator.emit()
+
+		with self.instrument.measure('codegen', 'lines') as stats:
+			generator.visit(self.namespace)
+			out = generator.emit()
+		stats.count += out.count('\n') + 1
+		return out
 
 # this should be the last line
-def compile(name, src=None):
-	compiler = MCProtoCompiler()
+def compile(name, src=None, pool=None):
+	compiler = MCProtoCompiler(pool)
 	compiler.compile(name, src)
 	return compiler.namespace
 
+def compile_many(names, processes=None, pool=None):
+	compiler = MCProtoCompiler(pool)
+	compiler.compile_many(names, processes)
+	return compiler.namespace
+
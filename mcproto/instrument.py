@@ -0,0 +1,133 @@
+"""
+Compiler pass instrumentation.
+
+An Instrument measures named passes: how often each ran, the wall time
+spent in it, how many units it handled (tokens, ast nodes, namespaces,
+types, lines) and the peak memory it allocated, traced with tracemalloc.
+
+Passes nest, build_namespace calls build_type for every field. The time of
+a pass excludes the passes nested in it, so the times of all passes add up
+to the whole compile. The peak of a pass is the most memory allocated
+above the level at its start, nested passes included.
+"""
+
+import collections
+import contextlib
+import time
+import tracemalloc
+
+from .ast import Node
+
+__all__ = ['Instrument', 'PassStats']
+
+class PassStats:
+	__slots__ = ('name', 'unit', 'calls', 'time', 'count', 'peak')
+
+	def __init__(self, name, unit=None):
+		self.name = name
+		self.unit = unit
+		self.calls = 0
+		self.time = 0.0
+		self.count = 0
+		self.peak = 0
+
+	def as_dict(self):
+		return {'name': self.name,
+			'unit': self.unit,
+			'calls': self.calls,
+			'time': self.time,
+			'count': self.count,
+			'peak': self.peak}
+
+class _Frame:
+	__slots__ = ('stats', 'start', 'nested', 'base', 'peak')
+
+	def __init__(self, stats, base):
+		self.stats = stats
+		self.start = time.perf_counter()
+		self.nested = 0.0
+		self.base = base
+		self.peak = 0
+
+def count_nodes(node):
+	# ast nodes in a parsed body
+	if isinstance(node, list):
+		return sum(count_nodes(child) for child in node)
+	if not isinstance(node, Node):
+		return 0
+	return 1 + sum(count_nodes(getattr(node, name, None)) for name in node._fields)
+
+class Instrument:
+	"""
+	Times passes, and traces their allocations when memory is True. The
+	instrument starts tracemalloc if it is not already tracing and stops
+	it again in close().
+	"""
+
+	def __init__(self, memory=True):
+		self.memory = memory
+		self.passes = collections.OrderedDict()
+		self._stack = []
+		self._tracing = False
+
+	@contextlib.contextmanager
+	def measure(self, name, unit=None):
+		"""
+		Measure the block as a run of pass name, the block adds the units
+		it handled to the count of the PassStats it gets.
+		"""
+		stats = self.passes.get(name, None)
+		if stats is None:
+			stats = self.passes[name] = PassStats(name, unit)
+
+		parent = self._stack[-1] if self._stack else None
+		base = 0
+		if self.memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self._tracing = True
+			base, peak = tracemalloc.get_traced_memory()
+			if parent is not None:
+				parent.peak = max(parent.peak, peak)
+			tracemalloc.reset_peak()
+
+		frame = _Frame(stats, base)
+		self._stack.append(frame)
+		try:
+			yield stats
+		finally:
+			self._stack.pop()
+			wall = time.perf_counter() - frame.start
+			stats.calls += 1
+			stats.time += wall - frame.nested
+			if parent is not None:
+				parent.nested += wall
+
+			if self.memory:
+				peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+				stats.peak = max(stats.peak, peak - frame.base)
+				if parent is not None:
+					parent.peak = max(parent.peak, peak)
+
+	def report(self):
+		"""The passes as a list of dicts, in the order they first ran."""
+		return {'passes': [stats.as_dict() for stats in self.passes.values()],
+			'time': sum(stats.time for stats in self.passes.values()),
+			'memory': self.memory}
+
+	def format(self):
+		lines = ['%-16s %6s %10s %10s %-10s %10s'
+			 % ('pass', 'calls', 'time ms', 'count', 'unit', 'peak KiB')]
+		for stats in self.passes.values():
+			lines.append('%-16s %6d %10.2f %10d %-10s %10s'
+				     % (stats.name, stats.calls, stats.time * 1e3,
+					stats.count, stats.unit or '',
+					'%.1f' % (stats.peak / 1024) if self.memory else '-'))
+		lines.append('%-16s %6s %10.2f'
+			     % ('total', '', sum(stats.time for stats in self.passes.values()) * 1e3))
+		return '\n'.join(lines)
+
+	def close(self):
+		if self._tracing:
+			tracemalloc.stop()
+			self._tracing = False
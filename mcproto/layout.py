@@ -0,0 +1,222 @@
+"""
+Encoded size analysis of compiled types.
+
+size_bounds(type) gives the (min, max) encoded size of any type, max is None
+when the size is unbounded. MCProtoLayout describes the fields of a struct
+or variant: where each field starts relative to the end of the last
+variable size field before it (its anchor, None for the start of the
+struct), the fixed leading prefix and the bounds of the whole struct,
+including its branches.
+
+Adjacent signed and unsigned fields form a bit run, packed into one big
+endian integer that must be a whole number of bytes. Every field of a run
+is positioned at the start of the run and the last one carries its size.
+"""
+
+import collections
+
+from . import lib
+from . import types
+from . import namespace
+
+__all__ = ['MCProtoLayout', 'size_bounds', 'bit_runs']
+
+FIXED_SIZES = {
+	'bool': 1, 'byte': 1, 'ubyte': 1, 'angle': 1,
+	'short': 2, 'ushort': 2,
+	'int': 4, 'uint': 4, 'float': 4,
+	'long': 8, 'ulong': 8, 'double': 8, 'position': 8,
+}
+
+VAR_SIZES = {
+	'varint': (1, 5),
+	'varlong': (1, 10),
+	# an empty slot is a short, nbt a lone TAG_End, metadata its end mark
+	'slot': (2, None),
+	'nbt': (1, None),
+	'metadata': (1, None),
+}
+
+def _add(a, b):
+	if a is None or b is None:
+		return None
+	return a + b
+
+def _mul(a, n):
+	if a is None:
+		return None
+	return a * n
+
+def _length_bounds(length):
+	# bounds of a length prefix, and the largest count it can hold
+	if isinstance(length, int):
+		if length < 0:
+			# eof
+			return (0, 0), None
+		return (0, 0), length
+	low, high = size_bounds(length)
+	return (low, high), None
+
+def size_bounds(field_type):
+	if isinstance(field_type, namespace.MCProtoStruct):
+		layout = field_type.layout
+		return layout.min_size, layout.max_size
+	elif isinstance(field_type, types.MCProtoSimpleType):
+		size = FIXED_SIZES.get(field_type.name, None)
+		if size is not None:
+			return size, size
+		try:
+			return VAR_SIZES[field_type.name]
+		except KeyError:
+			raise TypeError('no size for %r' % field_type.name) from None
+	elif isinstance(field_type, types.MCProtoEnumType):
+		return size_bounds(field_type.base)
+	elif isinstance(field_type, types.MCProtoBitsType):
+		if field_type.bits % 8:
+			raise ValueError('%s %d is not a whole number of bytes'
+					 % (field_type.name, field_type.bits))
+		return field_type.bits // 8, field_type.bits // 8
+	elif isinstance(field_type, types.MCProtoBoolOptionalType):
+		low, high = size_bounds(field_type.elem)
+		return 1, _add(1, high)
+	elif isinstance(field_type, types.MCProtoArrayType):
+		(prefix_low, prefix_high), count = _length_bounds(field_type.length)
+		low, high = size_bounds(field_type.elem)
+		if isinstance(field_type.length, int) and field_type.length >= 0:
+			return low * count, _mul(high, count)
+		if high == 0:
+			return prefix_low, prefix_high
+		return prefix_low, None
+	elif isinstance(field_type, types.MCProtoBaseStringType):
+		unit = 1
+		if isinstance(field_type, types.MCProtoStringType):
+			unit = lib.UNITS[field_type.encoding]
+			if field_type.length == field_type.NUL:
+				# just the terminator
+				return unit, None
+		(prefix_low, prefix_high), count = _length_bounds(field_type.length)
+		if count is not None:
+			return count * unit, count * unit
+		return prefix_low, None
+	elif isinstance(field_type, types.MCProtoUUIDType):
+		if field_type.encoding == 'bin':
+			return 16, 16
+		# a string, the decoders accept any uuid spelling
+		return 1, None
+	else:
+		raise TypeError('unknown field type %r' % field_type.__class__)
+
+def _run_bits(struct, run):
+	return sum(struct.fields[name].field_type.bits for name in run)
+
+def bit_runs(struct):
+	"""
+	Yields the runs of two or more adjacent bit fields of struct. A run of
+	a variant does not reach into the fields of its base, which decodes
+	them on its own.
+	"""
+	if isinstance(struct, namespace.MCProtoVariant):
+		inherited = struct.base.fields
+	else:
+		inherited = ()
+
+	run = []
+	for name, field in struct.fields.items():
+		if run and (name in inherited) != (run[-1] in inherited):
+			if len(run) > 1:
+				yield tuple(run)
+			run = []
+		if isinstance(field.field_type, types.MCProtoBitsType):
+			run.append(name)
+			continue
+		if len(run) > 1:
+			yield tuple(run)
+		run = []
+	if len(run) > 1:
+		yield tuple(run)
+
+class MCProtoLayout:
+	def __init__(self, struct):
+		self.struct = struct
+
+		# name -> (min, max)
+		self.sizes = collections.OrderedDict()
+		# name -> (anchor, offset)
+		self.positions = collections.OrderedDict()
+		# fields at a constant offset from the start of the struct
+		self.offsets = collections.OrderedDict()
+		self.variable = []
+		# name -> the bit run of the field
+		self.runs = {}
+
+		for run in bit_runs(struct):
+			bits = _run_bits(struct, run)
+			if bits % 8:
+				raise ValueError('bit fields %s of %s are %d bits, not a whole number of bytes'
+						 % (', '.join(run), struct.name, bits))
+			for name in run:
+				self.runs[name] = run
+
+		anchor = None
+		offset = 0
+		prefix = None
+		fields_min = 0
+		fields_max = 0
+
+		for name, field in struct.fields.items():
+			run = self.runs.get(name, None)
+			if run is None:
+				low, high = size_bounds(field.field_type)
+			elif name == run[-1]:
+				low = high = _run_bits(struct, run) // 8
+			else:
+				low = high = 0
+			self.sizes[name] = (low, high)
+			self.positions[name] = (anchor, offset)
+			if anchor is None:
+				self.offsets[name] = offset
+
+			fields_min += low
+			fields_max = _add(fields_max, high)
+
+			if low == high:
+				offset += low
+			else:
+				if prefix is None:
+					prefix = offset
+				self.variable.append(name)
+				anchor = name
+				offset = 0
+
+		self.prefix = offset if prefix is None else prefix
+		self.fields_min = fields_min
+		self.fields_max = fields_max
+
+		self.min_size = fields_min
+		self.max_size = fields_max
+
+		# a struct with branches is as small as its smallest branch
+		# and as large as its largest
+		if struct.branches:
+			bounds = [(fields_min, fields_max) if path is None
+				  else (branch.layout.min_size, branch.layout.max_size)
+				  for path, branch in struct.branches.items()]
+			self.min_size = min(low for low, _ in bounds)
+			if any(high is None for _, high in bounds):
+				self.max_size = None
+			else:
+				self.max_size = max(high for _, high in bounds)
+
+	@property
+	def fixed(self):
+		return self.min_size == self.max_size
+
+	def possible(self, length):
+		"""False if no encoding of the struct is length bytes long."""
+		if length < self.min_size:
+			return False
+		return self.max_size is None or length <= self.max_size
+
+	def __repr__(self):
+		return 'MCProtoLayout(min_size=%r, max_size=%r, prefix=%r, variable=%r)' \
+			% (self.min_size, self.max_size, self.prefix, self.variable)
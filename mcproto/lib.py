@@ -0,0 +1,616 @@
+"""
+Runtime support for the generated codecs.
+
+Decoders take a buffer (bytes, bytearray, memoryview or mmap) and an
+offset and return a tuple (value, new offset). They never copy the buffer.
+
+Encoders take a value and a file-like object with a write method.
+"""
+
+import fnmatch
+import io
+import struct
+import sys
+import uuid
+
+class DecodeError(ValueError):
+	pass
+
+# varint/varlong
+def load_varint(buf, off=0):
+	try:
+		b = buf[off]
+		if b < 0x80:
+			return b, off + 1
+
+		val = b & 0x7f
+		shift = 7
+		while True:
+			off += 1
+			b = buf[off]
+			val |= (b & 0x7f) << shift
+			if b < 0x80:
+				break
+			shift += 7
+			if shift >= 35:
+				raise DecodeError('varint too long at %d' % off)
+	except IndexError:
+		raise DecodeError('truncated varint at %d' % off) from None
+
+	# the 5th byte only has room for the top 4 bits
+	if val > 0xffffffff:
+		raise DecodeError('varint too large at %d' % off)
+	if val >= 0x80000000:
+		val -= 0x100000000
+	return val, off + 1
+
+def load_varlong(buf, off=0):
+	val = 0
+	shift = 0
+	try:
+		while True:
+			b = buf[off]
+			off += 1
+			val |= (b & 0x7f) << shift
+			if b < 0x80:
+				break
+			shift += 7
+			if shift >= 70:
+				raise DecodeError('varlong too long at %d' % off)
+	except IndexError:
+		raise DecodeError('truncated varlong at %d' % off) from None
+
+	if val > 0xffffffffffffffff:
+		raise DecodeError('varlong too large at %d' % (off - 1))
+	if val >= 0x8000000000000000:
+		val -= 0x10000000000000000
+	return val, off
+
+def pack_varint(val):
+	if 0 <= val < 0x80:
+		return bytes((val,))
+	if not -0x80000000 <= val < 0x80000000:
+		raise ValueError('varint out of range: %r' % val)
+	return _pack_var(val & 0xffffffff)
+
+def pack_varlong(val):
+	if 0 <= val < 0x80:
+		return bytes((val,))
+	if not -0x8000000000000000 <= val < 0x8000000000000000:
+		raise ValueError('varlong out of range: %r' % val)
+	return _pack_var(val & 0xffffffffffffffff)
+
+def _pack_var(val):
+	out = bytearray()
+	while val >= 0x80:
+		out.append(val & 0x7f | 0x80)
+		val >>= 7
+	out.append(val)
+	return bytes(out)
+
+def dump_varint(val, f):
+	f.write(pack_varint(val))
+
+def dump_varlong(val, f):
+	f.write(pack_varlong(val))
+
+# size is the longest encoding, top the largest value of its last byte
+def _skip_var(name, size, top):
+	def skip(buf, off=0):
+		last = off + size - 1
+		try:
+			while buf[off] >= 0x80:
+				if off >= last:
+					raise DecodeError('%s too long at %d' % (name, off))
+				off += 1
+			if off == last and buf[off] > top:
+				raise DecodeError('%s too large at %d' % (name, off))
+		except IndexError:
+			raise DecodeError('truncated %s at %d' % (name, off)) from None
+		return off + 1
+
+	return skip
+
+skip_varint = _skip_var('varint', 5, 0x0f)
+skip_varlong = _skip_var('varlong', 10, 0x01)
+
+# fixed width types
+def _fixed(fmt):
+	packer = struct.Struct('>' + fmt)
+	pack = packer.pack
+	unpack_from = packer.unpack_from
+	size = packer.size
+
+	def load(buf, off=0):
+		try:
+			return unpack_from(buf, off)[0], off + size
+		except struct.error:
+			raise DecodeError('truncated %s at %d' % (fmt, off)) from None
+
+	def dump(val, f):
+		f.write(pack(val))
+
+	return load, dump
+
+load_bool, dump_bool = _fixed('?')
+load_byte, dump_byte = _fixed('b')
+load_ubyte, dump_ubyte = _fixed('B')
+load_short, dump_short = _fixed('h')
+load_ushort, dump_ushort = _fixed('H')
+load_int, dump_int = _fixed('i')
+load_uint, dump_uint = _fixed('I')
+load_long, dump_long = _fixed('q')
+load_ulong, dump_ulong = _fixed('Q')
+load_float, dump_float = _fixed('f')
+load_double, dump_double = _fixed('d')
+
+# fixed point types
+def load_angle(buf, off=0):
+	val, off = load_ubyte(buf, off)
+	return val * 360 / 256, off
+
+def dump_angle(val, f):
+	dump_ubyte(round(val * 256 / 360) & 0xff, f)
+
+# bit fields
+#
+# fields are (bits, signed) pairs packed into a big endian integer, the
+# first field in the most significant bits
+
+# x, y, z of a position
+POSITION_BITS = ((26, True), (12, True), (26, True))
+
+def bit_layout(fields):
+	"""
+	The byte size of fields and a (shift, mask, sign) triple for each,
+	a field is (val >> shift & mask ^ sign) - sign.
+	"""
+	total = sum(bits for bits, _ in fields)
+	if total % 8:
+		raise ValueError('%d bits is not a whole number of bytes' % total)
+
+	layout = []
+	shift = total
+	for bits, signed in fields:
+		shift -= bits
+		layout.append((shift, (1 << bits) - 1, 1 << (bits - 1) if signed else 0))
+	return total // 8, tuple(layout)
+
+def bit_fields(fields):
+	"""load/dump functions of a tuple of bit fields."""
+	size, layout = bit_layout(fields)
+
+	def load(buf, off=0):
+		if off + size > len(buf):
+			raise DecodeError('truncated bit fields at %d' % off)
+		val = int.from_bytes(buf[off:off + size], 'big')
+		return tuple((val >> shift & mask ^ sign) - sign
+			     for shift, mask, sign in layout), off + size
+
+	def dump(vals, f):
+		val = 0
+		for (shift, mask, _), field in zip(layout, vals):
+			val |= (field & mask) << shift
+		f.write(val.to_bytes(size, 'big'))
+
+	return load, dump
+
+def bit_field(bits, signed):
+	"""load/dump functions of a lone signed or unsigned field."""
+	load_fields, dump_fields = bit_fields(((bits, signed),))
+
+	def load(buf, off=0):
+		(val,), off = load_fields(buf, off)
+		return val, off
+
+	def dump(val, f):
+		dump_fields((val,), f)
+
+	return load, dump
+
+# a position is three fixed point fields
+load_position, dump_position = bit_fields(POSITION_BITS)
+
+# structured types
+def load_slot(buf, off=0):
+	return slot.load(buf, off)
+
+def dump_slot(val, f):
+	slot.dump(val, f)
+
+def skip_slot(buf, off=0):
+	return slot.skip(buf, off)
+
+def load_metadata(buf, off=0):
+	return metadata.load(buf, off)
+
+def dump_metadata(val, f):
+	metadata.dump(val, f)
+
+def skip_metadata(buf, off=0):
+	return metadata.skip(buf, off)
+
+def load_nbt(buf, off=0):
+	return nbt.load(buf, off)
+
+def dump_nbt(val, f):
+	nbt.dump(val, f)
+
+def skip_nbt(buf, off=0):
+	return nbt.skip(buf, off)
+
+# strings
+#
+# length is either a load/dump function for the length prefix, a constant
+# count, None to read until the end of the buffer, or NUL for a string
+# terminated by a NUL character. the length of a string counts the code
+# units of its encoding, 16 bit units for utf16
+NUL = 'nul'
+
+CODECS = {'utf8': 'utf-8', 'utf16': 'utf-16-be'}
+UNITS = {'utf8': 1, 'utf16': 2}
+
+# memoryview has no find, it is scanned in copies of this many bytes
+FIND_CHUNK = 256
+
+def load_bytes(length, buf, off=0, unit=1):
+	if length is None:
+		end = len(buf)
+	elif isinstance(length, int):
+		end = off + length * unit
+	else:
+		length, off = length(buf, off)
+		if length < 0:
+			raise DecodeError('negative length at %d' % off)
+		end = off + length * unit
+
+	if end > len(buf):
+		raise DecodeError('truncated bytes at %d' % off)
+
+	return buf[off:end], end
+
+def skip_bytes(length, buf, off=0, unit=1):
+	length, off = length(buf, off)
+	if length < 0:
+		raise DecodeError('negative length at %d' % off)
+	end = off + length * unit
+	if end > len(buf):
+		raise DecodeError('truncated bytes at %d' % off)
+	return end
+
+def dump_bytes(length, val, f, unit=1):
+	if isinstance(length, int):
+		if len(val) != length * unit:
+			raise ValueError('expected %d bytes got %d' % (length * unit, len(val)))
+	elif length is not None:
+		length(len(val) // unit, f)
+	f.write(val)
+
+# arrays from iterables
+#
+# the count of an iterator is only known once its items are written. A
+# fixed width count is reserved and backpatched when f can seek, otherwise
+# the items go to a scratch buffer and follow the count once it is known.
+def begin_array(f, size):
+	"""
+	Returns (f, items, pos): items is where to write the items to, pos
+	where the count of size bytes was reserved or None.
+	"""
+	seekable = getattr(f, 'seekable', None)
+	if size and seekable is not None and seekable():
+		pos = f.tell()
+		f.write(bytes(size))
+		return f, f, pos
+	return f, io.BytesIO(), None
+
+def end_array(f, items, pos, count, dump_length):
+	"""Writes the count and returns f to go on with."""
+	if pos is None:
+		dump_length(count, f)
+		f.write(items.getbuffer())
+		return f
+	end = f.tell()
+	f.seek(pos)
+	dump_length(count, f)
+	f.seek(end)
+	return f
+
+def _find_aligned(find, nul, off, unit):
+	start = off
+	while True:
+		pos = find(nul, off)
+		if pos < 0 or (pos - start) % unit == 0:
+			return pos
+		off = pos + 1
+
+def find_nul(buf, off=0, unit=1):
+	"""
+	The offset of the first NUL code unit at or after off, or -1. The scan
+	is done by find, not a loop over the bytes.
+	"""
+	nul = b'\x00' * unit
+	find = getattr(buf, 'find', None)
+	if find is not None:
+		return _find_aligned(find, nul, off, unit)
+
+	# chunks are a whole number of units, a unit never spans two
+	for base in range(off, len(buf), FIND_CHUNK):
+		chunk = bytes(buf[base:base + FIND_CHUNK])
+		pos = _find_aligned(chunk.find, nul, 0, unit)
+		if pos >= 0:
+			return base + pos
+	return -1
+
+def load_raw_string(length, encoding, buf, off=0):
+	# the encoded string without its length or terminator
+	if length != NUL:
+		return load_bytes(length, buf, off, UNITS[encoding])
+
+	unit = UNITS[encoding]
+	end = find_nul(buf, off, unit)
+	if end < 0:
+		raise DecodeError('unterminated string at %d' % off)
+	return buf[off:end], end + unit
+
+def load_string(length, encoding, buf, off=0):
+	val, off = load_raw_string(length, encoding, buf, off)
+	try:
+		return str(val, CODECS[encoding]), off
+	except UnicodeDecodeError as e:
+		raise DecodeError('bad string at %d: %s' % (off, e)) from None
+
+def skip_string(length, encoding, buf, off=0):
+	if length != NUL:
+		return skip_bytes(length, buf, off, UNITS[encoding])
+	return load_raw_string(length, encoding, buf, off)[1]
+
+def dump_string(length, encoding, val, f):
+	data = val.encode(CODECS[encoding])
+	if length != NUL:
+		dump_bytes(length, data, f, UNITS[encoding])
+		return
+
+	if '\x00' in val:
+		raise ValueError('NUL in a NUL terminated string: %r' % val)
+	f.write(data)
+	f.write(b'\x00' * UNITS[encoding])
+
+STRING_CACHE_SIZE = 1024
+
+class StringCache:
+	"""
+	Decoded strings by their encoding, so a repeated value decodes to the
+	same (interned) str without decoding it again. Holds at most size
+	strings, the oldest are dropped first.
+	"""
+
+	__slots__ = ('encoding', 'codec', 'size', 'strings')
+
+	def __init__(self, encoding='utf8', size=STRING_CACHE_SIZE):
+		self.encoding = encoding
+		self.codec = CODECS[encoding]
+		self.size = size
+		self.strings = {}
+
+	def get(self, raw):
+		"""The str of raw, which must be bytes."""
+		val = self.strings.get(raw, None)
+		if val is not None:
+			return val
+
+		try:
+			val = sys.intern(str(raw, self.codec))
+		except UnicodeDecodeError as e:
+			raise DecodeError('bad string: %s' % e) from None
+
+		if len(self.strings) >= self.size:
+			del self.strings[next(iter(self.strings))]
+		self.strings[raw] = val
+		return val
+
+	def load(self, length, buf, off=0):
+		raw, off = load_raw_string(length, self.encoding, buf, off)
+		return self.get(bytes(raw)), off
+
+	def __len__(self):
+		return len(self.strings)
+
+	def clear(self):
+		self.strings.clear()
+
+def load_uuid(encoding, buf, off=0):
+	if encoding == 'bin':
+		val, off = load_bytes(16, buf, off)
+		return uuid.UUID(bytes=bytes(val)), off
+
+	val, off = load_string(load_varint, 'utf8', buf, off)
+	try:
+		return uuid.UUID(val), off
+	except ValueError:
+		raise DecodeError('bad uuid %r at %d' % (val, off)) from None
+
+def dump_uuid(encoding, val, f):
+	if encoding == 'bin':
+		f.write(val.bytes)
+	elif encoding == 'hex':
+		dump_string(dump_varint, 'utf8', val.hex, f)
+	else:
+		dump_string(dump_varint, 'utf8', str(val), f)
+
+# enumerations
+#
+# the generated code maps decoded values to members through these tables
+def enum_table(cls):
+	"""A tuple indexed by value, None where the value is not a member."""
+	table = [None] * (max(member.value for member in cls) + 1)
+	for member in cls:
+		table[member.value] = member
+	return tuple(table)
+
+def flag_table(cls):
+	"""A tuple indexed by value of every combination of the flags."""
+	mask = 0
+	for member in cls:
+		mask |= member.value
+	return tuple(None if val & ~mask else cls(val) for val in range(mask + 1))
+
+def enum_values(cls):
+	return {member.value: member for member in cls}
+
+def splice(buf, start, end, data):
+	"""
+	Replace buf[start:end] with data and return the buffer holding the
+	result. A bytearray is always changed in place, any other writable
+	buffer when data has the same length. Otherwise the result is new
+	bytes.
+	"""
+
+	if isinstance(buf, bytearray):
+		buf[start:end] = data
+		return buf
+
+	if len(data) == end - start and not isinstance(buf, bytes):
+		view = memoryview(buf)
+		if not view.readonly:
+			view[start:end] = data
+			return buf
+
+	return b''.join((buf[:start], data, buf[end:]))
+
+# selective decoding
+class RawFrame:
+	"""
+	A packet that was not decoded. payload is the whole packet, starting
+	with the packet id.
+	"""
+
+	__slots__ = ('id', 'payload')
+
+	def __init__(self, id, payload):
+		self.id = id
+		self.payload = payload
+
+	def __repr__(self):
+		return 'RawFrame(id=%r, %d bytes)' % (self.id, len(self.payload))
+
+	def dump(self, f):
+		f.write(self.payload)
+
+	def __reduce__(self):
+		return RawFrame, (self.id, bytes(self.payload))
+
+def _variants(cls):
+	for variant in getattr(cls, '_variants', ()):
+		yield variant
+		for child in _variants(variant):
+			yield child
+
+class Decoder:
+	"""
+	Decode packets of a generated type that dispatches on its leading id,
+	like play315.cb.
+
+	If interest is given, it is a collection of qualified names or fnmatch
+	patterns (play315.cb.world.entity.*). Only packet ids that lead to a
+	matching variant are decoded, everything else is returned as a
+	RawFrame after reading just the id.
+	"""
+
+	def __init__(self, root, interest=None):
+		if getattr(root, '_key', None) is None or root._fields != (root._key,):
+			raise TypeError('%s does not dispatch on its first field'
+					% root.__qualname__)
+
+		self.root = root
+		self.patterns = set()
+
+		# keep the generated table itself so anything that swaps its
+		# loaders, like the profiler, applies to every decoder
+		self.branches = root._branches
+
+		if interest is None:
+			self.keys = self.branches
+		else:
+			self.keys = set()
+			self.register(*interest)
+
+	def interested(self, cls):
+		names = [cls.__qualname__]
+		names.extend(variant.__qualname__ for variant in _variants(cls))
+		return any(fnmatch.fnmatchcase(name, pattern)
+			   for name in names
+			   for pattern in self.patterns)
+
+	def register(self, *patterns):
+		if self.keys is self.branches:
+			return
+		self.patterns.update(patterns)
+		for key, load in self.branches.items():
+			if self.interested(load.__self__):
+				self.keys.add(key)
+
+	def __call__(self, buf, off=0):
+		key, pos = load_varint(buf, off)
+		if key in self.keys:
+			return self.branches[key](buf, pos, key)[0]
+		return RawFrame(key, memoryview(buf)[off:])
+
+class Transcoder:
+	"""
+	Rewrite the packets of one generated protocol version for another,
+	like play315.cb to play316.cb.
+
+	ids maps the source id of each packet whose encoding did not change to
+	its target id. Those packets are copied with only the id rewritten.
+	converters maps source classes to functions building the target
+	packet from a decoded source packet.
+
+	on_unconvertible is what happens to packets the target version lacks,
+	or that could not be converted: 'raise' raises ValueError, 'drop'
+	makes __call__ and convert return None. It may be changed on the
+	generated transcoders.
+	"""
+
+	POLICIES = ('raise', 'drop')
+
+	def __init__(self, source, ids, converters, on_unconvertible='raise'):
+		if on_unconvertible not in self.POLICIES:
+			raise ValueError('unknown policy %r' % on_unconvertible)
+		self.source = source
+		self.ids = ids
+		self.converters = converters
+		self.on_unconvertible = on_unconvertible
+		self._prefixes = {key: pack_varint(val) for key, val in ids.items()}
+
+	def __call__(self, buf, off=0):
+		"""Returns the target encoding of the packet at buf[off:]."""
+		key, pos = load_varint(buf, off)
+		prefix = self._prefixes.get(key, None)
+		if prefix is not None:
+			return prefix + memoryview(buf)[pos:]
+
+		load = self.source._branches.get(key, None)
+		if load is None:
+			raise DecodeError('unknown %s id %r' % (self.source.__qualname__, key))
+		packet = self.convert(load(buf, pos, key)[0])
+		if packet is None:
+			return None
+
+		f = io.BytesIO()
+		packet.dump(f)
+		return f.getvalue()
+
+	def convert(self, packet):
+		"""
+		Returns the target version of a decoded packet. Packets copied by
+		id have no converter.
+		"""
+		convert = self.converters.get(type(packet), None)
+		if convert is not None:
+			return convert(packet)
+		if self.on_unconvertible == 'drop':
+			return None
+		raise ValueError('no conversion of %s' % type(packet).__qualname__)
+
+# the structured type codecs are built from the primitives above
+from . import metadata, nbt, slot
@@ -0,0 +1,271 @@
+"""
+Entity metadata codec.
+
+Metadata is a list of (index, type, value) entries terminated by index 0xff.
+A Metadata container keeps the entries in a list indexed by entry index and
+remembers which indexes changed since the last delta() as a bitmask, so a
+server can send only the changed entries:
+
+	meta = Metadata()
+	meta.set(0, METADATA_BYTE, 0)		# once, declares the type
+	...
+	meta[0] = flags				# marks index 0 dirty if changed
+	if meta.dirty:
+		send(play315.cb.world.entity.meta(entity, meta.delta()))
+"""
+
+from . import lib
+
+__all__ = ['Metadata', 'METADATA_BYTE', 'METADATA_VARINT', 'METADATA_FLOAT',
+	   'METADATA_STRING', 'METADATA_CHAT', 'METADATA_SLOT', 'METADATA_BOOL',
+	   'METADATA_ROTATION', 'METADATA_POSITION', 'METADATA_OPT_POSITION',
+	   'METADATA_DIRECTION', 'METADATA_OPT_UUID', 'METADATA_BLOCK']
+
+(METADATA_BYTE, METADATA_VARINT, METADATA_FLOAT, METADATA_STRING,
+ METADATA_CHAT, METADATA_SLOT, METADATA_BOOL, METADATA_ROTATION,
+ METADATA_POSITION, METADATA_OPT_POSITION, METADATA_DIRECTION,
+ METADATA_OPT_UUID, METADATA_BLOCK) = range(13)
+
+END = 0xff
+
+def _load_string(buf, off):
+	return lib.load_string(lib.load_varint, 'utf8', buf, off)
+
+def _dump_string(val, f):
+	lib.dump_string(lib.dump_varint, 'utf8', val, f)
+
+def _load_rotation(buf, off):
+	x, off = lib.load_float(buf, off)
+	y, off = lib.load_float(buf, off)
+	z, off = lib.load_float(buf, off)
+	return (x, y, z), off
+
+def _dump_rotation(val, f):
+	for item in val:
+		lib.dump_float(item, f)
+
+def _optional(load, dump):
+	def load_optional(buf, off):
+		present, off = lib.load_bool(buf, off)
+		if not present:
+			return None, off
+		return load(buf, off)
+
+	def dump_optional(val, f):
+		lib.dump_bool(val is not None, f)
+		if val is not None:
+			dump(val, f)
+
+	return load_optional, dump_optional
+
+def _load_uuid(buf, off):
+	return lib.load_uuid('bin', buf, off)
+
+def _dump_uuid(val, f):
+	lib.dump_uuid('bin', val, f)
+
+# indexed by type
+CODECS = [
+	(lib.load_byte, lib.dump_byte),
+	(lib.load_varint, lib.dump_varint),
+	(lib.load_float, lib.dump_float),
+	(_load_string, _dump_string),
+	(_load_string, _dump_string),
+	(lib.load_slot, lib.dump_slot),
+	(lib.load_bool, lib.dump_bool),
+	(_load_rotation, _dump_rotation),
+	(lib.load_position, lib.dump_position),
+	_optional(lib.load_position, lib.dump_position),
+	(lib.load_varint, lib.dump_varint),
+	_optional(_load_uuid, _dump_uuid),
+	(lib.load_varint, lib.dump_varint),
+]
+
+class Metadata:
+	__slots__ = ('_types', '_values', '_dirty')
+
+	def __init__(self):
+		# _types[index] is None for indexes that are not set
+		self._types = []
+		self._values = []
+		self._dirty = 0
+
+	def _grow(self, index):
+		if not 0 <= index < END:
+			raise IndexError('metadata index out of range: %r' % index)
+		if index >= len(self._types):
+			missing = index + 1 - len(self._types)
+			self._types.extend([None] * missing)
+			self._values.extend([None] * missing)
+
+	def __contains__(self, index):
+		return 0 <= index < len(self._types) and self._types[index] is not None
+
+	def __getitem__(self, index):
+		if index not in self:
+			raise KeyError(index)
+		return self._values[index]
+
+	def get(self, index, default=None):
+		if index not in self:
+			return default
+		return self._values[index]
+
+	def type(self, index):
+		if index not in self:
+			raise KeyError(index)
+		return self._types[index]
+
+	def set(self, index, kind, val):
+		if not 0 <= kind < len(CODECS):
+			raise ValueError('unknown metadata type %r' % kind)
+		self._grow(index)
+		if self._types[index] != kind or self._values[index] != val:
+			self._types[index] = kind
+			self._values[index] = val
+			self._dirty |= 1 << index
+
+	def __setitem__(self, index, val):
+		self.set(index, self.type(index), val)
+
+	def __delitem__(self, index):
+		self.type(index)
+		self._types[index] = None
+		self._values[index] = None
+		self._dirty &= ~(1 << index)
+
+	def __iter__(self):
+		for index, kind in enumerate(self._types):
+			if kind is not None:
+				yield index
+
+	def __len__(self):
+		return sum(1 for kind in self._types if kind is not None)
+
+	def items(self):
+		for index in self:
+			yield index, self._types[index], self._values[index]
+
+	def __eq__(self, other):
+		if not isinstance(other, Metadata):
+			return NotImplemented
+		return list(self.items()) == list(other.items())
+
+	def __repr__(self):
+		return 'Metadata(%r)' % list(self.items())
+
+	@property
+	def dirty(self):
+		return self._dirty != 0
+
+	def dirty_indexes(self):
+		mask = self._dirty
+		index = 0
+		while mask:
+			if mask & 1:
+				yield index
+			mask >>= 1
+			index += 1
+
+	def clear_dirty(self):
+		self._dirty = 0
+
+	def delta(self):
+		"""
+		Return a Metadata holding only the entries changed since the last
+		delta, and start tracking changes afresh.
+		"""
+
+		delta = Metadata()
+		for index in self.dirty_indexes():
+			delta._grow(index)
+			delta._types[index] = self._types[index]
+			delta._values[index] = self._values[index]
+		self._dirty = 0
+		return delta
+
+	def update(self, other):
+		"""Apply a received delta."""
+		for index, kind, val in other.items():
+			self.set(index, kind, val)
+
+	def dump(self, f):
+		for index, kind in enumerate(self._types):
+			if kind is None:
+				continue
+			f.write(bytes((index,)))
+			lib.dump_varint(kind, f)
+			CODECS[kind][1](self._values[index], f)
+		f.write(bytes((END,)))
+
+def load(buf, off=0):
+	meta = Metadata()
+	types = meta._types
+	values = meta._values
+
+	while True:
+		try:
+			index = buf[off]
+		except IndexError:
+			raise lib.DecodeError('truncated metadata at %d' % off) from None
+		off += 1
+		if index == END:
+			return meta, off
+
+		kind, off = lib.load_varint(buf, off)
+		if not 0 <= kind < len(CODECS):
+			raise lib.DecodeError('unknown metadata type %d at %d' % (kind, off))
+
+		val, off = CODECS[kind][0](buf, off)
+		meta._grow(index)
+		types[index] = kind
+		values[index] = val
+
+def _skip_fixed(size):
+	def skip_fixed(buf, off):
+		return off + size
+	return skip_fixed
+
+def _skip_string(buf, off):
+	return lib.skip_bytes(lib.load_varint, buf, off)
+
+def _skip_optional(size):
+	def skip_optional(buf, off):
+		present, off = lib.load_bool(buf, off)
+		return off + size if present else off
+	return skip_optional
+
+# indexed by type
+SKIPS = [
+	_skip_fixed(1),
+	lib.skip_varint,
+	_skip_fixed(4),
+	_skip_string,
+	_skip_string,
+	lib.skip_slot,
+	_skip_fixed(1),
+	_skip_fixed(12),
+	_skip_fixed(8),
+	_skip_optional(8),
+	lib.skip_varint,
+	_skip_optional(16),
+	lib.skip_varint,
+]
+
+def skip(buf, off=0):
+	while True:
+		try:
+			index = buf[off]
+		except IndexError:
+			raise lib.DecodeError('truncated metadata at %d' % off) from None
+		off += 1
+		if index == END:
+			return off
+
+		kind, off = lib.load_varint(buf, off)
+		if not 0 <= kind < len(SKIPS):
+			raise lib.DecodeError('unknown metadata type %d at %d' % (kind, off))
+		off = SKIPS[kind](buf, off)
+
+def dump(val, f):
+	val.dump(f)
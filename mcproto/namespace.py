@@ -139,6 +139,14 @@ class MCProtoStruct(MCProtoNamespace, MCProtoBaseType):
 		self.constraints = collections.OrderedDict()
 		self.branches = collections.OrderedDict()
 		self.order = []
+		self._layout = None
+
+	@property
+	def layout(self):
+		# computed on first use, once the struct is fully built
+		if self._layout is None:
+			self._layout = MCProtoLayout(self)
+		return self._layout
 
 	def build_field(self, name, field_type, pos=None):
 		if name in self.fields:
@@ -151,12 +159,20 @@ class MCProtoStruct(MCProtoNamespace, MCProtoBaseType):
 		# and add it to the constraint list
 
 		if not isinstance(node.left, Identifier) \
-		   or not isinstance(node.right, Value):
+		   or not isinstance(node.right, (Value, Identifier)):
 			raise ValueError('expected ident = value at %s' \
 					  % node.pos)
 
 		name = str(node.left)
-		val = node.right.value
+		if isinstance(node.right, Value):
+			val = node.right.value
+		else:
+			# a member of the enum type of the field
+			field = self.fields.get(name, None)
+			if field is None or not hasattr(field.field_type, 'members'):
+				raise ValueError('expected ident = value at %s' \
+						  % node.pos)
+			val = field.field_type.value(str(node.right), node.pos)
 
 		if self.constraints.get(name, val) != val:
 			raise ValueError('inconsistent constarint at %s' \
@@ -212,3 +228,5 @@ class MCProtoProxyVariant(MCProtoVariant):
 	def __len__(self):
 		return len(self.parent)
 
+# the layout analysis works on the types defined above
+from .layout import MCProtoLayout
@@ -0,0 +1,380 @@
+"""
+Lazily indexed NBT codec.
+
+Decoding a compound only finds where it ends. The names of its entries are
+indexed on first access, and each entry is decoded when it is read, straight
+out of the buffer. Nested compounds are views of the same kind.
+
+When a compound is dumped, entries that were not replaced are copied from
+the buffer as raw bytes, and an untouched compound is copied as a whole.
+Lists and arrays are returned as new python objects; assign them back to
+record a change.
+
+On the wire a lone TAG_End stands for no NBT at all, which decodes to None.
+"""
+
+import collections
+import collections.abc
+import struct
+
+from . import lib
+
+__all__ = ['NBTCompound', 'TAG_END', 'TAG_BYTE', 'TAG_SHORT', 'TAG_INT',
+	   'TAG_LONG', 'TAG_FLOAT', 'TAG_DOUBLE', 'TAG_BYTE_ARRAY',
+	   'TAG_STRING', 'TAG_LIST', 'TAG_COMPOUND', 'TAG_INT_ARRAY',
+	   'TAG_LONG_ARRAY']
+
+(TAG_END, TAG_BYTE, TAG_SHORT, TAG_INT, TAG_LONG, TAG_FLOAT, TAG_DOUBLE,
+ TAG_BYTE_ARRAY, TAG_STRING, TAG_LIST, TAG_COMPOUND, TAG_INT_ARRAY,
+ TAG_LONG_ARRAY) = range(13)
+
+SCALARS = {
+	TAG_BYTE: struct.Struct('>b'),
+	TAG_SHORT: struct.Struct('>h'),
+	TAG_INT: struct.Struct('>i'),
+	TAG_LONG: struct.Struct('>q'),
+	TAG_FLOAT: struct.Struct('>f'),
+	TAG_DOUBLE: struct.Struct('>d'),
+}
+
+ARRAYS = {
+	TAG_BYTE_ARRAY: 'b',
+	TAG_INT_ARRAY: 'i',
+	TAG_LONG_ARRAY: 'q',
+}
+
+USHORT = struct.Struct('>H')
+INT = struct.Struct('>i')
+
+def _unpack(packer, buf, off):
+	try:
+		return packer.unpack_from(buf, off)[0]
+	except struct.error:
+		raise lib.DecodeError('truncated nbt at %d' % off) from None
+
+def _tag(buf, off):
+	try:
+		return buf[off]
+	except IndexError:
+		raise lib.DecodeError('truncated nbt at %d' % off) from None
+
+# java writes modified utf-8: NUL as two bytes and astral characters as
+# surrogate pairs
+def _decode_string(data):
+	try:
+		return str(data, 'utf-8')
+	except UnicodeDecodeError:
+		pass
+
+	data = bytes(data).replace(b'\xc0\x80', b'\x00')
+	val = data.decode('utf-8', 'surrogatepass')
+	return val.encode('utf-16-be', 'surrogatepass').decode('utf-16-be')
+
+def _encode_string(val):
+	if '\x00' not in val and val.isascii():
+		return val.encode('utf-8')
+
+	units = val.encode('utf-16-be')
+	units = struct.unpack('>%dH' % (len(units) // 2), units)
+	data = ''.join(map(chr, units)).encode('utf-8', 'surrogatepass')
+	return data.replace(b'\x00', b'\xc0\x80')
+
+def _count(buf, off):
+	count = _unpack(INT, buf, off)
+	if count < 0:
+		raise lib.DecodeError('negative nbt count at %d' % off)
+	return count
+
+def _check(buf, end, off):
+	# end of a payload starting at off
+	if end > len(buf):
+		raise lib.DecodeError('truncated nbt at %d' % off)
+	return end
+
+def _load_name(buf, off):
+	length = _unpack(USHORT, buf, off)
+	off += 2
+	end = _check(buf, off + length, off)
+	return _decode_string(buf[off:end]), end
+
+def skip_payload(tag, buf, off):
+	packer = SCALARS.get(tag, None)
+	if packer is not None:
+		return _check(buf, off + packer.size, off)
+	elif tag in ARRAYS:
+		count = _count(buf, off)
+		return _check(buf, off + 4 + count * struct.calcsize(ARRAYS[tag]), off)
+	elif tag == TAG_STRING:
+		return _check(buf, off + 2 + _unpack(USHORT, buf, off), off)
+	elif tag == TAG_LIST:
+		elem = _tag(buf, off)
+		count = _count(buf, off + 1)
+		off += 5
+		packer = SCALARS.get(elem, None)
+		if packer is not None:
+			return _check(buf, off + count * packer.size, off)
+		# every element takes at least a byte, the loop ends at the
+		# end of the buffer at the latest
+		for _ in range(count):
+			off = skip_payload(elem, buf, off)
+		return off
+	elif tag == TAG_COMPOUND:
+		return _scan(buf, off)
+	else:
+		raise lib.DecodeError('unknown nbt tag %d at %d' % (tag, off))
+
+def _scan(buf, off, index=None):
+	# find the end of a compound payload, optionally indexing it
+	while True:
+		start = off
+		tag = _tag(buf, off)
+		if tag == TAG_END:
+			return off + 1
+
+		length = _unpack(USHORT, buf, off + 1)
+		payload = off + 3 + length
+		off = skip_payload(tag, buf, payload)
+
+		if index is not None:
+			name = _decode_string(buf[start + 3:payload])
+			index[name] = (tag, start, payload, off)
+
+def load_payload(tag, buf, off):
+	packer = SCALARS.get(tag, None)
+	if packer is not None:
+		return _unpack(packer, buf, off), off + packer.size
+	elif tag == TAG_BYTE_ARRAY:
+		count = _count(buf, off)
+		off += 4
+		end = _check(buf, off + count, off)
+		return buf[off:end], end
+	elif tag in ARRAYS:
+		count = _count(buf, off)
+		fmt = '>%d%s' % (count, ARRAYS[tag])
+		end = _check(buf, off + 4 + struct.calcsize(fmt), off)
+		return list(struct.unpack_from(fmt, buf, off + 4)), end
+	elif tag == TAG_STRING:
+		return _load_name(buf, off)
+	elif tag == TAG_LIST:
+		elem = _tag(buf, off)
+		count = _count(buf, off + 1)
+		off += 5
+		val = []
+		for _ in range(count):
+			item, off = load_payload(elem, buf, off)
+			val.append(item)
+		return NBTList(elem, val), off
+	elif tag == TAG_COMPOUND:
+		end = _scan(buf, off)
+		return NBTCompound(buf, off, end), end
+	else:
+		raise lib.DecodeError('unknown nbt tag %d at %d' % (tag, off))
+
+def _guess_tag(val):
+	if isinstance(val, bool):
+		return TAG_BYTE
+	elif isinstance(val, int):
+		return TAG_INT if -0x80000000 <= val < 0x80000000 else TAG_LONG
+	elif isinstance(val, float):
+		return TAG_DOUBLE
+	elif isinstance(val, str):
+		return TAG_STRING
+	elif isinstance(val, (bytes, bytearray, memoryview)):
+		return TAG_BYTE_ARRAY
+	elif isinstance(val, collections.abc.Mapping):
+		return TAG_COMPOUND
+	elif isinstance(val, collections.abc.Sequence):
+		return TAG_LIST
+	raise TypeError('no nbt tag for %r' % val.__class__)
+
+def dump_payload(tag, val, f):
+	packer = SCALARS.get(tag, None)
+	if packer is not None:
+		f.write(packer.pack(val))
+	elif tag == TAG_BYTE_ARRAY:
+		f.write(INT.pack(len(val)))
+		f.write(val)
+	elif tag in ARRAYS:
+		f.write(INT.pack(len(val)))
+		f.write(struct.pack('>%d%s' % (len(val), ARRAYS[tag]), *val))
+	elif tag == TAG_STRING:
+		data = _encode_string(val)
+		f.write(USHORT.pack(len(data)))
+		f.write(data)
+	elif tag == TAG_LIST:
+		elem = getattr(val, 'tag', None)
+		if elem is None:
+			elem = _guess_tag(val[0]) if val else TAG_END
+		f.write(bytes((elem,)))
+		f.write(INT.pack(len(val)))
+		for item in val:
+			dump_payload(elem, item, f)
+	elif tag == TAG_COMPOUND:
+		if isinstance(val, NBTCompound):
+			val.dump_payload(f)
+		else:
+			for name, item in val.items():
+				_dump_entry(name, _guess_tag(item), item, f)
+			f.write(b'\x00')
+	else:
+		raise ValueError('unknown nbt tag %r' % tag)
+
+def _dump_entry(name, tag, val, f):
+	data = _encode_string(name)
+	f.write(bytes((tag,)))
+	f.write(USHORT.pack(len(data)))
+	f.write(data)
+	dump_payload(tag, val, f)
+
+def _modified(val):
+	if isinstance(val, NBTCompound):
+		return val.modified
+	if isinstance(val, list):
+		return any(_modified(item) for item in val)
+	return False
+
+class NBTList(list):
+	"""A list that remembers the tag of its elements."""
+
+	def __init__(self, tag, items=()):
+		super().__init__(items)
+		self.tag = tag
+
+class NBTCompound(collections.abc.MutableMapping):
+	def __init__(self, buf=None, start=0, end=0, name=''):
+		self.name = name
+		self._buf = buf
+		self._start = start
+		self._end = end
+		self._index = None
+		self._values = {}
+		self._assigned = collections.OrderedDict()
+		self._removed = set()
+
+	@property
+	def index(self):
+		if self._index is None:
+			self._index = collections.OrderedDict()
+			if self._buf is not None:
+				_scan(self._buf, self._start, self._index)
+		return self._index
+
+	@property
+	def modified(self):
+		if self._assigned or self._removed:
+			return True
+		return any(_modified(val) for _, val in self._values.values())
+
+	@property
+	def raw(self):
+		"""The encoded payload if it is unmodified, otherwise None."""
+		if self._buf is None or self.modified:
+			return None
+		return self._buf[self._start:self._end]
+
+	def tag(self, name):
+		if name in self._assigned:
+			return self._assigned[name]
+		if name in self._removed:
+			raise KeyError(name)
+		return self.index[name][0]
+
+	def __getitem__(self, name):
+		cached = self._values.get(name, None)
+		if cached is not None:
+			return cached[1]
+
+		tag = self.tag(name)
+		_, _, payload, _ = self.index[name]
+		val, _ = load_payload(tag, self._buf, payload)
+		self._values[name] = (tag, val)
+		return val
+
+	def set(self, name, tag, val):
+		self._values[name] = (tag, val)
+		self._assigned[name] = tag
+		self._removed.discard(name)
+
+	def __setitem__(self, name, val):
+		# keep the tag of entries that are replaced
+		try:
+			tag = self.tag(name)
+		except KeyError:
+			tag = _guess_tag(val)
+		self.set(name, tag, val)
+
+	def __delitem__(self, name):
+		self.tag(name)
+		self._values.pop(name, None)
+		if name in self._assigned:
+			del self._assigned[name]
+		if name in self.index:
+			self._removed.add(name)
+
+	def __iter__(self):
+		for name in self.index:
+			if name not in self._removed:
+				yield name
+		for name in self._assigned:
+			if name not in self.index:
+				yield name
+
+	def __len__(self):
+		return sum(1 for _ in self)
+
+	def __repr__(self):
+		return 'NBTCompound(%r, %r)' % (self.name, dict(self.items()))
+
+	def dump_payload(self, f):
+		raw = self.raw
+		if raw is not None:
+			f.write(raw)
+			return
+
+		for name in self:
+			if name in self._assigned or _modified(self._values.get(name, (None, None))[1]):
+				tag, val = self._values[name]
+				_dump_entry(name, tag, val, f)
+			else:
+				_, start, _, end = self.index[name]
+				f.write(self._buf[start:end])
+		f.write(b'\x00')
+
+	def dump(self, f):
+		data = _encode_string(self.name)
+		f.write(bytes((TAG_COMPOUND,)))
+		f.write(USHORT.pack(len(data)))
+		f.write(data)
+		self.dump_payload(f)
+
+def load(buf, off=0):
+	tag = _tag(buf, off)
+	if tag == TAG_END:
+		return None, off + 1
+	if tag != TAG_COMPOUND:
+		raise lib.DecodeError('expected nbt compound at %d' % off)
+
+	name, start = _load_name(buf, off + 1)
+	try:
+		end = _scan(buf, start)
+	except RecursionError:
+		raise lib.DecodeError('nbt nested too deep at %d' % off) from None
+	return NBTCompound(buf, start, end, name), end
+
+def skip(buf, off=0):
+	tag = _tag(buf, off)
+	if tag == TAG_END:
+		return off + 1
+	length = _unpack(USHORT, buf, off + 1)
+	try:
+		return skip_payload(tag, buf, off + 3 + length)
+	except RecursionError:
+		raise lib.DecodeError('nbt nested too deep at %d' % off) from None
+
+def dump(val, f):
+	if val is None:
+		f.write(b'\x00')
+	elif isinstance(val, NBTCompound):
+		val.dump(f)
+	else:
+		_dump_entry('', TAG_COMPOUND, val, f)
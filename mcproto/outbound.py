@@ -0,0 +1,114 @@
+"""
+Outbound packet queue.
+
+An OutboundQueue collects the packets sent to one connection during a tick
+and hands them to the transport in one writelines() call, when the tick
+ends or when more than threshold bytes are waiting. Each packet is framed
+with its varint length.
+
+The queue works with asyncio style transports. The protocol forwards its
+pause_writing() and resume_writing() callbacks to the queue. While the
+transport is paused nothing is written, packets wait in the queue, and
+send() refuses packets once limit bytes are waiting. Producers await
+drain() before sending to wait for the transport instead:
+
+	class Connection(asyncio.Protocol):
+		def connection_made(self, transport):
+			self.out = OutboundQueue(transport)
+
+		def pause_writing(self):
+			self.out.pause_writing()
+
+		def resume_writing(self):
+			self.out.resume_writing()
+
+	...
+	await conn.out.drain()
+	conn.out.send(play315.cb.world.entity.move(...))
+	...
+	for conn in connections:	# at the end of the tick
+		conn.out.flush()
+"""
+
+import asyncio
+import io
+
+from .lib import pack_varint
+
+__all__ = ['OutboundQueue']
+
+THRESHOLD = 64 * 1024
+LIMIT = 4 * 1024 * 1024
+
+class OutboundQueue:
+	def __init__(self, transport, threshold=THRESHOLD, limit=LIMIT):
+		if limit < threshold:
+			raise ValueError('limit is less than threshold')
+
+		self.transport = transport
+		self.threshold = threshold
+		self.limit = limit
+		self.paused = False
+
+		# length prefixes and packets, in order, for writelines
+		self.frames = []
+		self.pending = 0
+
+		self._scratch = io.BytesIO()
+		self._waiters = []
+
+	def send(self, packet):
+		"""Encode packet with its generated dump method and queue it."""
+		f = self._scratch
+		f.seek(0)
+		f.truncate()
+		packet.dump(f)
+		self.send_raw(f.getvalue())
+
+	def send_raw(self, data):
+		"""
+		Queue an encoded packet, like a RawFrame payload. Anything but
+		bytes is copied, the caller may reuse its buffer once this returns.
+		"""
+		if not isinstance(data, bytes):
+			data = bytes(data)
+		if self.paused and self.pending + len(data) > self.limit:
+			raise BufferError('outbound queue full while the transport is paused')
+
+		self.frames.append(pack_varint(len(data)))
+		self.frames.append(data)
+		self.pending += len(self.frames[-2]) + len(data)
+
+		if self.pending >= self.threshold:
+			self.flush()
+
+	def flush(self):
+		"""Write everything queued, unless the transport is paused."""
+		if self.paused or not self.frames:
+			return
+
+		frames = self.frames
+		self.frames = []
+		self.pending = 0
+		self.transport.writelines(frames)
+
+	def pause_writing(self):
+		self.paused = True
+
+	def resume_writing(self):
+		self.paused = False
+		for waiter in self._waiters:
+			if not waiter.done():
+				waiter.set_result(None)
+		self._waiters.clear()
+		self.flush()
+
+	async def drain(self):
+		"""Wait until the transport accepts writes again."""
+		while self.paused:
+			waiter = asyncio.get_running_loop().create_future()
+			self._waiters.append(waiter)
+			await waiter
+
+	def __len__(self):
+		return len(self.frames) // 2
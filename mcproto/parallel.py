@@ -0,0 +1,249 @@
+"""
+Decode packets on a process pool.
+
+Workers import the generated codec module once, when the pool starts, and
+keep one Decoder per root type. Frames are copied once into a shared memory
+block per chunk and workers decode them straight out of it, captures are
+mapped by every worker, so only the decoded packets are pickled. Bytes
+fields that view a block become bytes when their packet is pickled.
+
+Workers share the resource tracker of the process that started the pool,
+which unlinks the blocks it created.
+"""
+
+import importlib
+import multiprocessing
+import os
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.reduction import ForkingPickler
+
+from .capture import CaptureReader
+from .lib import Decoder
+
+__all__ = ['ParallelDecoder']
+
+# worker state
+_module = None
+_interest = None
+_decoders = {}
+_captures = {}
+# blocks of earlier tasks, closed once their packets were sent
+_attached = []
+
+def _reduce_view(view):
+	return bytes, (view.tobytes(),)
+
+def _init(module, interest):
+	global _module, _interest
+	_module = importlib.import_module(module)
+	_interest = interest
+	ForkingPickler.register(memoryview, _reduce_view)
+
+def _decoder(root):
+	decoder = _decoders.get(root, None)
+	if decoder is None:
+		cls = _module
+		for name in root.split('.'):
+			cls = getattr(cls, name)
+		decoder = _decoders[root] = Decoder(cls, _interest)
+	return decoder
+
+def attach(name):
+	"""
+	Attach to the shared memory block name without tracking it, the
+	tracker of the creator unlinks it. Before python 3.13 attaching
+	registers the block, so it is unregistered again right away. A
+	POSIX block is registered under its name with a leading '/'. A
+	tracker shared with the creator then prints a KeyError when the
+	creator unlinks the block, but still unlinks nothing twice.
+	"""
+	try:
+		return shared_memory.SharedMemory(name, track=False)
+	except TypeError:
+		pass
+
+	block = shared_memory.SharedMemory(name)
+	if os.name == 'posix':
+		name = block.name
+		if not name.startswith('/'):
+			name = '/' + name
+		resource_tracker.unregister(name, 'shared_memory')
+	return block
+
+def _decode_frames(task):
+	name, root, spans = task
+	decode = _decoder(root)
+
+	# the packets of earlier tasks were pickled once they returned, so
+	# their blocks are no longer viewed
+	for block in list(_attached):
+		try:
+			block.close()
+		except BufferError:
+			continue
+		_attached.remove(block)
+
+	# workers share the tracker of the creator, registering the block
+	# again is harmless there, unregistering it as attach() does is not
+	block = shared_memory.SharedMemory(name)
+	_attached.append(block)
+	buf = block.buf
+	return name, [decode(buf[off:off + length]) for off, length in spans]
+
+def _decode_records(task):
+	path, roots, start, stop = task
+
+	capture = _captures.get(path, None)
+	if capture is None:
+		capture = _captures[path] = CaptureReader(path)
+
+	results = []
+	for num in range(start, stop):
+		record = capture[num]
+		root = roots.get((record.state, record.direction), None)
+		if root is None:
+			packet = None
+		else:
+			packet = _decoder(root)(bytes(record.payload))
+		record.payload.release()
+		results.append((record._replace(payload=None), packet))
+	return results
+
+class ParallelDecoder:
+	"""
+	module is the importable name of a generated codec module, root the
+	qualified name of the type to decode frames as (like play315.cb).
+	interest is passed on to each worker's Decoder.
+
+	At most max_chunks chunks of frames are shared with the workers at a
+	time, twice the processes by default, so imap() only reads ahead of
+	the packets it yielded by that much.
+	"""
+
+	def __init__(self, module, root=None, processes=None, interest=None,
+		     chunksize=1024, max_chunks=None):
+		self.root = root
+		self.chunksize = chunksize
+		self.max_chunks = max_chunks or 2 * (processes or os.cpu_count() or 1)
+		self._blocks = {}
+		self._pool = multiprocessing.Pool(processes,
+						  initializer=_init,
+						  initargs=(module, interest))
+
+	def _chunks(self, frames):
+		chunk = []
+		size = 0
+		for frame in frames:
+			chunk.append(frame)
+			size += len(frame)
+			if len(chunk) >= self.chunksize:
+				yield chunk, size
+				chunk = []
+				size = 0
+		if chunk:
+			yield chunk, size
+
+	def _tasks(self, frames, root, slots, stopped):
+		# the pool pulls tasks on a thread of its own as fast as it can,
+		# slots holds it back until imap() is done with earlier chunks
+		for chunk, size in self._chunks(frames):
+			slots.acquire()
+			if stopped.is_set():
+				return
+			yield self._share(chunk, size, root)
+
+	def _share(self, chunk, size, root):
+		block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+		self._blocks[block.name] = block
+
+		spans = []
+		off = 0
+		for frame in chunk:
+			block.buf[off:off + len(frame)] = frame
+			spans.append((off, len(frame)))
+			off += len(frame)
+
+		return block.name, root, spans
+
+	def _release(self, name):
+		block = self._blocks.pop(name)
+		block.close()
+		block.unlink()
+
+	def imap(self, frames, root=None, ordered=True):
+		"""
+		Yield the decoded frames, in order unless ordered is False.
+		Each frame is an unframed packet starting with its id.
+		"""
+
+		root = root or self.root
+		if root is None:
+			raise ValueError('no root type to decode as')
+
+		slots = threading.Semaphore(self.max_chunks)
+		stopped = threading.Event()
+		tasks = self._tasks(frames, root, slots, stopped)
+
+		if ordered:
+			results = self._pool.imap(_decode_frames, tasks)
+		else:
+			results = self._pool.imap_unordered(_decode_frames, tasks)
+
+		try:
+			for name, packets in results:
+				self._release(name)
+				slots.release()
+				for packet in packets:
+					yield packet
+		finally:
+			# let the pool finish with the tasks if we stop early
+			stopped.set()
+			slots.release()
+
+	def map(self, frames, root=None):
+		return list(self.imap(frames, root))
+
+	def decode_capture(self, path, roots, ordered=True):
+		"""
+		Yield (record, packet) for every record in a capture. roots maps
+		(state, direction) to the root qualified name to decode with,
+		records without a root get a packet of None. The records have
+		no payload.
+		"""
+
+		with CaptureReader(path) as capture:
+			count = len(capture)
+
+		tasks = [(path, roots, start, min(start + self.chunksize, count))
+			 for start in range(0, count, self.chunksize)]
+
+		if ordered:
+			results = self._pool.imap(_decode_records, tasks)
+		else:
+			results = self._pool.imap_unordered(_decode_records, tasks)
+
+		for chunk in results:
+			for item in chunk:
+				yield item
+
+	def close(self):
+		self._pool.close()
+		self._pool.join()
+		for name in list(self._blocks):
+			self._release(name)
+
+	def terminate(self):
+		self._pool.terminate()
+		self._pool.join()
+		for name in list(self._blocks):
+			self._release(name)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		else:
+			self.terminate()
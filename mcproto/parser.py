@@ -4,7 +4,7 @@ from .ast import *
 
 __all__ = ['MCProtoLexer', 'MCProtoParser']
 
-def make_value(value, **kwargs):
+def make_value(value, source=None, offset=None):
 	if not isinstance(value, str):
 		raise TypeError('expected value as a token')
 
@@ -12,9 +12,9 @@ def make_value(value, **kwargs):
 		raise ValueError('value too short')
 
 	if value[0] in '-0123456789':
-		return Number(token=value, **kwargs)
+		return Number(token=value, source=source, offset=offset)
 	else:
-		return String(token=value, **kwargs)
+		return String(token=value, source=source, offset=offset)
 
 class MCProtoLexer:
 	def __init__(self, name, src=None, no_match=None):
@@ -22,7 +22,8 @@ class MCProtoLexer:
 			src = open(name, 'r').read()
 		self.name = name
 		self.src = src
-		self.loc = (0, 1, 0)
+		self.source = Source(name, src)
+		self.off = 0
 		self.no_match = no_match
 		self._token = None
 
@@ -54,13 +55,7 @@ class MCProtoLexer:
 		if self._token is None:
 			return
 
-		lines = self._token.count('\n')
-		cols = len(self._token)
-
-		col = 0 if lines > 0 else self.col_offset + cols
-
-		self.loc = (self.off + cols, self.lineno + lines, col)
-
+		self.off += len(self._token)
 		self._token = None
 
 	def __next__(self):
@@ -114,21 +109,17 @@ class MCProtoLexer:
 				pass
 		return self._token
 
-	@property
-	def off(self):
-		return self.loc[0]
-
 	@property
 	def lineno(self):
-		return self.loc[1]
+		return self.source.position(self.off)[0]
 
 	@property
 	def col_offset(self):
-		return self.loc[2]
+		return self.source.position(self.off)[1]
 
 	@property
 	def pos(self):
-		return '{.name}:{.lineno} col {.col_offset}'.format(self)
+		return '{0.name}:{0.lineno} col {0.col_offset}'.format(self)
 
 	@property
 	def eof(self):
@@ -156,12 +147,11 @@ class MCProtoParser:
 		if lex is None:
 			lex = MCProtoLexer(name, src)
 		self.lex = lex
+		self.source = lex.source
 
 	@property
 	def pos(self):
-		return {'_srcname': self.lex.name, \
-			'lineno': self.lex.lineno, \
-			'col_offset': self.lex.col_offset}
+		return self.lex.off
 
 	@property
 	def col_offset(self):
@@ -173,7 +163,7 @@ class MCProtoParser:
 		pos = self.pos
 		name = self.lex.token
 		self.lex.expect(name)
-		return Identifier(name, **pos)
+		return Identifier(name, source=self.source, offset=pos)
 
 	def value(self):
 		if not self.lex.is_constant():
@@ -181,7 +171,7 @@ class MCProtoParser:
 		pos = self.pos
 		tok = self.lex.token
 		self.lex.expect(tok)
-		return make_value(tok, **pos)
+		return make_value(tok, source=self.source, offset=pos)
 
 	def name(self):
 		path = []
@@ -201,7 +191,7 @@ class MCProtoParser:
 				raise ValueError('expected identifier at %s' \
 							% self.lex.pos)
 
-		return Identifier('.'.join(path), **pos)
+		return Identifier('.'.join(path), source=self.source, offset=pos)
 
 	def typespec(self):
 		pos = self.pos
@@ -229,7 +219,7 @@ class MCProtoParser:
 		if not args:
 			return None
 
-		return TypeSpec(args, **pos)
+		return TypeSpec(args, source=self.source, offset=pos)
 
 	def variantdef(self):
 		pos = self.pos
@@ -240,7 +230,7 @@ class MCProtoParser:
 		if self.lex.accept('{'):
 			body = self.body()
 			self.lex.accept('}')
-		return VariantDef(name, body, **pos)
+		return VariantDef(name, body, source=self.source, offset=pos)
 
 	def namespacedef(self):
 		pos = self.pos
@@ -254,7 +244,7 @@ class MCProtoParser:
 		if self.lex.accept('{'):
 			body = self.body()
 			self.lex.accept('}')
-		return NamespaceDef(name, body, **pos)
+		return NamespaceDef(name, body, source=self.source, offset=pos)
 
 	def typedef(self):
 		pos = self.pos
@@ -267,9 +257,9 @@ class MCProtoParser:
 		if self.lex.token in '{:':
 			self.lex.accept(':')
 			spec = self.typespec()
-			return TypeDef(name, spec, **pos)
+			return TypeDef(name, spec, source=self.source, offset=pos)
 		else:
-			return TypeDef(name, **pos)
+			return TypeDef(name, source=self.source, offset=pos)
 
 	def field_or_constraint(self):
 		pos = self.pos
@@ -292,7 +282,7 @@ class MCProtoParser:
 			else:
 				raise ValueError('value expected at %s' \
 							% self.lex.pos)
-			return ConstraintDef(name, val, **pos)
+			return ConstraintDef(name, val, source=self.source, offset=pos)
 
 		if '.' in name.name:
 			raise ValueError('field must have local name at %s' \
@@ -315,7 +305,7 @@ class MCProtoParser:
 
 		field_type = self.typespec()
 
-		return FieldDef(names, field_type, **pos)
+		return FieldDef(names, field_type, source=self.source, offset=pos)
 
 	def body(self):
 		pos = self.pos
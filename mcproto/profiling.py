@@ -0,0 +1,165 @@
+"""
+Per-variant profiling of generated codecs.
+
+A CodecProfiler swaps the _load_from and dump methods of every generated
+class for counting wrappers, and puts them in the dispatch tables. Turning
+it off puts the originals back, so a module that is not being profiled
+runs exactly the generated code.
+
+Counts are inclusive: a variant that dispatches to a nested variant is
+charged for the nested decode as well.
+"""
+
+import time
+
+__all__ = ['CodecProfiler']
+
+MODES = ('off', 'sampled', 'full')
+
+# indexes into the per codec stats lists
+CALLS, SAMPLED, BYTES, TIME = range(4)
+
+def generated_classes(module):
+	def walk(ns):
+		for val in list(vars(ns).values()):
+			if isinstance(val, type) and val.__module__ == module.__name__:
+				if '_fields' in vars(val):
+					yield val
+				for cls in walk(val):
+					yield cls
+	return walk(module)
+
+class _Counter:
+	__slots__ = ('f', 'count')
+
+	def __init__(self, f):
+		self.f = f
+		self.count = 0
+
+	def write(self, data):
+		self.count += len(data)
+		return self.f.write(data)
+
+class CodecProfiler:
+	"""
+	Profile the codecs of a generated module.
+
+	In sampled mode every call is counted, but only one in rate calls is
+	timed and measured. The snapshot reports the measured totals together
+	with the number of sampled calls they cover.
+	"""
+
+	def __init__(self, module, rate=64):
+		self.module = module
+		self.rate = rate
+		self.mode = 'off'
+		self.classes = list(generated_classes(module))
+		self.stats = {}
+		self._methods = {}
+		self._tables = {}
+
+	def set_mode(self, mode, rate=None):
+		if mode not in MODES:
+			raise ValueError('unknown profiling mode %r' % mode)
+
+		if rate is not None:
+			if rate < 1:
+				raise ValueError('rate must be positive')
+			self.rate = rate
+
+		self._uninstall()
+		self.mode = mode
+		if mode != 'off':
+			self._install(1 if mode == 'full' else self.rate)
+
+	def _counters(self, cls, op):
+		key = (cls.__qualname__, op)
+		counters = self.stats.get(key, None)
+		if counters is None:
+			counters = self.stats[key] = [0, 0, 0, 0]
+		return counters
+
+	def _wrap_load(self, cls, load, every):
+		stats = self._counters(cls, 'decode')
+		clock = time.perf_counter_ns
+
+		def _load_from(buf, off, *head):
+			stats[CALLS] += 1
+			if stats[CALLS] % every:
+				return load(buf, off, *head)
+
+			start = clock()
+			val, end = load(buf, off, *head)
+			stats[TIME] += clock() - start
+			stats[SAMPLED] += 1
+			stats[BYTES] += end - off
+			return val, end
+
+		# lib.Decoder maps table entries back to their class
+		_load_from.__self__ = cls
+		return staticmethod(_load_from)
+
+	def _wrap_dump(self, cls, dump, every):
+		stats = self._counters(cls, 'encode')
+		clock = time.perf_counter_ns
+
+		def dump_wrapper(obj, f):
+			stats[CALLS] += 1
+			if stats[CALLS] % every:
+				return dump(obj, f)
+
+			counter = _Counter(f)
+			start = clock()
+			dump(obj, counter)
+			stats[TIME] += clock() - start
+			stats[SAMPLED] += 1
+			stats[BYTES] += counter.count
+
+		dump_wrapper.__name__ = 'dump'
+		return dump_wrapper
+
+	def _install(self, every):
+		for cls in self.classes:
+			attrs = vars(cls)
+			if '_load_from' in attrs:
+				self._methods[cls, '_load_from'] = attrs['_load_from']
+				cls._load_from = self._wrap_load(cls, cls._load_from, every)
+			if 'dump' in attrs:
+				self._methods[cls, 'dump'] = attrs['dump']
+				cls.dump = self._wrap_dump(cls, attrs['dump'], every)
+
+		# tables hold the loaders directly, update them in place so
+		# decoders sharing them see the wrappers
+		for cls in self.classes:
+			table = vars(cls).get('_branches', None)
+			if table is None:
+				continue
+			self._tables[cls] = dict(table)
+			for key, load in table.items():
+				table[key] = getattr(load.__self__, load.__name__)
+
+	def _uninstall(self):
+		for (cls, name), method in self._methods.items():
+			setattr(cls, name, method)
+		for cls, saved in self._tables.items():
+			cls._branches.update(saved)
+		self._methods.clear()
+		self._tables.clear()
+
+	def reset(self):
+		for counters in self.stats.values():
+			counters[:] = [0, 0, 0, 0]
+
+	def snapshot(self):
+		codecs = {}
+		for (qualname, op), counters in self.stats.items():
+			if not counters[CALLS]:
+				continue
+			codecs.setdefault(qualname, {})[op] = {
+				'calls': counters[CALLS],
+				'sampled': counters[SAMPLED],
+				'bytes': counters[BYTES],
+				'time_ns': counters[TIME],
+			}
+
+		return {'mode': self.mode, 'rate': self.rate, 'codecs': codecs}
@@ -0,0 +1,82 @@
+"""
+Build time pruning of compiled namespaces.
+
+closure(root, patterns) finds what the generated code of the matching
+structs needs. Patterns are qualified names or fnmatch patterns, matched
+against the names the generator gives the classes (play315.sb.player.*).
+
+Pruning works on whole packets: a packet is a branch of a struct that is
+not itself a variant, like play315.sb.client.settings of play315.sb. A
+matching nested variant keeps its whole packet, along with the struct that
+dispatches to it. Everything the kept structs reach through types.walk is
+kept as well, so are the namespaces holding them.
+"""
+
+import fnmatch
+
+from . import types
+from . import namespace
+
+__all__ = ['closure']
+
+def qualname(path):
+	# the name the generator gives the class at path
+	return '.'.join(name[1:] + '_item' if name.startswith('^') else name
+			for name in path)
+
+def packet(struct):
+	"""
+	The branch of a top level struct that holds struct, struct itself when
+	it is not a variant.
+	"""
+	while isinstance(struct, namespace.MCProtoVariant) \
+	      and isinstance(struct.base, namespace.MCProtoVariant):
+		struct = struct.base
+	return struct
+
+def closure(root, patterns):
+	"""
+	Returns {id(obj): obj} of the types and namespaces under root that are
+	kept when only the structs matching patterns are generated.
+	"""
+	patterns = list(patterns)
+	matched = []
+	for path, obj in types.walk(root):
+		if not isinstance(obj, namespace.MCProtoStruct):
+			continue
+		name = qualname(path)
+		if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+			matched.append(obj)
+
+	if not matched:
+		raise ValueError('no struct matches %s' % ', '.join(patterns))
+
+	kept = {}
+	seen = set()
+
+	def keep(obj):
+		for _, child in types.walk(obj, (), seen):
+			kept[id(child)] = child
+
+	for struct in matched:
+		struct = packet(struct)
+		keep(struct)
+		if isinstance(struct, namespace.MCProtoVariant):
+			# the top level struct dispatches to the packet, the rest
+			# of its branches are pruned
+			top = struct.base
+			kept[id(top)] = top
+			for field in top.fields.values():
+				keep(field.field_type)
+			for path, branch in top.branches.items():
+				if path is None:
+					kept[id(branch)] = branch
+
+	# the namespaces up to root, for the classes to nest in
+	for obj in list(kept.values()):
+		parent = getattr(obj, 'parent', None)
+		while parent is not None and id(parent) not in kept:
+			kept[id(parent)] = parent
+			parent = parent.parent
+
+	return kept
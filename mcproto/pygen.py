@@ -0,0 +1,1512 @@
+"""
+Python code generator.
+
+PyGenerator turns a compiled namespace into the source of a python module
+that uses mcproto.lib at runtime. Primitive fields are inlined: runs of
+fixed width fields are packed and unpacked with one struct call, varints
+are read inline when they fit in a byte, and fixed length arrays are
+unrolled. The lib functions that are still called are bound to module
+globals.
+
+The tier picks how much the generated code checks:
+
+	strict	validates everything: truncated input, constraints on
+		decode, string encodings and fixed lengths on encode
+	trusted	assumes well formed input and values, for packets the
+		server produced itself
+"""
+
+import collections
+import fnmatch
+import struct
+
+from . import lib
+from . import types
+from . import namespace
+from . import layout
+from . import prune
+from . import transcode
+from .gen import MCProtoGenerator
+
+__all__ = ['PyGenerator']
+
+TIERS = ('strict', 'trusted')
+
+# struct formats of the simple types that decode to the plain value
+FORMATS = {
+	'bool': '?', 'byte': 'b', 'ubyte': 'B', 'short': 'h', 'ushort': 'H',
+	'int': 'i', 'uint': 'I', 'long': 'q', 'ulong': 'Q',
+	'float': 'f', 'double': 'd',
+}
+
+# struct formats of bit runs by byte size
+BIT_FORMATS = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+# arrays up to this length are unrolled
+UNROLL = 16
+
+# enums with values below this decode through a tuple instead of a dict
+DENSE = 256
+
+# default number of released instances a pooled class keeps
+POOL_SIZE = 256
+
+# values of the fields a newer version adds, by simple type
+DEFAULTS = {
+	'bool': 'False', 'float': '0.0', 'double': '0.0', 'angle': '0.0',
+	'position': '(0, 0, 0)', 'slot': 'None', 'nbt': 'None',
+}
+
+def indent(block, n=1):
+	if not block:
+		block = ''
+
+	if isinstance(block, list):
+		block = '\n'.join(block)
+
+	return '\n'.join(
+		'\t' * n + line if line else line
+		for line in block.split('\n')
+	)
+
+class PyContext:
+	"""Options and module level names shared by the code of one module."""
+
+	def __init__(self, tier='strict', interned=(), cache_size=lib.STRING_CACHE_SIZE):
+		if tier not in TIERS:
+			raise ValueError('unknown tier %r' % tier)
+		self.tier = tier
+		self.strict = tier == 'strict'
+		# fnmatch patterns of the qualname.field of interned strings
+		self.interned = list(interned)
+		self.cache_size = cache_size
+		# qualname.field -> [global name, encoding]
+		self.caches = collections.OrderedDict()
+		self.packers = collections.OrderedDict()
+		self.hoisted = collections.OrderedDict()
+		self.imports = {'struct'}
+		# enum type -> [global name, class name]
+		self.enums = collections.OrderedDict()
+		# qualname.field of the field being encoded, for error messages
+		self.field = None
+		# (bits, signed) -> name of the load/dump functions of a bit field
+		self.bit_fields = collections.OrderedDict()
+
+	def packer(self, fmt):
+		name = self.packers.get(fmt, None)
+		if name is None:
+			name = self.packers[fmt] = '_struct_' + fmt.replace('?', 'o')
+		return name
+
+	def lib(self, name):
+		self.hoisted[name] = None
+		return '_' + name
+
+	def bit_field(self, field_type, prefix):
+		# the load or dump function of a lone bit field
+		key = (field_type.bits, field_type.signed)
+		name = self.bit_fields.get(key, None)
+		if name is None:
+			name = self.bit_fields[key] = '%s%d' % (field_type.name, field_type.bits)
+		return '_%s_%s' % (prefix, name)
+
+	def string_cache(self, struct, name):
+		# the global holding the cache of an interned string field, or None
+		field_type = struct.fields[name].field_type
+		if not isinstance(field_type, types.MCProtoStringType):
+			return None
+
+		qualname = '%s.%s' % (struct.qualname, name)
+		entry = self.caches.get(qualname, None)
+		if entry is None:
+			if not any(fnmatch.fnmatchcase(qualname, pattern) for pattern in self.interned):
+				return None
+			entry = self.caches[qualname] = ['_strings%d' % len(self.caches), field_type.encoding]
+		return entry[0]
+
+	def enum(self, enum_type, hint=None):
+		# the global holding the class of enum_type
+		entry = self.enums.get(enum_type, None)
+		if entry is None:
+			entry = self.enums[enum_type] = ['_enum%d' % len(self.enums), hint]
+			self.imports.add('enum')
+		elif entry[1] is None:
+			entry[1] = hint
+		return entry[0]
+
+	def emit(self):
+		lines = []
+		for enum_type, (name, hint) in self.enums.items():
+			lines.extend(make_enum(enum_type, name, hint or enum_type.name))
+		lines.extend('_%s = mcprotolib.%s' % (name, name) for name in self.hoisted)
+		lines.extend('_load_{name}, _dump_{name} = mcprotolib.bit_field({bits}, {signed})'.format(
+				name=name, bits=bits, signed=signed)
+			     for (bits, signed), name in self.bit_fields.items())
+		lines.extend('%s = mcprotolib.StringCache(%r, %d)' % (name, encoding, self.cache_size)
+			     for name, encoding in self.caches.values())
+		lines.extend('%s = struct.Struct(%r)' % (name, '>' + fmt)
+			     for fmt, name in self.packers.items())
+		return '\n'.join(lines)
+
+class PyFrame:
+	def __init__(self, parent=None, path=None):
+		self.name = None
+		self.qualname = None
+		self.path = path or tuple()
+		self.body = []
+
+		if self.path:
+			assert parent is not None
+			assert len(path) == len(parent.path) + 1
+			assert path[:len(parent.path)] == parent.path
+			self.name = path[-1]
+
+			# assume if we reached the frame from a field
+			# it must be an array, so append _item
+			if self.name.startswith('^'):
+				self.name = self.name[1:] + '_item'
+
+	def emit(self):
+		body = '\n\n'.join(self.body)
+
+		# empty namespace must have pass
+		if not body:
+			body = 'pass'
+
+		# if we are the root, do not indent
+		if not self.name:
+			return body
+
+		# indent lines that have stuff
+		body = indent(body)
+
+		return 'class %s:\n%s' % (self.name, body)
+
+	def append(self, item):
+		if not item:
+			return
+		self.body.append(item)
+
+def make_constants(struct, ctx):
+	# constraints on enum fields hold the member, not the raw value
+	lines = []
+	for name, val in struct.constraints.items():
+		field = struct.fields.get(name, None)
+		if field is not None and isinstance(field.field_type, types.MCProtoEnumType):
+			lines.append('%s=%s(%r)' % (name, ctx.enum(field.field_type), val))
+		else:
+			lines.append('%s=%r' % (name, val))
+	return '\n'.join(lines)
+
+def make_ctr(fields):
+	args = ('self',) + tuple(name for name in fields)
+	args = ', '.join(args)
+
+	if not fields:
+		assigns = 'pass'
+	else:
+		assigns = '\n\t'.join('self.{name} = {name}'.format(name=name) for name in fields)
+
+	return """def __init__({args}):
+	{assigns}""".format(args=args, assigns=assigns)
+
+def make_repr(name, fields):
+	formats = ', '.join('%s=%%r' % name for name in fields)
+	names = ', '.join('self.%s' % name for name in fields)
+
+	return """def __repr__(self):
+	return '{name}({formats})' % ({names})""".format(name=name, formats=formats, names=names)
+
+def field_format(field_type):
+	# the struct format of a simple fixed width type, otherwise None
+	if isinstance(field_type, types.MCProtoSimpleType):
+		return FORMATS.get(field_type.name, None)
+	elif isinstance(field_type, types.MCProtoBitsType) and field_type.bits % 8 == 0:
+		fmt = BIT_FORMATS.get(field_type.bits // 8, None)
+		if fmt is not None and field_type.signed:
+			return fmt.lower()
+		return fmt
+	return None
+
+def type_bits(field_type):
+	# the (bits, signed) fields of a type packed into an integer, or None
+	if isinstance(field_type, types.MCProtoBitsType):
+		return ((field_type.bits, field_type.signed),)
+	elif isinstance(field_type, types.MCProtoSimpleType) and field_type.name == 'position':
+		return lib.POSITION_BITS
+	return None
+
+def check_bits(fields, vals, ctx):
+	# strict range checks of bit field values
+	if not ctx.strict:
+		return []
+	body = []
+	for (bits, signed), val in zip(fields, vals):
+		low, high = (-(1 << bits - 1), 1 << bits - 1) if signed else (0, 1 << bits)
+		body.append("""if not {low} <= {val} < {high}:
+	raise ValueError('%r does not fit in {kind} {bits}' % ({val},))""".format(
+			low=low, high=high, val=val, bits=bits, kind='signed' if signed else 'unsigned'))
+	return body
+
+class BitRun:
+	"""
+	Fields packed into one integer: adjacent bit fields of a struct, a
+	lone bit field, or the x, y, z of a position, which is one field
+	holding a tuple. The integer is read and written whole and split with
+	shifts and masks.
+	"""
+
+	def __init__(self, names, fields):
+		self.names = names
+		self.fields = fields
+		self.size, self.layout = lib.bit_layout(fields)
+		self.is_tuple = len(names) < len(fields)
+
+	@property
+	def format(self):
+		return BIT_FORMATS.get(self.size, None)
+
+	def values(self, prefix):
+		# the value expression of each field, prefix is 'self.' for
+		# the fields of a struct
+		if self.is_tuple:
+			return ['%s%s[%d]' % (prefix, self.names[0], i) for i in range(len(self.fields))]
+		return [prefix + name for name in self.names]
+
+	def pack(self, vals):
+		# an expression of the integer holding vals
+		parts = []
+		for (shift, mask, _), val in zip(self.layout, vals):
+			part = '%s & %#x' % (val, mask)
+			if shift:
+				part = '(%s) << %d' % (part, shift)
+			parts.append(part)
+		return ' | '.join(parts)
+
+	def check(self, vals, ctx):
+		# a position wraps around like the lib
+		if self.is_tuple:
+			return []
+		return check_bits(self.fields, vals, ctx)
+
+	def extract(self, var, dests=None):
+		# assign the fields in dests from the integer var
+		vals = []
+		total = self.size * 8
+		for (bits, _), (shift, mask, sign) in zip(self.fields, self.layout):
+			expr = var
+			if shift:
+				expr = '%s >> %d' % (expr, shift)
+			if shift + bits < total:
+				expr = '%s & %#x' % (expr, mask)
+			if sign:
+				expr = '(%s ^ %#x) - %#x' % (expr, sign, sign)
+			vals.append(expr)
+
+		if self.is_tuple:
+			return ['%s = (%s)' % (self.names[0], ', '.join(vals))]
+		return ['%s = %s' % (name, val) for name, val in zip(self.names, vals)
+			if dests is None or name in dests]
+
+	def encode(self, prefix, ctx):
+		vals = self.values(prefix)
+		body = self.check(vals, ctx)
+		if self.format is not None:
+			body.append('f.write(%s.pack(%s))' % (ctx.packer(self.format), self.pack(vals)))
+		else:
+			body.append("f.write((%s).to_bytes(%d, 'big'))" % (self.pack(vals), self.size))
+		return '\n'.join(body)
+
+	def decode(self, ctx, dests=None, var='_bits'):
+		if self.format is not None:
+			body = [decode_unpack(self.format, var + ',', ctx)]
+		else:
+			body = check_size(self.size, ctx)
+			body.append("%s = int.from_bytes(buf[off:off + %d], 'big')" % (var, self.size))
+			body.append('off += %d' % self.size)
+		body.extend(self.extract(var, dests))
+		return '\n'.join(body)
+
+def enum_dense(enum_type):
+	# decode through a tuple indexed by value
+	if isinstance(enum_type, types.MCProtoFlagType):
+		return 0 <= enum_type.mask < DENSE
+	return all(isinstance(val, int) and 0 <= val < DENSE
+		   for _, val in enum_type.members)
+
+def make_enum(enum_type, name, hint):
+	"""
+	Enum and flag types become enum.IntEnum, IntFlag or str Enum classes.
+	Small non negative values decode through a tuple indexed by the raw
+	value, the others through a dict.
+	"""
+	members = ', '.join('(%r, %r)' % (member.upper(), val) for member, val in enum_type.members)
+	if isinstance(enum_type, types.MCProtoFlagType):
+		lines = ['%s = enum.IntFlag(%r, [%s])' % (name, hint, members)]
+	elif isinstance(enum_type.base, types.MCProtoStringType):
+		lines = ['%s = enum.Enum(%r, [%s], type=str)' % (name, hint, members)]
+	else:
+		lines = ['%s = enum.IntEnum(%r, [%s])' % (name, hint, members)]
+
+	if enum_dense(enum_type):
+		table = 'flag_table' if isinstance(enum_type, types.MCProtoFlagType) else 'enum_table'
+		lines.append('%s_table = mcprotolib.%s(%s)' % (name, table, name))
+	elif not isinstance(enum_type, types.MCProtoFlagType):
+		lines.append('%s_values = mcprotolib.enum_values(%s)' % (name, name))
+	return lines
+
+def fixed_size(field_type):
+	# the encoded size if it does not depend on the value, otherwise None
+	low, high = layout.size_bounds(field_type)
+	return low if low == high else None
+
+def array_length(field_type):
+	# None to read until the end, a count, or the type of the length prefix
+	length = field_type.length
+	if isinstance(length, int) and length < 0:
+		return None
+	return length
+
+def make_length(field_type, prefix, ctx):
+	if not hasattr(field_type, 'length'):
+		return None
+
+	if is_nul(field_type):
+		return repr(lib.NUL)
+
+	if isinstance(field_type.length, int):
+		if field_type.length < 0:
+			return None
+		return field_type.length
+
+	if isinstance(field_type.length, types.MCProtoBitsType):
+		return ctx.bit_field(field_type.length, prefix)
+
+	if not isinstance(field_type.length, types.MCProtoIntType):
+		raise ValueError('expceted int type for array length got %r' % field_type.length.__class__)
+
+	return ctx.lib('%s_%s' % (prefix, field_type.length.name))
+
+def is_nul(field_type):
+	return isinstance(field_type, types.MCProtoStringType) and field_type.length == field_type.NUL
+
+def string_unit(field_type):
+	# bytes per unit of the length of field_type
+	if isinstance(field_type, types.MCProtoStringType):
+		return lib.UNITS[field_type.encoding]
+	return 1
+
+def pack_expr(field_type, val, ctx):
+	# an expression for the encoding of a simple value, or None
+	fmt = field_format(field_type)
+	if fmt is not None:
+		return '%s.pack(%s)' % (ctx.packer(fmt), val)
+	if field_type.name in ('varint', 'varlong'):
+		return '%s(%s)' % (ctx.lib('pack_' + field_type.name), val)
+	fields = type_bits(field_type)
+	if fields is not None:
+		run = BitRun((val,), fields)
+		if run.format is not None:
+			return '%s.pack(%s)' % (ctx.packer(run.format), run.pack(run.values('')))
+		return "(%s).to_bytes(%d, 'big')" % (run.pack(run.values('')), run.size)
+	return None
+
+def encode_length(field_type, val, ctx):
+	# write the length prefix of field_type for val
+	count = 'len(%s)' % val
+	if string_unit(field_type) != 1:
+		count += ' // %d' % string_unit(field_type)
+	expr = pack_expr(field_type.length, count, ctx)
+	if expr is None:
+		return '%s(%s, f)' % (make_length(field_type, 'dump', ctx), count)
+	return 'f.write(%s)' % expr
+
+def encode_array(field_type, val, ctx, depth):
+	"""
+	Length prefixed arrays also encode from iterators and generators,
+	which have no len(): the items are encoded first and the count is
+	backpatched into a reserved prefix, or written ahead of the items from
+	a scratch buffer for varint counts and files that cannot seek.
+	"""
+	length = array_length(field_type)
+	elem = field_type.elem
+	seq = '_seq%d' % depth
+	item = '_item%d' % depth
+
+	if isinstance(length, int):
+		body = []
+		if ctx.strict:
+			body.append("""if len({val}) != {length}:
+	raise ValueError('expected {length} items on {val}')""".format(length=length, val=val))
+
+		fmt = field_format(elem)
+		if fmt is not None:
+			body.append('f.write(%s.pack(*%s))' % (ctx.packer('%d%s' % (length, fmt)), val))
+		elif length <= UNROLL:
+			body.append('%s = %s' % (seq, val))
+			for i in range(length):
+				body.append(encode_field(elem, '%s[%d]' % (seq, i), ctx, depth + 1))
+		else:
+			body.append("""for {item} in {val}:
+{val_encoder}""".format(item=item, val=val, val_encoder=indent(encode_field(elem, item, ctx, depth + 1))))
+		return '\n'.join(body)
+
+	loop = """for {item} in {val}:
+{val_encoder}""".format(item=item, val=val, val_encoder=indent(encode_field(elem, item, ctx, depth + 1)))
+
+	if length is None:
+		return """if {val} is not None:
+{loop}""".format(val=val, loop=indent(loop))
+
+	# an iterator has no len(), its count is written after its items
+	return """if hasattr({val}, '__len__'):
+{sized}
+else:
+	_out{depth}, f, _pos{depth} = {begin}(f, {size})
+	_count{depth} = 0
+	for {item} in {val}:
+{val_encoder}
+		_count{depth} += 1
+	f = {end}(_out{depth}, f, _pos{depth}, _count{depth}, {dump})""".format(
+		val=val, depth=depth, item=item,
+		sized=indent(encode_length(field_type, val, ctx) + '\n' + loop),
+		begin=ctx.lib('begin_array'), end=ctx.lib('end_array'),
+		size=fixed_size(field_type.length) or 0,
+		val_encoder=indent(encode_field(elem, item, ctx, depth + 1), 2),
+		dump=make_length(field_type, 'dump', ctx))
+
+def encode_bool_optional(val_type, val, ctx, depth):
+	val_encoder = indent(encode_field(val_type, val, ctx, depth + 1))
+
+	return """if {val} is None:
+	f.write(b'\\x00')
+else:
+	f.write(b'\\x01')
+{val_encoder}""".format(val=val, val_encoder=val_encoder)
+
+def encode_string(field_type, val, ctx, data):
+	length = make_length(field_type, 'dump', ctx)
+	unit = string_unit(field_type)
+
+	if isinstance(field_type, types.MCProtoStringType):
+		codec = lib.CODECS.get(field_type.encoding, None)
+		if codec is None or (is_nul(field_type) and ctx.strict):
+			return '%s(%s, %r, %s, f)' % (ctx.lib('dump_string'), length, field_type.encoding, val)
+		elif is_nul(field_type):
+			return 'f.write(%s.encode(%r) + %r)' % (val, codec, b'\x00' * unit)
+		val = '%s.encode(%r)' % (val, codec)
+
+	if length is None:
+		return 'f.write(%s)' % val
+
+	body = ['%s = %s' % (data, val)]
+	if not isinstance(length, int):
+		body.append(encode_length(field_type, data, ctx))
+	elif ctx.strict:
+		body.append("""if len({data}) != {size}:
+	raise ValueError('expected {size} bytes got %d' % len({data}))""".format(data=data, size=length * unit))
+	body.append('f.write(%s)' % data)
+	return '\n'.join(body)
+
+def encode_enum(field_type, val, ctx, depth):
+	# strict checks look values up in the tables the decoder uses
+	body = []
+	if not ctx.strict:
+		pass
+	elif isinstance(field_type, types.MCProtoFlagType):
+		body.append("""if {val} & ~{mask}:
+	raise ValueError('bad {field} %r' % ({val},))""".format(val=val, mask=field_type.mask, field=ctx.field))
+	elif enum_dense(field_type):
+		table = ctx.enum(field_type) + '_table'
+		body.append("""if not 0 <= {val} < len({table}) or {table}[{val}] is None:
+	raise ValueError('bad {field} %r' % ({val},))""".format(val=val, table=table, field=ctx.field))
+	else:
+		body.append("""if {val} not in {values}:
+	raise ValueError('bad {field} %r' % ({val},))""".format(val=val, values=ctx.enum(field_type) + '_values', field=ctx.field))
+	body.append(encode_field(field_type.base, val, ctx, depth + 1))
+	return '\n'.join(body)
+
+def encode_field(field_type, val, ctx, depth=0):
+	if not isinstance(field_type, types.MCProtoBuiltinType):
+		return '%s.dump(f)' % val
+	elif isinstance(field_type, types.MCProtoEnumType):
+		return encode_enum(field_type, val, ctx, depth)
+	elif isinstance(field_type, types.MCProtoBitsType):
+		if field_format(field_type) is not None:
+			return 'f.write(%s)' % pack_expr(field_type, val, ctx)
+		return BitRun((val,), type_bits(field_type)).encode('', ctx)
+	elif isinstance(field_type, types.MCProtoSimpleType):
+		expr = pack_expr(field_type, val, ctx)
+		if expr is not None:
+			return 'f.write(%s)' % expr
+		return '%s(%s, f)' % (ctx.lib('dump_' + field_type.name), val)
+	elif isinstance(field_type, types.MCProtoBoolOptionalType):
+		return encode_bool_optional(field_type.elem, val, ctx, depth)
+	elif isinstance(field_type, types.MCProtoArrayType):
+		return encode_array(field_type, val, ctx, depth)
+	elif isinstance(field_type, types.MCProtoBaseStringType):
+		return encode_string(field_type, val, ctx, '_data%d' % depth)
+	elif isinstance(field_type, types.MCProtoUUIDType):
+		if field_type.encoding == 'bin':
+			return 'f.write(%s.bytes)' % val
+		return '%s(%r, %s, f)' % (ctx.lib('dump_uuid'), field_type.encoding, val)
+	else:
+		raise TypeError('unknown field type %r' % field_type.__class__)
+
+def field_units(struct, names):
+	# yields the field names, with the bit runs and the positions among
+	# them replaced by a BitRun
+	runs = struct.layout.runs
+	for name in names:
+		field_type = struct.fields[name].field_type
+		run = runs.get(name, None)
+		if run is not None:
+			if name == run[0]:
+				yield BitRun(run, tuple(type_bits(struct.fields[member].field_type)[0]
+							for member in run))
+		elif field_format(field_type) is None and type_bits(field_type) is not None:
+			yield BitRun((name,), type_bits(field_type))
+		else:
+			yield name
+
+def unit_format(struct, unit):
+	if isinstance(unit, BitRun):
+		return unit.format
+	return field_format(struct.fields[unit].field_type)
+
+def field_runs(struct, names):
+	# split names into runs of fields that pack into one struct format,
+	# yields (format, units), format is None for a unit encoded alone
+	run = []
+	fmt = ''
+	for unit in field_units(struct, names):
+		field_fmt = unit_format(struct, unit)
+		if field_fmt is not None:
+			run.append(unit)
+			fmt += field_fmt
+			continue
+		if run:
+			yield fmt, run
+			run = []
+			fmt = ''
+		yield None, [unit]
+	if run:
+		yield fmt, run
+
+def unit_targets(units):
+	# unpack targets of units, a bit run is unpacked into _bits<n>
+	return targets([('_bits%d' % i) if isinstance(unit, BitRun) else unit
+			for i, unit in enumerate(units)])
+
+def unit_extract(units, dests=None):
+	body = []
+	for i, unit in enumerate(units):
+		if isinstance(unit, BitRun):
+			body.extend(unit.extract('_bits%d' % i, dests))
+	return body
+
+def make_encode(struct, ctx):
+	body = []
+
+	for fmt, units in field_runs(struct, struct.fields):
+		unit = units[0]
+		if fmt is None and isinstance(unit, BitRun):
+			body.append(unit.encode('self.', ctx))
+		elif fmt is None:
+			ctx.field = '%s.%s' % (struct.qualname, unit)
+			body.append(encode_field(struct.fields[unit].field_type, 'self.%s' % unit, ctx))
+		else:
+			vals = []
+			for unit in units:
+				if isinstance(unit, BitRun):
+					unit_vals = unit.values('self.')
+					body.extend(unit.check(unit_vals, ctx))
+					vals.append(unit.pack(unit_vals))
+				else:
+					vals.append('self.%s' % unit)
+			body.append('f.write(%s.pack(%s))' % (ctx.packer(fmt), ', '.join(vals)))
+
+	if not body:
+		body = '\tpass'
+	else:
+		body = indent(body)
+
+	return 'def dump(self, f):\n%s' % body
+
+
+def targets(names):
+	# an assignment target for a tuple of len(names)
+	if len(names) == 1:
+		return names[0] + ','
+	return ', '.join(names)
+
+def format_size(fmt):
+	return struct.calcsize('>' + fmt)
+
+def check_size(size, ctx):
+	if not ctx.strict:
+		return []
+	return ["""if off + {size} > len(buf):
+	raise mcprotolib.DecodeError('truncated data at %d' % off)""".format(size=size)]
+
+def check_count(count, length, ctx):
+	# unsigned counts are never negative
+	if not ctx.strict or FORMATS.get(length.name, '').isupper():
+		return []
+	return ["""if {count} < 0:
+	raise mcprotolib.DecodeError('negative count at %d' % off)""".format(count=count)]
+
+def decode_unpack(fmt, dests, ctx):
+	# unpack a struct format at off into dests, an assignment target
+	size = format_size(fmt)
+	body = check_size(size, ctx)
+	body.append('%s = %s.unpack_from(buf, off)' % (dests, ctx.packer(fmt)))
+	body.append('off += %d' % size)
+	return '\n'.join(body)
+
+def decode_varint(dest, ctx):
+	# one byte varints are read inline
+	if ctx.strict:
+		return """if off < len(buf) and buf[off] < 0x80:
+	{dest} = buf[off]
+	off += 1
+else:
+	{dest}, off = {load}(buf, off)""".format(dest=dest, load=ctx.lib('load_varint'))
+
+	return """{dest} = buf[off]
+if {dest} < 0x80:
+	off += 1
+else:
+	{dest}, off = {load}(buf, off)""".format(dest=dest, load=ctx.lib('load_varint'))
+
+def decode_simple(field_type, dest, ctx):
+	fmt = field_format(field_type)
+	if fmt is not None:
+		return decode_unpack(fmt, dest + ',', ctx)
+	elif type_bits(field_type) is not None:
+		return BitRun((dest,), type_bits(field_type)).decode(ctx)
+	elif field_type.name == 'varint':
+		return decode_varint(dest, ctx)
+	return '%s, off = %s(buf, off)' % (dest, ctx.lib('load_' + field_type.name))
+
+def decode_array(field_type, dest, ctx, depth):
+	length = array_length(field_type)
+	elem = field_type.elem
+	item = '_item%d' % depth
+
+	if isinstance(length, int):
+		fmt = field_format(elem)
+		if fmt is not None:
+			body = decode_unpack('%d%s' % (length, fmt), '_items%d' % depth, ctx)
+			return body + '\n%s = list(_items%d)' % (dest, depth)
+		if length <= UNROLL:
+			items = ['%s_%d' % (item, i) for i in range(length)]
+			body = [decode_field(elem, name, ctx, depth + 1) for name in items]
+			body.append('%s = [%s]' % (dest, ', '.join(items)))
+			return '\n'.join(body)
+		head = 'for _ in range(%d):' % length
+	elif length is None:
+		# read elements until the end of the packet
+		head = 'while off < len(buf):'
+	else:
+		count = '_count%d' % depth
+		head = [decode_simple(length, count, ctx)] + check_count(count, length, ctx)
+		head = '%s\nfor _ in range(%s):' % ('\n'.join(head), count)
+
+	return """{dest} = []
+{head}
+{val_decoder}
+	{dest}.append({item})""".format(head=head, dest=dest, item=item, val_decoder=indent(decode_field(elem, item, ctx, depth + 1)))
+
+def decode_bool_optional(val_type, dest, ctx, depth):
+	val_decoder = decode_field(val_type, dest, ctx, depth + 1)
+
+	if ctx.strict:
+		present = '_present{depth}, off = {load}(buf, off)'
+	else:
+		present = '_present{depth} = buf[off]\noff += 1'
+
+	return (present + """
+if _present{depth}:
+{val_decoder}
+else:
+	{dest} = None""").format(depth=depth, dest=dest, load=ctx.lib('load_bool') if ctx.strict else None, val_decoder=indent(val_decoder))
+
+def decode_string(field_type, dest, ctx, depth, cache=None):
+	"""
+	cache is the global of the lib.StringCache of an interned string
+	field, a repeated value comes back as the same str without decoding
+	it again.
+	"""
+	length = make_length(field_type, 'load', ctx)
+	is_string = isinstance(field_type, types.MCProtoStringType)
+	unit = string_unit(field_type)
+
+	if cache is not None and (ctx.strict or is_nul(field_type)):
+		return '%s, off = %s.load(%s, buf, off)' % (dest, cache, length)
+
+	if ctx.strict or (is_string and (field_type.encoding not in lib.CODECS or is_nul(field_type))):
+		if is_string:
+			return '%s, off = %s(%s, %r, buf, off)' % (dest, ctx.lib('load_string'), length, field_type.encoding)
+		return '%s, off = %s(%s, buf, off)' % (dest, ctx.lib('load_bytes'), length)
+
+	body = []
+	if length is None:
+		size = None
+		end = 'len(buf)'
+	elif isinstance(length, int):
+		size = str(length * unit)
+		end = 'off + %s' % size
+	else:
+		size = '_len%d' % depth
+		body.append(decode_simple(field_type.length, size, ctx))
+		if unit != 1:
+			body.append('%s *= %d' % (size, unit))
+		end = 'off + %s' % size
+
+	if cache is not None:
+		key = '_key%d' % depth
+		body.append('%s = bytes(buf[off:%s])' % (key, end))
+		body.append("""{dest} = {cache}.strings.get({key}, None)
+if {dest} is None:
+	{dest} = {cache}.get({key})""".format(dest=dest, cache=cache, key=key))
+	elif is_string:
+		body.append('%s = str(buf[off:%s], %r)' % (dest, end, lib.CODECS[field_type.encoding]))
+	else:
+		body.append('%s = buf[off:%s]' % (dest, end))
+	body.append('off = len(buf)' if size is None else 'off += %s' % size)
+	return '\n'.join(body)
+
+def decode_enum(field_type, dest, ctx, depth):
+	raw = '_raw%d' % depth
+	name = ctx.enum(field_type)
+	body = [decode_field(field_type.base, raw, ctx, depth + 1)]
+
+	if enum_dense(field_type):
+		table = name + '_table'
+		if ctx.strict:
+			body.append('%s = %s[%s] if 0 <= %s < len(%s) else None' % (dest, table, raw, raw, table))
+		else:
+			body.append('%s = %s[%s]' % (dest, table, raw))
+	elif isinstance(field_type, types.MCProtoFlagType):
+		# IntFlag caches the members made for combinations
+		if ctx.strict:
+			body.append("""if {raw} & ~{mask}:
+	raise mcprotolib.DecodeError('bad {name} %r at %d' % ({raw}, off))""".format(raw=raw, mask=field_type.mask, name=field_type.name))
+		body.append('%s = %s(%s)' % (dest, name, raw))
+		return '\n'.join(body)
+	elif ctx.strict:
+		body.append('%s = %s_values.get(%s, None)' % (dest, name, raw))
+	else:
+		body.append('%s = %s_values[%s]' % (dest, name, raw))
+
+	if ctx.strict:
+		body.append("""if {dest} is None:
+	raise mcprotolib.DecodeError('bad {name} %r at %d' % ({raw}, off))""".format(dest=dest, raw=raw, name=field_type.name))
+	return '\n'.join(body)
+
+def decode_field(field_type, dest, ctx, depth=0):
+	if not isinstance(field_type, types.MCProtoBuiltinType):
+		return '%s, off = %s.load(buf, off)' % (dest, field_type.qualname)
+	elif isinstance(field_type, types.MCProtoEnumType):
+		return decode_enum(field_type, dest, ctx, depth)
+	elif isinstance(field_type, (types.MCProtoSimpleType, types.MCProtoBitsType)):
+		return decode_simple(field_type, dest, ctx)
+	elif isinstance(field_type, types.MCProtoBoolOptionalType):
+		return decode_bool_optional(field_type.elem, dest, ctx, depth)
+	elif isinstance(field_type, types.MCProtoArrayType):
+		return decode_array(field_type, dest, ctx, depth)
+	elif isinstance(field_type, types.MCProtoBaseStringType):
+		return decode_string(field_type, dest, ctx, depth)
+	elif isinstance(field_type, types.MCProtoUUIDType):
+		return '%s, off = %s(%r, buf, off)' % (dest, ctx.lib('load_uuid'), field_type.encoding)
+	else:
+		raise TypeError('unknown field type %r' % field_type.__class__)
+
+def decode_fields(struct, names, ctx):
+	body = []
+	for fmt, units in field_runs(struct, names):
+		unit = units[0]
+		if fmt is None and isinstance(unit, BitRun):
+			body.append(unit.decode(ctx))
+		elif fmt is None:
+			field_type = struct.fields[unit].field_type
+			cache = ctx.string_cache(struct, unit)
+			if cache is not None:
+				body.append(decode_string(field_type, unit, ctx, 0, cache))
+			else:
+				body.append(decode_field(field_type, unit, ctx))
+		else:
+			body.append(decode_unpack(fmt, unit_targets(units), ctx))
+			body.extend(unit_extract(units))
+	return body
+
+def check_constraints(struct, names, ctx):
+	if not ctx.strict:
+		return []
+	return ["""if {name} != cls.{name}:
+	raise mcprotolib.DecodeError('expected {name}=%r got %r' % (cls.{name}, {name}))""".format(name=name)
+		for name in names if name in struct.constraints]
+
+def split_fields(struct):
+	# fields decoded by the base before dispatching to us
+	if isinstance(struct, namespace.MCProtoVariant):
+		head = list(struct.base.fields)
+	else:
+		head = []
+	return head, [name for name in struct.fields if name not in head]
+
+def discriminators(struct, pruned=()):
+	# yields (variant, {field: value}) for each branch, variant is None
+	# for anonymous branches, which decode as struct itself
+	for path, variant in struct.branches.items():
+		if id(variant) in pruned:
+			continue
+		tests = collections.OrderedDict(
+			(name, val) for name, val in variant.constraints.items()
+			if name in struct.fields and name not in struct.constraints)
+		yield (variant if path is not None else None), tests
+
+def branch_loader(variant):
+	if variant is None:
+		return 'cls._build'
+	return '%s._load_from' % variant.qualname
+
+def dispatch_key(struct):
+	# the single field all branches test, if there is one
+	keys = set()
+	for variant, tests in discriminators(struct):
+		if len(tests) > 1:
+			return None
+		keys.update(tests)
+	if len(keys) != 1:
+		return None
+	return keys.pop()
+
+def make_raw(struct, key):
+	# the whole packet, from where _load_from started
+	return """if {key} in cls._pruned:
+	return mcprotolib.RawFrame({key}, memoryview(buf)[_start:]), len(buf)""".format(key=key)
+
+def make_dispatch(struct, args, pruned=()):
+	key = dispatch_key(struct)
+	if pruned and key is None:
+		raise ValueError('cannot prune branches of %s, they do not test one field'
+				 % struct.qualname)
+
+	default = None
+	body = []
+	for variant, tests in discriminators(struct, pruned):
+		if not tests:
+			default = default or branch_loader(variant)
+		elif key is None:
+			cond = ' and '.join('%s == %r' % item for item in tests.items())
+			body.append("""if {cond}:
+	return {load}(buf, off, {args})""".format(cond=cond, load=branch_loader(variant), args=args))
+
+	if key is not None:
+		if pruned and default is not None:
+			body.append(make_raw(struct, key))
+		body.append('_load = cls._branches.get({key}, {default})'.format(key=key, default=default))
+		if default is None:
+			unknown = ["raise mcprotolib.DecodeError('unknown {qualname}.{key} %r' % ({key},))".format(
+				qualname=struct.qualname, key=key)]
+			if pruned:
+				unknown.insert(0, make_raw(struct, key))
+			body.append('if _load is None:\n%s' % indent('\n'.join(unknown)))
+		body.append('return _load(buf, off, {args})'.format(args=args))
+	elif default is not None:
+		body.append('return {load}(buf, off, {args})'.format(load=default, args=args))
+	else:
+		body.append("raise mcprotolib.DecodeError('no variant of {qualname} matches')".format(qualname=struct.qualname))
+
+	return body
+
+def make_construct(fields, pool_size):
+	# return a new instance, or a released one when the class is pooled
+	if not pool_size or not fields:
+		return 'return cls({fields}), off'.format(fields=', '.join(fields))
+
+	return """_free = cls._free
+if _free:
+	_obj = _free.pop()
+	{assigns}
+	return _obj, off
+return cls({fields}), off""".format(
+		assigns='\n\t'.join('_obj.{name} = {name}'.format(name=name) for name in fields),
+		fields=', '.join(fields))
+
+def make_release(pool_size):
+	"""
+	A pooled class keeps a free list. release() returns an instance to
+	it, and the decoder fills a released instance instead of allocating a
+	new one, see make_construct.
+	"""
+	return """_free = []
+
+def release(self):
+	# the caller must not use the instance after releasing it
+	if len(self._free) < {pool_size}:
+		self._free.append(self)""".format(pool_size=pool_size)
+
+def make_decode(struct, ctx, pool_size=None, pruned=()):
+	head, own = split_fields(struct)
+	unconstrained = [name for name in struct.fields if name not in struct.constraints]
+	methods = []
+
+	if None in struct.branches:
+		methods.append("""@classmethod
+def _build(cls, buf, off, {args}):
+{body}""".format(
+			args=', '.join(struct.fields),
+			body=indent(make_construct(unconstrained, pool_size))))
+
+	body = decode_fields(struct, own, ctx)
+	body.extend(check_constraints(struct, own, ctx))
+	if pruned:
+		body.insert(0, '_start = off')
+	if struct.branches:
+		body.extend(make_dispatch(struct, ', '.join(struct.fields), pruned))
+	else:
+		body.append(make_construct(unconstrained, pool_size))
+
+	methods.append("""@classmethod
+def _load_from(cls, buf, off{args}):
+{body}""".format(args=''.join(', ' + name for name in head), body=indent(body)))
+
+	body = decode_fields(struct, head, ctx)
+	body.extend(check_constraints(struct, head, ctx))
+	body.append('return cls._load_from(buf, off{args})'.format(args=''.join(', ' + name for name in head)))
+
+	methods.append("""@classmethod
+def load(cls, buf, off=0):
+{body}""".format(body=indent(body)))
+
+	return '\n\n'.join(methods)
+
+def skip_array(length, length_type, val_type, ctx, depth):
+	elem_size = fixed_size(val_type)
+
+	if length is None:
+		head = 'while off < len(buf):'
+	elif isinstance(length, int):
+		head = 'for _ in range({length}):'
+	else:
+		count = '_count%d' % depth
+		head = ['%s, off = {length}(buf, off)' % count] + check_count(count, length_type, ctx)
+		if elem_size is not None:
+			head.append('off += %s * {size}' % count)
+			return '\n'.join(head).format(length=length, size=elem_size)
+		head.append('for _ in range(%s):' % count)
+		head = '\n'.join(head)
+
+	return (head + '\n{val_skipper}').format(length=length, depth=depth, val_skipper=indent(skip_field(val_type, ctx, depth + 1)))
+
+def skip_field(field_type, ctx, depth=0):
+	size = fixed_size(field_type)
+	if size is not None:
+		return 'off += %d' % size
+
+	length = make_length(field_type, 'load', ctx)
+
+	if not isinstance(field_type, types.MCProtoBuiltinType):
+		return 'off = %s._skip(buf, off)' % field_type.qualname
+	elif isinstance(field_type, types.MCProtoEnumType):
+		return skip_field(field_type.base, ctx, depth)
+	elif isinstance(field_type, types.MCProtoSimpleType):
+		return 'off = %s(buf, off)' % ctx.lib('skip_' + field_type.name)
+	elif isinstance(field_type, types.MCProtoBoolOptionalType):
+		return """_present{depth}, off = {load}(buf, off)
+if _present{depth}:
+{val_skipper}""".format(depth=depth, load=ctx.lib('load_bool'), val_skipper=indent(skip_field(field_type.elem, ctx, depth + 1)))
+	elif isinstance(field_type, types.MCProtoArrayType):
+		return skip_array(length, field_type.length, field_type.elem, ctx, depth)
+	elif isinstance(field_type, types.MCProtoBaseStringType):
+		if length is None:
+			return 'off = len(buf)'
+		elif is_nul(field_type) or string_unit(field_type) != 1:
+			return 'off = %s(%s, %r, buf, off)' % (ctx.lib('skip_string'), length, field_type.encoding)
+		return 'off = %s(%s, buf, off)' % (ctx.lib('skip_bytes'), length)
+	elif isinstance(field_type, types.MCProtoUUIDType):
+		return 'off = %s(%s, buf, off)' % (ctx.lib('skip_bytes'), ctx.lib('load_varint'))
+	else:
+		raise TypeError('unknown field type %r' % field_type.__class__)
+
+def skip_fields(struct, names, ctx):
+	# skip names, folding runs of fixed size fields into one addition
+	body = []
+	pending = 0
+	for name in names:
+		field_type = struct.fields[name].field_type
+		low, high = struct.layout.sizes[name]
+		if low == high:
+			pending += low
+			continue
+		if pending:
+			body.append('off += %d' % pending)
+			pending = 0
+		body.append(skip_field(field_type, ctx))
+	return body, pending
+
+def make_skip(struct, ctx):
+	size = fixed_size(struct)
+	if size is not None:
+		body = 'return off + %d' % size
+	else:
+		body, pending = skip_fields(struct, struct.fields, ctx)
+		body.append('return off + %d' % pending if pending else 'return off')
+		body = '\n'.join(body)
+
+	return """@classmethod
+def _skip(cls, buf, off):
+{body}""".format(body=indent(body))
+
+def make_patcher(struct, name, ctx):
+	"""
+	patch_<name>(buf, val, off=0) rewrites one field of an encoded packet
+	without decoding the rest: it skips to the field and splices in the
+	new encoding, in place when the buffer allows it.
+	"""
+	if name not in struct.fields:
+		raise ValueError('no field %r in %s' % (name, struct.qualname))
+
+	# skip to the variable size field the target is anchored on, the
+	# fields after it have a known size
+	fields = list(struct.fields)
+	anchor, offset = struct.layout.positions[name]
+	if anchor is None:
+		body = []
+	else:
+		body, pending = skip_fields(struct, fields[:fields.index(anchor) + 1], ctx)
+		offset += pending
+
+	field_type = struct.fields[name].field_type
+	run = struct.layout.runs.get(name, None)
+	if run is not None:
+		# rewrite the bits of the field in the integer of its run
+		unit = next(field_units(struct, run))
+		index = run.index(name)
+		shift, mask, _ = unit.layout[index]
+		keep = ~(mask << shift) & ((1 << unit.size * 8) - 1)
+		body.append('_start = off + %d' % offset if offset else '_start = off')
+		body.append('off = _start + %d' % unit.size)
+		body.extend(check_bits(unit.fields[index:index + 1], ['val'], ctx))
+		body.append("_bits = int.from_bytes(buf[_start:off], 'big') & %#x | (val & %#x) << %d"
+			    % (keep, mask, shift))
+		body.append("_data = _bits.to_bytes(%d, 'big')" % unit.size)
+		body.append('return %s(buf, _start, off, _data)' % ctx.lib('splice'))
+		return """@classmethod
+def patch_{name}(cls, buf, val, off=0):
+{body}""".format(name=name, body=indent(body))
+
+	size = fixed_size(field_type)
+	if size is not None:
+		body.append('_start = off + %d' % offset if offset else '_start = off')
+		body.append('off = _start + %d' % size)
+	else:
+		if offset:
+			body.append('off += %d' % offset)
+		body.append('_start = off')
+		body.append(skip_field(field_type, ctx))
+
+	expr = None
+	if isinstance(field_type, types.MCProtoSimpleType) or field_format(field_type) is not None:
+		expr = pack_expr(field_type, 'val', ctx)
+	if expr is not None:
+		body.append('_data = %s' % expr)
+	else:
+		ctx.imports.add('io')
+		body.append('f = io.BytesIO()')
+		ctx.field = '%s.%s' % (struct.qualname, name)
+		body.append(encode_field(field_type, 'val', ctx))
+		body.append('_data = f.getvalue()')
+
+	body.append('return %s(buf, _start, off, _data)' % ctx.lib('splice'))
+
+	return """@classmethod
+def patch_{name}(cls, buf, val, off=0):
+{body}""".format(name=name, body=indent(body))
+
+def project_run(fmt, run, names, ctx, more):
+	# unpack the units in run, fmt pads the skipped fields between them
+	if not fmt:
+		return []
+	size = format_size(fmt)
+	if not run:
+		return ['off += %d' % size] if more else []
+
+	body = check_size(size, ctx)
+	body.append('%s = %s.unpack_from(buf, off)' % (unit_targets(run), ctx.packer(fmt)))
+	if more:
+		body.append('off += %d' % size)
+	body.extend(unit_extract(run, names))
+	return body
+
+def make_projection(struct, names, ctx):
+	for name in names:
+		if name not in struct.fields:
+			raise ValueError('no field %r in %s' % (name, struct.qualname))
+
+	fields = list(struct.fields)
+	last = max(fields.index(name) for name in names)
+
+	body = []
+	fmt = ''
+	pad = 0
+	run = []
+	for unit in field_units(struct, fields[:last + 1]):
+		if isinstance(unit, BitRun):
+			wanted = any(name in names for name in unit.names)
+			field_fmt = unit.format
+			size = unit.size
+		else:
+			field_type = struct.fields[unit].field_type
+			wanted = unit in names
+			field_fmt = field_format(field_type)
+			size = fixed_size(field_type)
+
+		if wanted and field_fmt is not None:
+			fmt += '%dx%s' % (pad, field_fmt) if pad else field_fmt
+			pad = 0
+			run.append(unit)
+			continue
+		elif not wanted and size is not None:
+			pad += size
+			continue
+
+		if pad:
+			fmt += '%dx' % pad
+		body.extend(project_run(fmt, run, names, ctx, True))
+		fmt = ''
+		pad = 0
+		run = []
+
+		if isinstance(unit, BitRun):
+			body.append(unit.decode(ctx, names))
+		elif wanted:
+			body.append(decode_field(field_type, unit, ctx))
+		else:
+			body.append(skip_field(field_type, ctx))
+
+	body.extend(project_run(fmt, run, names, ctx, False))
+
+	if len(names) == 1:
+		body.append('return (%s,)' % names[0])
+	else:
+		body.append('return (%s)' % ', '.join(names))
+
+	return """@classmethod
+def project_{name}(cls, buf, off=0):
+{body}""".format(name='_'.join(names), body=indent(body))
+
+def make_attrs(struct):
+	attrs = ['_fields = %r' % (tuple(struct.fields),)]
+	if struct.branches:
+		attrs.append('_key = %r' % dispatch_key(struct))
+	return '\n'.join(attrs)
+
+def make_package(names):
+	return '''"""
+Generated protocol package, each top level name is loaded on first use.
+"""
+
+import importlib
+
+__all__ = {names!r}
+
+def __getattr__(name):
+	if name not in __all__:
+		raise AttributeError('module %r has no attribute %r' % (__name__, name))
+	module = importlib.import_module('._' + name, __name__)
+	val = globals()[name] = getattr(module, name)
+	return val
+
+def __dir__():
+	return sorted(set(globals()) | set(__all__))'''.format(names=list(names))
+
+def default_value(field_type):
+	# an expression for a field the source version lacks, or None
+	if isinstance(field_type, types.MCProtoEnumType):
+		return repr(field_type.members[0][1])
+	elif isinstance(field_type, (types.MCProtoIntType, types.MCProtoBitsType)):
+		return DEFAULTS.get(field_type.name, '0')
+	elif isinstance(field_type, types.MCProtoSimpleType):
+		return DEFAULTS.get(field_type.name, None)
+	elif isinstance(field_type, types.MCProtoBoolOptionalType):
+		return 'None'
+	elif isinstance(field_type, types.MCProtoArrayType):
+		if not isinstance(field_type.length, int):
+			return '[]'
+		elem = default_value(field_type.elem)
+		if elem is None:
+			return None
+		return '[%s] * %d' % (elem, field_type.length)
+	elif isinstance(field_type, types.MCProtoStringType):
+		if isinstance(field_type.length, int):
+			return None
+		return "''"
+	elif isinstance(field_type, types.MCProtoBytesType):
+		if isinstance(field_type.length, int) and field_type.length >= 0:
+			return repr(bytes(field_type.length))
+		return "b''"
+	return None
+
+def value_kind(field_type):
+	# fields of the same kind take each other's values
+	if isinstance(field_type, types.MCProtoEnumType):
+		field_type = field_type.base
+	if isinstance(field_type, types.MCProtoBitsType):
+		return int
+	elif isinstance(field_type, types.MCProtoIntType) and field_type.name != 'bool':
+		return int
+	elif isinstance(field_type, types.MCProtoSimpleType) \
+	     and field_type.name in ('float', 'double', 'angle'):
+		return float
+	return None
+
+def convert_field(source, target, name):
+	# an expression for field name of target from packet _pkt, or None
+	field_type = target.fields[name].field_type
+	field = source.fields.get(name, None)
+	if field is None:
+		return default_value(field_type)
+	if transcode.signature(field.field_type) == transcode.signature(field_type):
+		return '_pkt.%s' % name
+	kind = value_kind(field_type)
+	if kind is not None and kind is value_kind(field.field_type):
+		return '_pkt.%s' % name
+	return None
+
+def make_converter(source, target, name):
+	args = []
+	for field in target.fields:
+		if field in target.constraints:
+			continue
+		arg = convert_field(source, target, field)
+		if arg is None:
+			return None
+		args.append(arg)
+
+	return """def {name}(_pkt):
+	return {target}({args})""".format(name=name, target=target.qualname, args=', '.join(args))
+
+def make_transcoder(name, source, target):
+	"""
+	Returns the code of a lib.Transcoder named name from struct source to
+	target, and the source packets left without a converter.
+
+	Packets are matched by transcode.packets. Those that only changed
+	their id are copied with the id rewritten, the others are decoded and
+	converted field by field: fields are matched by name and new fields
+	take a default.
+	"""
+	key = next(iter(source.fields))
+	ids = []
+	converters = []
+	code = []
+	skipped = []
+	for packet, other, same in transcode.packets(source, target):
+		if same:
+			ids.append('\t%r: %r,' % (packet.constraints[key], other.constraints[key]))
+			continue
+		targets = dict(transcode.leaves(other))
+		for path, leaf in transcode.leaves(packet):
+			convert = '_%s_%d' % (name, len(converters))
+			body = None
+			if path in targets:
+				body = make_converter(leaf, targets[path], convert)
+			if body is None:
+				skipped.append(leaf.qualname)
+				continue
+			code.append(body)
+			converters.append('\t%s: %s,' % (leaf.qualname, convert))
+
+	code.append('{name} = mcprotolib.Transcoder({source}, {{\n{ids}\n}}, {{\n{converters}\n}})'.format(
+		name=name, source=source.qualname, ids='\n'.join(ids), converters='\n'.join(converters)))
+	return code, skipped
+
+def make_tables(struct, pruned=()):
+	if not struct.branches:
+		return []
+
+	variants = [variant.qualname for variant, _ in discriminators(struct, pruned) if variant is not None]
+	tables = ['%s._variants = (%s)' % (struct.qualname, ''.join(name + ',' for name in variants))]
+
+	key = dispatch_key(struct)
+	if key is not None:
+		items = []
+		for variant, tests in discriminators(struct, pruned):
+			if tests:
+				load = branch_loader(variant).replace('cls.', struct.qualname + '.')
+				items.append('\t%r: %s,' % (tests[key], load))
+		tables.append('%s._branches = {\n%s\n}' % (struct.qualname, '\n'.join(items)))
+		if pruned:
+			keys = [tests[key] for variant, tests in discriminators(struct) if id(variant) in pruned]
+			tables.append('%s._pruned = frozenset((%s))' % (struct.qualname, ''.join('%r,' % val for val in keys)))
+
+	return tables
+
+class PyGenerator(MCProtoGenerator):
+	def __init__(self, projections=None, tier='strict', pooled=(), pool_size=POOL_SIZE,
+		     patchers=None, interned=(), cache_size=lib.STRING_CACHE_SIZE, select=None,
+		     split=False, transcoders=None):
+		super().__init__(self)
+		self.ctx = PyContext(tier, interned, cache_size)
+
+		# qualnames or fnmatch patterns of the classes that reuse
+		# released instances
+		self.pooled = list(pooled)
+		self.pool_size = pool_size
+		self.qualname = []
+		self.stack = [PyFrame()]
+		self.tables = []
+
+		# qualname -> list of field name tuples to generate projections for
+		self.projections = projections or {}
+		# qualname -> list of field names to generate patchers for
+		self.patchers = patchers or {}
+
+		# qualnames or fnmatch patterns of the packets to generate, all
+		# of them if empty
+		self.select = list(select or ())
+		# id -> the types and namespaces kept, see prune.closure
+		self.kept = None
+
+		# top level name -> source of its submodule, when split
+		self.split = split
+		self.modules = collections.OrderedDict()
+
+		# (source qualname, target qualname) of the transcoders to generate,
+		# both versions are in this module
+		self.transcoders = list(transcoders or ())
+		if self.transcoders and split:
+			raise ValueError('transcoders need both versions in one module')
+		self.structs = {}
+		# qualnames of the source packets transcoders drop
+		self.skipped = []
+
+	def enter(self, path):
+		if self.stack[-1].path == path:
+			frame = self.stack[-1]
+		else:
+			frame = PyFrame(self.stack[-1], path)
+			self.qualname.append(frame.name)
+			frame.qualname = '.'.join(self.qualname)
+		self.stack.append(frame)
+		return self
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		frame = self.stack.pop()
+		if frame is self.stack[-1]:
+			return
+		self.qualname.pop()
+		self.stack[-1].append(frame.emit())
+
+	def visit(self, obj, path=()):
+		if self.select and self.kept is None:
+			self.kept = prune.closure(obj, self.select)
+		if self.kept is not None and path and id(obj) not in self.kept \
+		   and isinstance(obj, (namespace.MCProtoNamespace, types.MCProtoBuiltinType)):
+			return
+		if self.split and len(path) == 1:
+			return self.visit_module(obj, path)
+		return super().visit(obj, path)
+
+	def visit_module(self, obj, path):
+		# generate a top level name with globals of its own
+		outer = self.ctx, self.stack, self.tables
+		self.ctx = PyContext(self.ctx.tier, self.ctx.interned, self.ctx.cache_size)
+		self.stack = [PyFrame()]
+		self.tables = []
+		try:
+			super().visit(obj, path)
+			self.modules[path[0]] = self.emit()
+		finally:
+			self.ctx, self.stack, self.tables = outer
+
+	def pruned(self, struct):
+		"""
+		With select patterns, only the matching packets and the types
+		they need are generated, see prune.closure. Returns the ids of the
+		branches of struct left out, which decode to a lib.RawFrame holding
+		the whole packet.
+		"""
+		if self.kept is None:
+			return ()
+		return {id(variant) for path, variant in struct.branches.items()
+			if path is not None and id(variant) not in self.kept}
+
+	def visit_builtin(self, obj, path):
+		if isinstance(obj, types.MCProtoEnumType):
+			name = path[-1] if path else None
+			if name and not name.startswith('^'):
+				# a typedef, make the class reachable by its name
+				self.stack[-1].append('%s = %s' % (name, self.ctx.enum(obj, name)))
+			elif name:
+				self.ctx.enum(obj, name[1:])
+		super().visit_builtin(obj, path)
+
+	def is_pooled(self, qualname):
+		return any(fnmatch.fnmatchcase(qualname, pattern) for pattern in self.pooled)
+
+	def build(self, struct, path):
+		frame = self.stack[-1]
+		qualname = struct.qualname = frame.qualname
+		self.structs[qualname] = struct
+		unconstrained = [field for field in struct.fields if field not in struct.constraints]
+
+		pool_size = None
+		pruned = self.pruned(struct)
+		frame.append(make_attrs(struct))
+		if not struct.branches or None in struct.branches:
+			if unconstrained and self.is_pooled(qualname):
+				pool_size = self.pool_size
+			frame.append(make_constants(struct, self.ctx))
+			frame.append(make_ctr(unconstrained))
+			frame.append(make_repr(qualname, unconstrained))
+			frame.append(make_encode(struct, self.ctx))
+			if pool_size:
+				frame.append(make_release(pool_size))
+		frame.append(make_decode(struct, self.ctx, pool_size, pruned))
+		if not struct.branches and not isinstance(struct, namespace.MCProtoVariant):
+			frame.append(make_skip(struct, self.ctx))
+		for names in self.projections.get(qualname, ()):
+			frame.append(make_projection(struct, names, self.ctx))
+		for name in self.patchers.get(qualname, ()):
+			frame.append(make_patcher(struct, name, self.ctx))
+		self.tables.extend(make_tables(struct, pruned))
+
+	def emit(self):
+		body = self.stack[-1].emit()
+		head = '\n'.join('import %s' % name for name in sorted(self.ctx.imports))
+		head += '\n\nimport mcproto.lib as mcprotolib'
+		tables = list(self.tables)
+		self.skipped = []
+		for source, target in self.transcoders:
+			name = '%s_to_%s' % (source.replace('.', '_'), target.replace('.', '_'))
+			try:
+				code, skipped = make_transcoder(name, self.structs[source], self.structs[target])
+			except KeyError as e:
+				raise ValueError('no struct %s to transcode' % e) from None
+			tables.extend(code)
+			self.skipped.extend(skipped)
+		return '\n\n'.join([head, self.ctx.emit(), body] + tables)
+
+	def emit_package(self):
+		"""
+		Returns {file name: source} of a split package. Every top level
+		name (handshake, play315...) is a submodule of its own, like
+		_play315.py, and the __init__ imports one on first use through a
+		module __getattr__, so a process only pays for the protocol states
+		its connections reach.
+		"""
+		if not self.split:
+			raise ValueError('emit_package needs split=True')
+		files = collections.OrderedDict()
+		files['__init__.py'] = make_package(self.modules)
+		for name, source in self.modules.items():
+			files['_%s.py' % name] = source
+		return files
@@ -0,0 +1,336 @@
+"""
+Shared memory frame ring.
+
+A FrameRing hands unframed packets (packet id + body) from one process to
+another through a multiprocessing.shared_memory block, for example from
+the process doing network I/O to the one running the game logic. There is
+one producer and one consumer. The producer copies each packet in with
+put(), the consumer gets frames that view the block and decodes them on
+demand with the generated decoders, so packets are never pickled.
+
+	# network process
+	ring = FrameRing(size=4 << 20)
+	...
+	if not ring.put('play315', payload):
+		...			# full, wait for the consumer
+
+	# logic process
+	ring = FrameRing(name, roots={'play315': play315.sb})
+	for frame in ring.frames():
+		packet = frame.decode()
+		...
+	ring.done()
+
+A packet may take up to half the ring. Frames, and the bytes fields of
+packets decoded from them, point into the block. They stay valid until
+done() hands their space back to the producer.
+
+All integers are big-endian, except head and tail.
+
+Head and tail publish the records, so each must be stored whole and only
+after the record it covers. They are native 8 byte words at aligned
+offsets, stored and loaded through a memoryview with one machine access.
+Only a machine that keeps the order of stores and of loads, like x86-64,
+then needs no fence, python has none. On any other machine head and tail
+are stored and loaded holding a lock, whose acquire and release are full
+barriers. The creator makes a multiprocessing.Lock, ring.lock, and every
+ring attaching to it must be given the same lock, so the processes must
+share it through multiprocessing.
+
+=== Layout ===
+
+header:
+ - magic		8 bytes, b'MCPRING\\n'
+ - version		ushort
+ - state count		ushort
+ - reserved		uint
+ - capacity		ulong, size of the data area
+ - head			native ulong at offset 64, bytes written, only the
+			producer writes it
+ - tail			native ulong at offset 128, bytes consumed, only the
+			consumer writes it
+ - states		MAX_STATES entries at offset 192 of ubyte length +
+			utf8 name, padded to STATE_SIZE bytes
+
+data, capacity bytes, records 8 byte aligned at head and tail modulo
+capacity:
+ - length		uint, WRAP when the record continues at the start
+ - state		ubyte, index into the state table
+ - reserved		3 bytes
+ - packet id		int
+ - payload		<length> bytes
+
+A record is written before head moves past it and its space is reused only
+after tail moves past it.
+"""
+
+import multiprocessing
+import platform
+import struct
+import sys
+from multiprocessing import shared_memory
+
+from .lib import Decoder, RawFrame, load_varint
+from .parallel import attach
+
+__all__ = ['FrameRing', 'RingFrame']
+
+MAGIC = b'MCPRING\n'
+VERSION = 2
+
+SIZE = 1024 * 1024
+MAX_STATES = 32
+STATE_SIZE = 32
+
+HEADER = struct.Struct('>8sHHIQ')
+LENGTH = struct.Struct('>I')
+RECORD = struct.Struct('>IB3xi')
+COUNT = struct.Struct('>H')
+
+# offsets into the header
+STATE_COUNT = 10
+HEAD = 64
+TAIL = 128
+STATES = 192
+DATA = STATES + MAX_STATES * STATE_SIZE
+
+ALIGN = 8
+WRAP = 0xffffffff
+
+# machines whose order of stores and of loads makes a published head or
+# tail safe to follow, see above
+ORDERED = platform.machine().lower() in ('x86_64', 'amd64') and sys.maxsize > 2 ** 32
+
+def _align(size):
+	return (size + ALIGN - 1) & ~(ALIGN - 1)
+
+class RingFrame:
+	"""
+	A packet in the ring. payload views the shared block, decode() runs
+	the generated decoder of the state on it.
+	"""
+
+	__slots__ = ('state', 'id', 'payload', '_decoder')
+
+	def __init__(self, state, id, payload, decoder=None):
+		self.state = state
+		self.id = id
+		self.payload = payload
+		self._decoder = decoder
+
+	def __repr__(self):
+		return 'RingFrame(state=%r, id=%r, %d bytes)' % (self.state, self.id, len(self.payload))
+
+	def decode(self):
+		"""The decoded packet, a RawFrame when the state has no root."""
+		if self._decoder is None:
+			return RawFrame(self.id, self.payload)
+		return self._decoder(self.payload)
+
+class FrameRing:
+	"""
+	Creates a ring of size bytes when name is None, otherwise attaches to
+	the ring of that name. The creator unlinks the block on close().
+
+	roots maps states to the generated type their packets decode as (like
+	play315.sb), interest is passed on to the Decoder of each.
+
+	lock guards head and tail, it is only needed, and then required when
+	attaching, on machines that may reorder stores or loads.
+	"""
+
+	def __init__(self, name=None, size=SIZE, roots=None, interest=None, lock=None):
+		if lock is None and not ORDERED:
+			if name is not None:
+				raise ValueError('attaching to a frame ring on %s needs the lock of its creator'
+						 % platform.machine())
+			lock = multiprocessing.Lock()
+		self.lock = lock
+
+		if name is None:
+			size = _align(size)
+			self._block = shared_memory.SharedMemory(create=True, size=DATA + size)
+			self._owner = True
+			HEADER.pack_into(self._block.buf, 0, MAGIC, VERSION, 0, 0, size)
+		else:
+			# the creator owns the block and unlinks it
+			self._block = attach(name)
+			self._owner = False
+
+			magic, version, _, _, size = HEADER.unpack_from(self._block.buf)
+			if magic != MAGIC:
+				self._block.close()
+				raise ValueError('not a frame ring %r' % name)
+			if version != VERSION:
+				self._block.close()
+				raise ValueError('unsupported frame ring version %d' % version)
+
+		self.name = self._block.name
+		self.capacity = size
+		self._buf = self._block.buf
+		self._head_word = self._buf[HEAD:HEAD + 8].cast('Q')
+		self._tail_word = self._buf[TAIL:TAIL + 8].cast('Q')
+
+		# producer: head it wrote, tail it last saw
+		# consumer: head it last saw, how far it read
+		self._head = self._load(self._head_word)
+		self._tail = self._load(self._tail_word)
+		self._read = self._tail
+
+		self._states = []
+		self._state_ids = {}
+		self._views = []
+
+		self.roots = dict(roots or {})
+		self.interest = interest
+		self._decoders = {}
+
+	def _load(self, word):
+		if self.lock is None:
+			return word[0]
+		with self.lock:
+			return word[0]
+
+	def _store(self, word, val):
+		if self.lock is None:
+			word[0] = val
+		else:
+			with self.lock:
+				word[0] = val
+
+	# producer
+	def _state(self, state):
+		num = self._state_ids.get(state, None)
+		if num is None:
+			self._load_states()
+			if state in self._states:
+				num = self._states.index(state)
+			else:
+				name = state.encode('utf8')
+				if len(self._states) >= MAX_STATES:
+					raise ValueError('too many states')
+				if len(name) >= STATE_SIZE:
+					raise ValueError('state name too long %r' % state)
+				num = len(self._states)
+				off = STATES + num * STATE_SIZE
+				self._buf[off] = len(name)
+				self._buf[off + 1:off + 1 + len(name)] = name
+				self._states.append(state)
+				# publish the name before any record uses it
+				COUNT.pack_into(self._buf, STATE_COUNT, len(self._states))
+			self._state_ids[state] = num
+		return num
+
+	def put(self, state, payload, packet_id=None):
+		"""
+		Copy a packet into the ring. Returns False, writing nothing, when
+		the consumer has not freed enough space yet.
+		"""
+		if packet_id is None:
+			packet_id, _ = load_varint(payload)
+
+		length = len(payload)
+		need = _align(RECORD.size + length)
+		if need > self.capacity // 2:
+			# a larger record may never fit in front of its wrap mark
+			raise ValueError('packet of %d bytes is too large for the ring' % length)
+
+		pos = self._head % self.capacity
+		skip = self.capacity - pos if pos + need > self.capacity else 0
+		if self._head + skip + need - self._tail > self.capacity:
+			self._tail = self._load(self._tail_word)
+			if self._head + skip + need - self._tail > self.capacity:
+				return False
+
+		state_id = self._state(state)
+		buf = self._buf
+		if skip:
+			LENGTH.pack_into(buf, DATA + pos, WRAP)
+			pos = 0
+
+		off = DATA + pos
+		RECORD.pack_into(buf, off, length, state_id, packet_id)
+		off += RECORD.size
+		buf[off:off + length] = payload
+
+		self._head += skip + need
+		self._store(self._head_word, self._head)
+		return True
+
+	# consumer
+	def _load_states(self):
+		count = COUNT.unpack_from(self._buf, STATE_COUNT)[0]
+		for num in range(len(self._states), count):
+			off = STATES + num * STATE_SIZE
+			name = bytes(self._buf[off + 1:off + 1 + self._buf[off]])
+			self._states.append(name.decode('utf8'))
+
+	def _decoder(self, state):
+		decoder = self._decoders.get(state, None)
+		if decoder is None:
+			root = self.roots.get(state, None)
+			if root is None:
+				return None
+			decoder = self._decoders[state] = Decoder(root, self.interest)
+		return decoder
+
+	def get(self):
+		"""The next frame, or None when the ring is empty."""
+		if self._read == self._head:
+			self._head = self._load(self._head_word)
+			if self._read == self._head:
+				return None
+
+		buf = self._buf
+		pos = self._read % self.capacity
+		if LENGTH.unpack_from(buf, DATA + pos)[0] == WRAP:
+			self._read += self.capacity - pos
+			pos = 0
+
+		off = DATA + pos
+		length, state_id, packet_id = RECORD.unpack_from(buf, off)
+		off += RECORD.size
+		payload = buf[off:off + length]
+		self._views.append(payload)
+		self._read += _align(RECORD.size + length)
+
+		if state_id >= len(self._states):
+			self._load_states()
+		state = self._states[state_id]
+		return RingFrame(state, packet_id, payload, self._decoder(state))
+
+	def frames(self):
+		"""Yields the frames in the ring until it is empty."""
+		while True:
+			frame = self.get()
+			if frame is None:
+				return
+			yield frame
+
+	def done(self):
+		"""Free the space of every frame got so far."""
+		for view in self._views:
+			view.release()
+		self._views.clear()
+		self._tail = self._read
+		self._store(self._tail_word, self._read)
+
+	def close(self):
+		if self._block is None:
+			return
+		for view in self._views:
+			view.release()
+		self._views.clear()
+		self._head_word.release()
+		self._tail_word.release()
+		self._buf = None
+		self._block.close()
+		if self._owner:
+			self._block.unlink()
+		self._block = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
@@ -0,0 +1,140 @@
+"""
+Inventory slot codec.
+
+A slot is an item id (short, -1 for an empty slot, which decodes to None),
+followed by a count (byte), damage (short) and an NBT tag. The id, count
+and damage are decoded eagerly. The NBT stays a slice of the buffer until
+Slot.nbt is read, and a slot that was not modified dumps as a copy of the
+bytes it was decoded from.
+"""
+
+import io
+import struct
+
+from . import lib
+from . import nbt
+
+__all__ = ['Slot']
+
+HEAD = struct.Struct('>hbh')
+EMPTY = struct.pack('>h', -1)
+
+# Slot.nbt before the tail is decoded
+_RAW = object()
+
+class Slot:
+	__slots__ = ('item', 'count', 'damage', '_nbt', '_head', '_raw', '_tail')
+
+	def __init__(self, item, count=1, damage=0, nbt=None):
+		self.item = item
+		self.count = count
+		self.damage = damage
+		self._nbt = nbt
+		self._head = None
+		self._raw = None
+		self._tail = None
+
+	@property
+	def nbt(self):
+		if self._nbt is _RAW:
+			self._nbt, _ = nbt.load(self._tail)
+		return self._nbt
+
+	@nbt.setter
+	def nbt(self, val):
+		# the slot no longer matches the bytes it was decoded from
+		self._nbt = val
+		self._head = None
+		self._raw = None
+		self._tail = None
+
+	@property
+	def modified(self):
+		if self._raw is None:
+			return True
+		if self._head != (self.item, self.count, self.damage):
+			return True
+		if self._nbt is _RAW or self._nbt is None:
+			return False
+		if not isinstance(self._nbt, nbt.NBTCompound):
+			return True
+		return self._nbt.modified
+
+	@property
+	def raw(self):
+		"""The encoded slot if it is unmodified, otherwise None."""
+		return None if self.modified else self._raw
+
+	def __reduce__(self):
+		# the nbt may be a view of the buffer the slot was decoded from
+		f = io.BytesIO()
+		self.dump(f)
+		return _restore, (f.getvalue(),)
+
+	def __eq__(self, other):
+		if not isinstance(other, Slot):
+			return NotImplemented
+		if (self.item, self.count, self.damage) != (other.item, other.count, other.damage):
+			return False
+		if self._tail is not None and other._tail is not None:
+			return self._tail == other._tail
+		return self.nbt == other.nbt
+
+	def __repr__(self):
+		if self._nbt is _RAW:
+			extra = '%d nbt bytes' % len(self._tail)
+		else:
+			extra = 'nbt=%r' % (self._nbt,)
+		return 'Slot(item=%r, count=%r, damage=%r, %s)' % (self.item,
+								   self.count,
+								   self.damage,
+								   extra)
+
+	def dump(self, f):
+		raw = self.raw
+		if raw is not None:
+			f.write(raw)
+			return
+
+		f.write(HEAD.pack(self.item, self.count, self.damage))
+		if self._nbt is _RAW:
+			f.write(self._tail)
+		else:
+			nbt.dump(self._nbt, f)
+
+def load(buf, off=0):
+	start = off
+	try:
+		item, count, damage = HEAD.unpack_from(buf, off)
+	except struct.error:
+		item, off = lib.load_short(buf, off)
+		if item == -1:
+			return None, off
+		raise lib.DecodeError('truncated slot at %d' % start) from None
+
+	if item == -1:
+		return None, off + 2
+
+	off += HEAD.size
+	end = nbt.skip(buf, off)
+
+	slot = Slot(item, count, damage, _RAW)
+	slot._head = (item, count, damage)
+	slot._raw = buf[start:end]
+	slot._tail = buf[off:end]
+	return slot, end
+
+def _restore(data):
+	return load(data)[0]
+
+def skip(buf, off=0):
+	item, off = lib.load_short(buf, off)
+	if item == -1:
+		return off
+	return nbt.skip(buf, off + 3)
+
+def dump(val, f):
+	if val is None:
+		f.write(EMPTY)
+	else:
+		val.dump(f)
@@ -0,0 +1,75 @@
+"""
+Comparison of two versions of a protocol.
+
+signature(type) describes how a type is encoded, without the names of its
+fields: two types with equal signatures encode the same values to the same
+bytes. packets(source, target) pairs the packets of two structs that
+dispatch on their leading id, like play315.cb and play316.cb, by the path
+of the variant, and tells which ones kept their encoding apart from the
+id. Those can be copied with only the id rewritten, the others need a
+converter.
+"""
+
+from . import types
+from . import namespace
+
+__all__ = ['signature', 'packets']
+
+def signature(obj, skip=()):
+	"""
+	A hashable description of the encoding of obj. skip names fields
+	left out of a struct and its branches, like the packet id.
+	"""
+	if isinstance(obj, namespace.MCProtoStruct):
+		names = [name for name in obj.fields if name not in skip]
+		fields = tuple(signature(obj.fields[name].field_type) for name in names)
+		constraints = tuple(sorted((names.index(name), val)
+				     for name, val in obj.constraints.items()
+				     if name in names))
+		branches = tuple((path, signature(branch, skip))
+				 for path, branch in obj.branches.items()
+				 if path is not None)
+		return ('struct', fields, constraints, branches, None in obj.branches)
+	elif isinstance(obj, types.MCProtoBuiltinType):
+		return (obj.__class__.__name__,) + tuple(
+			(key, signature(val)) for key, val in sorted(vars(obj).items()))
+	return obj
+
+def _key(struct):
+	if isinstance(struct, namespace.MCProtoVariant) or len(struct.fields) != 1:
+		raise ValueError('%s does not dispatch on a leading id' % struct.name)
+	key, field = next(iter(struct.fields.items()))
+	if getattr(field.field_type, 'name', None) != 'varint':
+		raise ValueError('%s does not dispatch on a varint id' % struct.name)
+	return key
+
+def packets(source, target):
+	"""
+	Yields (source packet, target packet, same) for the packets of source
+	that target has too, same is True when only the id changed.
+	"""
+	key = _key(source)
+	if _key(target) != key:
+		raise ValueError('%s and %s dispatch on different fields'
+				 % (source.name, target.name))
+
+	for path, packet in source.branches.items():
+		if path is None or key not in packet.constraints:
+			continue
+		other = target.branches.get(path, None)
+		if other is None or key not in other.constraints:
+			continue
+		same = signature(packet, (key,)) == signature(other, (key,))
+		yield packet, other, same
+
+def leaves(packet, path=()):
+	"""
+	Yields (path, variant) for the variants of a packet that are
+	instantiated, path is the tuple of branch paths from the packet.
+	"""
+	if not packet.branches or None in packet.branches:
+		yield path, packet
+	for branch_path, branch in packet.branches.items():
+		if branch_path is not None:
+			for leaf in leaves(branch, path + (branch_path,)):
+				yield leaf
@@ -43,6 +43,7 @@ Enum types:
 """
 
 import collections
+import weakref
 
 from .ast import *
 
@@ -60,10 +61,12 @@ from .namespace import *
 
 __all__ = ['MCProtoBaseType', 'MCProtoStruct', 'MCProtoVariant',
 	   'MCProtoBuiltinType', 'MCProtoParamType',
-	   'MCProtoSimpleType', 'MCProtoIntType', 'MCProtoBaseStringType',
+	   'MCProtoSimpleType', 'MCProtoIntType', 'MCProtoBitsType',
+	   'MCProtoBaseStringType',
 	   'MCProtoStringType', 'MCProtoBytesType', 'MCProtoUUIDType',
 	   'MCProtoBaseArrayType', 'MCProtoArrayType',
-	   'MCProtoBoolOptionalType', 'MCProtoTypeFactory',
+	   'MCProtoBoolOptionalType', 'MCProtoEnumType', 'MCProtoFlagType',
+	   'MCProtoTypePool', 'MCProtoTypeFactory',
 	   'MCProtoVisitor']
 
 def register_type(name):
@@ -76,19 +79,54 @@ class MCProtoBuiltinType(MCProtoBaseType):
 	def __init__(self, name):
 		self.name = name
 
-class MCProtoParamType(MCProtoBuiltinType):
-	_POOL = {}
+class MCProtoTypePool:
+	"""
+	Interns parameterized types so equal specs share one instance.
 
-	# memorize the result to reduce reuse the constructed types
-	def parameterize(self, *args):
-		key = (self.__class__, args)
+	Entries are weak, a type is dropped once no compiled namespace uses
+	it. Compilers that should share types, like the files of one schema
+	set, can be handed the same pool.
+	"""
 
-		cached = self._POOL.get(key, None)
+	def __init__(self):
+		self._types = weakref.WeakValueDictionary()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, cls, name, args):
+		# types in the key go by id, a key holding them would keep them
+		# and the namespaces they are part of alive. A live entry holds
+		# its arguments, so their ids are not reused while it exists
+		key = (cls, name, tuple(id(arg) if isinstance(arg, MCProtoBaseType) else arg
+					for arg in args))
+
+		cached = self._types.get(key, None)
 		if cached is None:
-			cached = key[0](self.name, *key[1])
-			self._POOL[key] = cached
+			self.misses += 1
+			cached = cls(name, *args)
+			self._types[key] = cached
+		else:
+			self.hits += 1
 		return cached
 
+	def __len__(self):
+		return len(self._types)
+
+	def clear(self):
+		self._types.clear()
+
+	def stats(self):
+		by_type = collections.Counter(cls.__name__ for cls, _, _ in self._types.keys())
+		return {'types': len(self._types),
+			'hits': self.hits,
+			'misses': self.misses,
+			'by_type': dict(by_type)}
+
+class MCProtoParamType(MCProtoBuiltinType):
+	# memorize the result to reduce reuse the constructed types
+	def parameterize(self, pool, *args):
+		return pool.get(self.__class__, self.name, args)
+
 @register_type('float')
 @register_type('double')
 @register_type('position')
@@ -113,6 +151,37 @@ class MCProtoSimpleType(MCProtoBuiltinType):
 class MCProtoIntType(MCProtoSimpleType):
 	pass
 
+# bit fields
+@register_type('signed')
+@register_type('unsigned')
+class MCProtoBitsType(MCProtoParamType):
+	MAX_BITS = 64
+
+	def __init__(self, name, bits=None):
+		super().__init__(name)
+		self.bits = bits
+
+	@property
+	def signed(self):
+		return self.name == 'signed'
+
+	def __call__(self, spec, factory):
+		if len(spec.args) == 1 and self.bits is not None:
+			# a typedef of a bit field
+			return self
+
+		if len(spec.args) != 2 or not isinstance(spec.args[1], Number):
+			raise ValueError('expected "%s <bits>" at %s' % (self.name, spec.pos))
+
+		bits = int(spec.args[1])
+		if not 0 < bits <= self.MAX_BITS:
+			raise ValueError('expected 1 to %d bits at %s' % (self.MAX_BITS, spec.pos))
+
+		return self.parameterize(factory.pool, bits)
+
+# the types a length prefix may have
+LENGTH_TYPES = (MCProtoIntType, MCProtoBitsType)
+
 # string types
 class MCProtoBaseStringType(MCProtoParamType):
 	_types = ('length',)
@@ -126,6 +195,8 @@ class MCProtoStringType(MCProtoBaseStringType):
 	ENCODINGS = {'utf8', 'utf16'}
 	DEFAULT_ENCODING = 'utf8'
 	DEFAULT_LENGTH = 'varint'
+	# the length of a NUL terminated string
+	NUL = 'nul'
 
 	def __init__(self, name, length=None, encoding=None):
 		super().__init__(name, length or self.DEFAULT_LENGTH)
@@ -140,17 +211,19 @@ class MCProtoStringType(MCProtoBaseStringType):
 		if isinstance(length, Number):
 			# constant length
 			length = int(length)
+		elif length == self.NUL or (isinstance(length, Identifier) and str(length) == self.NUL):
+			length = self.NUL
 		else:
 			# int type length
 			length = factory(length)
-			if not isinstance(length, MCProtoIntType):
+			if not isinstance(length, LENGTH_TYPES):
 				raise ValueError('expected int type for <length> at %s' % spec.pos)
 
 		encoding = str(spec.args[2]) if len(spec.args) > 2 else self.encoding
 		if encoding not in self.ENCODINGS:
 			raise ValueError('unknown encoding %s at %s' % (encoding, spec.pos))
 
-		return self.parameterize(length, encoding)
+		return self.parameterize(factory.pool, length, encoding)
 
 @register_type('bytes')
 class MCProtoBytesType(MCProtoBaseStringType):
@@ -174,10 +247,10 @@ class MCProtoBytesType(MCProtoBaseStringType):
 			else:
 				# int type length
 				length = factory(length)
-				if not isinstance(length, MCProtoIntType):
+				if not isinstance(length, LENGTH_TYPES):
 					raise ValueError('expected int type for <length> at %s' % spec.pos)
 
-		return self.parameterize(length)
+		return self.parameterize(factory.pool, length)
 
 @register_type('uuid')
 class MCProtoUUIDType(MCProtoParamType):
@@ -196,7 +269,7 @@ class MCProtoUUIDType(MCProtoParamType):
 		if encoding not in self.ENCODINGS:
 			raise ValueError('unknown encoding %s at %s' % (encoding, spec.pos))
 
-		return self.parameterize(encoding)
+		return self.parameterize(factory.pool, encoding)
 
 # arrays
 class MCProtoBaseArrayType(MCProtoParamType):
@@ -218,12 +291,12 @@ class MCProtoArrayType(MCProtoBaseArrayType):
 		else:
 			length = factory(spec.args[1])
 
-		if not isinstance(length, int) and not isinstance(length, MCProtoIntType):
+		if not isinstance(length, int) and not isinstance(length, LENGTH_TYPES):
 			raise ValueError('expected int type for <length> at %s' % spec.pos)
 
 		elem = factory(spec.args[2])
 
-		return self.parameterize(length, elem)
+		return self.parameterize(factory.pool, length, elem)
 
 @register_type('bool_optional')
 class MCProtoBoolOptionalType(MCProtoBaseArrayType):
@@ -234,12 +307,88 @@ class MCProtoBoolOptionalType(MCProtoBaseArrayType):
 		length = factory('bool')
 		elem = factory(spec.args[1])
 
-		return self.parameterize(length, elem)
+		return self.parameterize(factory.pool, length, elem)
+
+# enumerations
+@register_type('enum')
+class MCProtoEnumType(MCProtoParamType):
+	_types = ('base',)
+
+	def __init__(self, name, base=None, members=()):
+		super().__init__(name)
+		self.base = base
+		# ((name, value), ...) in definition order
+		self.members = members
+
+	def value(self, name, pos=None):
+		for member, val in self.members:
+			if member == name:
+				return val
+		raise ValueError('no %s member %r at %s' % (self.name, name, pos))
+
+	def _check_base(self, base, spec):
+		if not isinstance(base, (MCProtoIntType, MCProtoStringType)) \
+		   or base.name == 'bool':
+			raise ValueError('expected int or string type for <base> at %s' % spec.pos)
+
+	def __call__(self, spec, factory):
+		if len(spec.args) == 1 and self.base is not None:
+			# a typedef of an enum
+			return self
+
+		if len(spec.args) != 3 or not isinstance(spec.args[2], list):
+			raise ValueError('expected "%s <base> { NAME=value; ... }" at %s' \
+					 % (self.name, spec.pos))
+
+		base = factory(spec.args[1])
+		self._check_base(base, spec)
+		value_type = str if isinstance(base, MCProtoStringType) else int
+
+		members = []
+		names = set()
+		values = set()
+		for node in spec.args[2]:
+			if not isinstance(node, ConstraintDef) \
+			   or not isinstance(node.left, Identifier) \
+			   or not isinstance(node.right, Value):
+				raise ValueError('expected NAME = value at %s' % node.pos)
+
+			name = str(node.left)
+			val = node.right.value
+			if not isinstance(val, value_type):
+				raise ValueError('expected %s value at %s' \
+						 % (value_type.__name__, node.pos))
+			if name in names:
+				raise ValueError('duplicate %r at %s' % (name, node.pos))
+			if val in values:
+				raise ValueError('duplicate value %r at %s' % (val, node.pos))
+			names.add(name)
+			values.add(val)
+			members.append((name, val))
+
+		if not members:
+			raise ValueError('empty %s at %s' % (self.name, spec.pos))
+
+		return self.parameterize(factory.pool, base, tuple(members))
+
+@register_type('flag')
+class MCProtoFlagType(MCProtoEnumType):
+	@property
+	def mask(self):
+		mask = 0
+		for _, val in self.members:
+			mask |= val
+		return mask
+
+	def _check_base(self, base, spec):
+		if not isinstance(base, MCProtoIntType) or base.name == 'bool':
+			raise ValueError('expected int type for <base> at %s' % spec.pos)
 
 class MCProtoTypeFactory:
-	def __init__(self, compiler):
+	def __init__(self, compiler, pool=None):
 		self.compiler = compiler
 		self.parent = None
+		self.pool = MCProtoTypePool() if pool is None else pool
 
 	def _build_type(self, spec):
 		if not spec.args:
@@ -252,6 +401,16 @@ class MCProtoTypeFactory:
 		if type_val is None:
 			type_val = self.parent.get(name, None)
 
+		if type_val is None:
+			# enum and flag typedefs, and only those, are also visible
+			# in nested scopes, so packets can share them
+			try:
+				outer = self.parent.lookup(name)
+			except KeyError:
+				outer = None
+			if isinstance(outer, MCProtoEnumType):
+				type_val = outer
+
 		if type_val is None:
 			raise ValueError('unknown type %r at %s' % (name, spec.pos))
 
@@ -0,0 +1,73 @@
+"""
+Shared fixtures. Generated modules are written to a directory on sys.path
+and imported by name, so pool workers can import them too.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mcproto
+
+HANDSHAKE = os.path.join(ROOT, 'src', 'handshake.mcproto')
+MC315 = os.path.join(ROOT, 'src', 'mc315.mcproto')
+
+@pytest.fixture(scope='session')
+def gendir(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp('generated'))
+	sys.path.insert(0, path)
+	yield path
+	sys.path.remove(path)
+
+@pytest.fixture(scope='session')
+def generate(gendir):
+	"""
+	generate(name, srcs, source=None, **options) compiles srcs, or the
+	schema text source, with PyGenerator(**options) into module name. A
+	name is generated once per session.
+	"""
+	modules = {}
+
+	def generate(name, srcs=(MC315,), source=None, **options):
+		if name in modules:
+			return modules[name]
+
+		if source is not None:
+			code = mcproto.compiler.compile('<%s>' % name, source)
+		else:
+			code = mcproto.compiler.compile_many(srcs, processes=1)
+
+		gen = mcproto.PyGenerator(**options)
+		gen.visit(code)
+		if gen.split:
+			package = os.path.join(gendir, name)
+			os.makedirs(package, exist_ok=True)
+			for filename, out in gen.emit_package().items():
+				with open(os.path.join(package, filename), 'w') as f:
+					f.write(out + '\n')
+		else:
+			with open(os.path.join(gendir, name + '.py'), 'w') as f:
+				f.write(gen.emit() + '\n')
+
+		importlib.invalidate_caches()
+		modules[name] = importlib.import_module(name)
+		return modules[name]
+
+	yield generate
+	for name in modules:
+		for key in [key for key in sys.modules if key == name or key.startswith(name + '.')]:
+			del sys.modules[key]
+
+@pytest.fixture(scope='session', params=mcproto.pygen.TIERS)
+def mc(request, generate):
+	"""mc315 generated in each tier."""
+	return generate('mc_%s' % request.param, tier=request.param)
+
+@pytest.fixture(scope='session')
+def mc_strict(generate):
+	return generate('mc_strict')
@@ -0,0 +1,58 @@
+import io
+import uuid
+
+class Pipe:
+	"""A file that cannot seek."""
+
+	def __init__(self):
+		self.parts = []
+
+	def write(self, data):
+		self.parts.append(bytes(data))
+
+	def getvalue(self):
+		return b''.join(self.parts)
+
+def encode(packet, f=None):
+	f = f or io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def test_backpatch(mc):
+	# an int count is reserved and backpatched in a seekable file
+	explosion = mc.play315.cb.world.explosion
+	item = explosion.records_item
+	records = [item(num % 100, -num % 100, 3) for num in range(1000)]
+	data = encode(explosion(1.0, 2.0, 3.0, 4.0, records, 0.5, 0.5, 0.5))
+	assert encode(explosion(1.0, 2.0, 3.0, 4.0, iter(records), 0.5, 0.5, 0.5)) == data
+	assert encode(explosion(1.0, 2.0, 3.0, 4.0, (r for r in []), 0.5, 0.5, 0.5)) \
+		== encode(explosion(1.0, 2.0, 3.0, 4.0, [], 0.5, 0.5, 0.5))
+	packet, _ = mc.play315.cb.load(data)
+	assert len(packet.records) == 1000
+
+def test_scratch(mc):
+	# varint counts, and any count on a file that cannot seek, are
+	# written ahead of items encoded into a scratch buffer
+	world = mc.play315.cb.world
+	item = world.update_blocks.records_item
+	records = [item(num & 0xff, num % 256, num * 7) for num in range(300)]
+	data = encode(world.update_blocks(1, 2, records))
+	assert encode(world.update_blocks(1, 2, iter(records))) == data
+	assert encode(world.update_blocks(1, 2, (r for r in records)), Pipe()) == data
+	assert encode(world.update_blocks(1, 2, iter([]))) == encode(world.update_blocks(1, 2, []))
+
+	explosion = world.explosion
+	records = [explosion.records_item(1, 2, 3)] * 10
+	data = encode(explosion(1.0, 2.0, 3.0, 4.0, records, 0.5, 0.5, 0.5))
+	assert encode(explosion(1.0, 2.0, 3.0, 4.0, iter(records), 0.5, 0.5, 0.5), Pipe()) == data
+
+def test_nested(mc):
+	properties = mc.play315.cb.world.entity.properties
+	item = properties.properties_item
+	modifier = item.modifiers_item
+	def build(make):
+		return [item('k%d' % num, 1.0, make(modifier(uuid.UUID(int=5), 2.0, 1) for _ in range(num)))
+			for num in range(5)]
+	data = encode(properties(3, build(list)))
+	assert encode(properties(3, build(iter))) == data
+	assert encode(properties(3, iter(build(iter))), Pipe()) == data
@@ -0,0 +1,62 @@
+import pickle
+
+import pytest
+
+from mcproto.ast import Source, Node, NamespaceDef, TypeDef, FieldDef
+from mcproto.compiler import compile
+from mcproto.parser import parse
+
+SRC = """namespace t {
+	type a {
+		x : int;
+		bad : nosuch;
+	};
+};
+"""
+
+def test_source_position():
+	source = Source('<t>', 'ab\ncd\n\nef')
+	assert source._lines is None
+	assert source.position(0) == (1, 0)
+	assert source.position(4) == (2, 1)
+	assert source._lines == [0, 3, 6, 7]
+	assert source.position(6) == (3, 0)
+	assert source.position(8) == (4, 1)
+
+def test_node_positions():
+	body = parse('<t>', SRC)
+	ns = body[0]
+	assert isinstance(ns, NamespaceDef) and (ns.lineno, ns.col_offset) == (1, 0)
+	typedef = ns.body[0]
+	assert isinstance(typedef, TypeDef) and typedef.pos == '<t>:2 col 1'
+	field = typedef.spec[1]
+	assert isinstance(field, FieldDef) and field.names[0].pos == '<t>:4 col 2'
+	assert field.field_type.pos == '<t>:4 col 8'
+	# nodes of a file share its source
+	assert ns._source is field._source and field._srcname == '<t>'
+
+def test_lazy_lines():
+	ns = parse('<t>', SRC)[0]
+	assert ns._source._lines is None
+	ns.pos
+	assert ns._source._lines is not None
+
+def test_slots():
+	body = parse('<t>', SRC)
+	with pytest.raises(AttributeError):
+		body[0].__dict__
+	with pytest.raises(AttributeError):
+		body[0].lineno = 3
+
+def test_no_source():
+	node = Node()
+	assert node.lineno is None and node.col_offset is None
+	assert node.pos == 'None:None col None'
+
+def test_pickle():
+	ns = pickle.loads(pickle.dumps(parse('<t>', SRC)))[0]
+	assert ns._source._lines is None and ns.body[0].pos == '<t>:2 col 1'
+
+def test_error_position():
+	with pytest.raises(ValueError, match='<t>:4 col 8'):
+		compile('<t>', SRC)
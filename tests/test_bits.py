@@ -0,0 +1,80 @@
+import io
+import random
+
+import pytest
+
+from mcproto.lib import DecodeError
+
+SCHEMA = """
+namespace t {
+	type pkt {
+		id : varint;
+		variant a { id=1; hi : unsigned 4; lo : unsigned 4; x : int; };
+		variant b { id=2; f1, f2, f3 : unsigned 1; rest : signed 5; n : signed 24; s : string (unsigned 16); };
+		variant c { id=3; p : position; q : unsigned 20; r : signed 20; arr : array (signed 16) (unsigned 24); };
+		variant d { id=4; big : unsigned 40; y : signed 12; z : signed 12; w : varint; at : position; };
+	};
+	type flagged {
+		kind : unsigned 3;
+		more : unsigned 5;
+		variant one { kind=1; v : varint; };
+		variant two { kind=2; lo : unsigned 4; hi : unsigned 4; };
+	};
+};
+"""
+
+PROJECTIONS = {
+	't.pkt.b': [('f2', 'n')],
+	't.pkt.d': [('z', 'w')],
+}
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def t(request, generate):
+	return generate('bits_%s' % request.param, source=SCHEMA, tier=request.param,
+			projections=PROJECTIONS).t
+
+def packets(t, rand):
+	yield t.pkt, t.pkt.a(rand.randrange(16), rand.randrange(16), rand.randrange(-2 ** 31, 2 ** 31))
+	yield t.pkt, t.pkt.b(rand.randrange(2), rand.randrange(2), rand.randrange(2), rand.randrange(-16, 16),
+			     rand.randrange(-2 ** 23, 2 ** 23), 'hi')
+	yield t.pkt, t.pkt.c((rand.randrange(-2 ** 25, 2 ** 25), rand.randrange(-2048, 2048), rand.randrange(-2 ** 25, 2 ** 25)),
+			     rand.randrange(2 ** 20), rand.randrange(-2 ** 19, 2 ** 19),
+			     [rand.randrange(2 ** 24) for _ in range(3)])
+	yield t.pkt, t.pkt.d(rand.randrange(2 ** 40), rand.randrange(-2048, 2048), rand.randrange(-2048, 2048),
+			     rand.randrange(1000), (1, -2, 3))
+	yield t.flagged, t.flagged.one(rand.randrange(32), 5)
+	yield t.flagged, t.flagged.two(rand.randrange(32), rand.randrange(16), rand.randrange(16))
+
+def test_round_trip(t):
+	rand = random.Random(1)
+	for _ in range(200):
+		for root, packet in packets(t, rand):
+			data = encode(packet)
+			out, off = root.load(data)
+			assert off == len(data) and vars(out) == vars(packet)
+
+def test_packed(t):
+	# four bit fields share a byte, the run is read whole
+	assert encode(t.pkt.a(0xa, 0x5, 0)) == b'\x01\xa5\x00\x00\x00\x00'
+	assert encode(t.pkt.b(1, 0, 1, -1, -2, ''))[:5] == b'\x02\xbf\xff\xff\xfe'
+	assert encode(t.flagged.two(0, 3, 4))[1:] == b'\x34'
+
+def test_projection(t):
+	packet = t.pkt.b(1, 1, 0, 3, -5, 'x')
+	assert t.pkt.b.project_f2_n(encode(packet)) == (1, -5)
+	packet = t.pkt.d(5, 6, -7, 300, (0, 0, 0))
+	assert t.pkt.d.project_z_w(encode(packet)) == (-7, 300)
+
+def test_strict(generate):
+	t = generate('bits_strict', source=SCHEMA, projections=PROJECTIONS).t
+	with pytest.raises(ValueError):
+		encode(t.pkt.a(16, 0, 0))
+	with pytest.raises(ValueError):
+		encode(t.pkt.b(0, 0, 0, 16, 0, ''))
+	with pytest.raises(DecodeError):
+		t.pkt.load(b'\x04\x00\x00')
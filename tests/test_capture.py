@@ -0,0 +1,106 @@
+import struct
+
+import pytest
+
+from mcproto import CaptureReader, CaptureWriter, Replayer
+from mcproto.lib import DecodeError, load_varint, load_varlong, pack_varint, pack_varlong
+
+def write_capture(path, count=100):
+	with CaptureWriter(path) as writer:
+		for num in range(count):
+			writer.write('play315' if num % 2 else 'login',
+				     'cb' if num % 3 else 'sb',
+				     pack_varint(num % 5) + b'x' * num,
+				     timestamp=1000 + num)
+
+@pytest.mark.parametrize('val', [0, 1, 127, 128, 300, -1, 2 ** 31 - 1, -2 ** 31])
+def test_varint_round_trip(val):
+	data = pack_varint(val)
+	assert load_varint(data) == (val, len(data))
+	assert load_varint(b'\x00' + data, 1) == (val, len(data) + 1)
+
+@pytest.mark.parametrize('val', [0, 300, -1, 2 ** 63 - 1, -2 ** 63])
+def test_varlong_round_trip(val):
+	data = pack_varlong(val)
+	assert load_varlong(data) == (val, len(data))
+
+@pytest.mark.parametrize('data', [
+	b'\xff\xff\xff\xff\x1f',	# 35 bits
+	b'\x80\x80\x80\x80\x70',
+	b'\xff\xff\xff\xff\xff\x01',	# 6 bytes
+	b'\x80\x80',			# truncated
+])
+def test_varint_rejects(data):
+	with pytest.raises(DecodeError):
+		load_varint(data)
+
+def test_varlong_rejects_oversized():
+	with pytest.raises(DecodeError):
+		load_varlong(b'\xff' * 9 + b'\x03')
+
+def test_select(tmp_path):
+	path = str(tmp_path / 'c.cap')
+	write_capture(path)
+
+	with CaptureReader(path) as capture:
+		assert len(capture) == 100
+		assert capture.states == ['login', 'play315']
+
+		records = list(capture.select(packet_id=3, state='play315', start=1010, end=1050))
+		assert [record.timestamp for record in records] == [1013, 1023, 1033, 1043]
+		assert all(record.direction == 'cb' or (record.timestamp - 1000) % 3 == 0
+			   for record in records)
+		assert bytes(records[0].payload) == pack_varint(3) + b'x' * 13
+
+		assert [record.timestamp for record in capture.select(direction='sb', start=1090)] \
+			== [1090, 1093, 1096, 1099]
+		assert [record.timestamp for record in capture.select(start=1097)] == [1097, 1098, 1099]
+		assert list(capture.select(state='status')) == []
+		for record in records:
+			record.payload.release()
+
+def test_recover_unfinished(tmp_path):
+	path = str(tmp_path / 'c.cap')
+	write_capture(path)
+
+	# drop the index and cut the last record short
+	data = open(path, 'rb').read()
+	with open(path, 'wb') as f:
+		f.write(data[:8] + struct.pack('>HHQ', 1, 0, 0) + data[20:3000])
+
+	with CaptureReader(path) as capture:
+		count = len(capture)
+		assert 0 < count < 100
+		timestamps = [record.timestamp for record in capture.select(packet_id=1)]
+		assert timestamps == list(range(1001, 1000 + count, 5))
+		last = capture[-1]
+		assert bytes(last.payload) == pack_varint((count - 1) % 5) + b'x' * (count - 1)
+		last.payload.release()
+		assert capture.states == ['#0', '#1']
+
+def test_bad_capture(tmp_path):
+	path = tmp_path / 'bad.cap'
+	path.write_bytes(b'NOTACAPTURE' * 3)
+	with pytest.raises(ValueError):
+		CaptureReader(str(path))
+
+def test_replayer(tmp_path):
+	path = str(tmp_path / 'c.cap')
+	write_capture(path, 10)
+
+	slept = []
+	now = [0.0]
+	def sleep(delay):
+		slept.append(delay)
+		now[0] += delay
+
+	with CaptureReader(path) as capture:
+		decoders = {('login', 'sb'): lambda payload: bytes(payload[:2])}
+		out = [(record.timestamp, packet) for record, packet
+		       in Replayer(list(capture), decoders, speed=1.0,
+				   clock=lambda: now[0], sleep=sleep)]
+
+	assert out[0] == (1000, b'\x00')
+	assert out[6] == (1006, b'\x01x')
+	assert out[1] == (1001, None)
+	assert len(slept) == 9 and sum(slept) == pytest.approx(9e-9)
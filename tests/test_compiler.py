@@ -0,0 +1,83 @@
+import re
+
+import pytest
+
+from mcproto.compiler import compile, compile_many
+
+FIRST = """
+namespace proto {
+	type point { x, y : int; };
+	namespace cb {
+		type keepalive { id : varint; };
+	};
+};
+"""
+
+SECOND = """
+namespace proto {
+	namespace cb {
+		type chat { text : string; };
+		type ping : keepalive;
+	};
+	namespace sb {
+		type chat { text : string; };
+	};
+};
+namespace other {
+	type thing { v : varint; };
+};
+"""
+
+@pytest.fixture
+def files(tmp_path):
+	def files(*srcs):
+		names = []
+		for num, src in enumerate(srcs):
+			path = tmp_path / ('%d.mcproto' % num)
+			path.write_text(src)
+			names.append(str(path))
+		return names
+	return files
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_merge(files, processes):
+	ns = compile_many(files(FIRST, SECOND), processes=processes)
+	assert list(ns) == ['proto', 'other']
+	assert list(ns['proto']) == ['point', 'cb', 'sb']
+	assert list(ns['proto']['cb']) == ['keepalive', 'chat', 'ping']
+	# names resolve across files
+	assert ns['proto']['cb']['ping'] is ns['proto']['cb']['keepalive']
+
+@pytest.mark.parametrize('src', [
+	'namespace proto { type point { z : int; }; };',
+	'namespace proto { namespace cb { type keepalive { id : varint; }; }; };',
+	'type proto { x : int; };',
+])
+@pytest.mark.parametrize('processes', [1, 2])
+def test_duplicate(files, src, processes):
+	names = files(FIRST, src)
+	with pytest.raises(ValueError, match='duplicate') as info:
+		compile_many(names, processes=processes)
+	# the error points at the second definition
+	assert names[1] in str(info.value)
+
+@pytest.mark.parametrize('src', [
+	FIRST + 'namespace proto { type chat { text : string; }; };',
+	SECOND + 'namespace other { type more { v : varint; }; };',
+])
+def test_duplicate_in_file(files, src):
+	# namespaces are only merged across files, both entry points reject
+	# one defined twice in a file
+	name, = files(src)
+	with pytest.raises(ValueError, match='duplicate'):
+		compile(name)
+	with pytest.raises(ValueError, match='duplicate'):
+		compile_many([name])
+	with pytest.raises(ValueError, match='duplicate'):
+		compile_many(files(src, 'namespace third { };'), processes=1)
+
+def test_syntax_error(files):
+	# errors raised in a worker name the file they come from
+	names = files(FIRST, 'namespace {')
+	with pytest.raises(ValueError, match=re.escape('expected name at %s:1 col 10' % names[1])):
+		compile_many(names, processes=2)
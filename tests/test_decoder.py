@@ -0,0 +1,82 @@
+import io
+import uuid
+
+import pytest
+
+import mcproto
+from mcproto.lib import Decoder, DecodeError, RawFrame, pack_varint
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def round_trip(packet, root):
+	data = encode(packet)
+	for buf in (data, bytearray(data), memoryview(data)):
+		out, off = root.load(buf)
+		assert off == len(data)
+		assert type(out) is type(packet)
+		assert encode(out) == data
+	return out
+
+def test_round_trip(mc):
+	play = mc.play315
+	out = round_trip(play.sb.player.use_entity.interact_at(5, 1.0, 2.0, 3.0, 1), play.sb)
+	assert (out.target, out.x, out.z, out.hand) == (5, 1.0, 3.0, 1)
+
+	prop = play.cb.world.entity.properties
+	item = prop.properties_item
+	out = round_trip(prop(7, [item('k', 1.5, [item.modifiers_item(uuid.UUID(int=1), 2.0, 1)])]), play.cb)
+	assert out.properties[0].modifiers[0].modifier_uuid == uuid.UUID(int=1)
+
+	out = round_trip(play.cb.gui.window.open.horse(1, 'T', 3, 99), play.cb)
+	assert out.entity == 99
+	round_trip(play.cb.gui.window.open(1, 'chest', 'T', 3), play.cb)
+	out = round_trip(play.cb.world.block_break((-5, 3, 70000), 2), play.cb)
+	assert out.at == (-5, 3, 70000)
+	out = round_trip(play.cb.client.plugin_message('MC|Brand', b'vanilla'), play.cb)
+	assert bytes(out.data) == b'vanilla'
+
+def test_unknown_id(mc):
+	with pytest.raises(DecodeError):
+		mc.play315.cb.load(b'\x7f\x00')
+
+def test_negative_count(mc_strict):
+	update = mc_strict.play315.cb.world.update_blocks
+	data = encode(update(1, 2, []))
+	assert data.endswith(b'\x00')
+	with pytest.raises(DecodeError):
+		mc_strict.play315.cb.load(data[:-1] + pack_varint(-1))
+
+def test_selective(mc):
+	cb = mc.play315.cb
+	decoder = Decoder(cb, ['play315.cb.world.entity.*', 'play315.cb.world.border.lerp'])
+	assert cb.world.entity.move.id in decoder.keys
+	assert cb.client.plugin_message.id not in decoder.keys
+
+	data = encode(cb.client.plugin_message('MC|Brand', b'vanilla'))
+	frame = decoder(data)
+	assert isinstance(frame, RawFrame)
+	assert frame.id == cb.client.plugin_message.id and bytes(frame.payload) == data
+	f = io.BytesIO()
+	frame.dump(f)
+	assert f.getvalue() == data
+
+	data = encode(cb.world.border.lerp(1.0, 2.0, 3))
+	assert type(decoder(data)) is cb.world.border.lerp
+	assert type(Decoder(cb)(data)) is cb.world.border.lerp
+
+	decoder.register('play315.cb.client.*')
+	assert type(decoder(encode(cb.client.keepalive(3)))) is cb.client.keepalive
+
+def test_replay_with_decoder(mc):
+	cb = mc.play315.cb
+	data = encode(cb.world.border.lerp(1.0, 2.0, 3))
+	record = mcproto.CaptureRecord(0, 'cb', 'play315', 0x1a, data)
+	(_, packet), = mcproto.Replayer([record], {('play315', 'cb'): Decoder(cb)})
+	assert packet.speed == 3
+
+def test_not_dispatching(mc):
+	with pytest.raises(TypeError):
+		Decoder(mc.play315.cb.world.entity.move)
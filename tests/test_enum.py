@@ -0,0 +1,98 @@
+import enum
+import io
+
+import pytest
+
+from mcproto.compiler import compile
+from mcproto.lib import DecodeError
+
+SCHEMA = """
+namespace t {
+	type hand : enum varint { main=0; off=1; };
+	type rel : flag byte { x=0x01; y=0x02; z=0x04; y_rot=0x08; x_rot=0x10; };
+	type big : enum int { a=-1; b=100000; };
+	type pkt {
+		id : varint;
+		variant use {
+			id=1;
+			target : varint;
+			action : enum varint { interact=0; attack=1; interact_at=2; };
+			variant interact { action=interact; h : hand; };
+			variant attack { action=attack; };
+		};
+		variant tp {
+			id=2;
+			flags : rel;
+			b : big;
+			lvl : enum string { default="default"; flat="flat"; };
+		};
+	};
+};
+"""
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def t(request, generate):
+	return generate('enums_%s' % request.param, source=SCHEMA, tier=request.param).t
+
+def round_trip(t, packet):
+	data = encode(packet)
+	out, off = t.pkt.load(data)
+	assert off == len(data) and type(out) is type(packet) and encode(out) == data
+	return out
+
+def test_classes(t):
+	assert issubclass(t.hand, enum.IntEnum) and t.hand.OFF == 1
+	assert issubclass(t.rel, enum.IntFlag)
+	assert t.big.B == 100000
+
+def test_dispatch(t):
+	# an enum field picks the branch
+	out = round_trip(t, t.pkt.use.interact(5, t.hand.OFF))
+	assert out.h is t.hand.OFF and out.target == 5
+	assert type(round_trip(t, t.pkt.use.attack(7))) is t.pkt.use.attack
+
+def test_constraints(t):
+	# a constrained enum field holds the member both ways
+	interact = t.pkt.use.interact
+	assert interact.action.name == 'INTERACT' and interact.action == 0
+	out = round_trip(t, interact(5, t.hand.MAIN))
+	assert out.action is interact.action is type(interact.action).INTERACT
+	assert t.pkt.use.attack(7).action is round_trip(t, t.pkt.use.attack(7)).action
+
+def test_values(t):
+	out = round_trip(t, t.pkt.tp(t.rel.X | t.rel.Z, t.big.B, 'flat'))
+	assert out.flags == t.rel.X | t.rel.Z and isinstance(out.flags, t.rel)
+	assert out.b is t.big.B and out.lvl == 'flat' and isinstance(out.lvl, enum.Enum)
+	out = round_trip(t, t.pkt.tp(t.rel(0), t.big.A, 'default'))
+	assert out.b is t.big.A and not out.flags
+
+def test_strict(generate):
+	t = generate('enums_strict', source=SCHEMA).t
+	# unknown enum value, unknown flag bit, unknown string
+	for data in (bytes([1, 5, 0, 9]), bytes([2, 0x40, 0, 0, 0, 0, 1, 0x61]),
+		     bytes([2, 0x01, 0xff, 0xff, 0xff, 0xff, 1, 0x61])):
+		with pytest.raises(DecodeError):
+			t.pkt.load(data)
+	# the errors name the field
+	with pytest.raises(ValueError, match=r't\.pkt\.use\.interact\.h 3'):
+		encode(t.pkt.use.interact(5, 3))
+	with pytest.raises(ValueError, match=r't\.pkt\.tp\.flags 64'):
+		encode(t.pkt.tp(0x40, t.big.A, 'flat'))
+	with pytest.raises(ValueError, match=r't\.pkt\.tp\.b 5'):
+		encode(t.pkt.tp(0, 5, 'flat'))
+	with pytest.raises(ValueError, match=r"t\.pkt\.tp\.lvl 'hilly'"):
+		encode(t.pkt.tp(0, t.big.A, 'hilly'))
+	# raw values of members are fine
+	assert encode(t.pkt.tp(1, -1, 'flat')) == encode(t.pkt.tp(t.rel.X, t.big.A, 'flat'))
+
+def test_scopes():
+	# enum typedefs are visible in nested types, other typedefs are not
+	ns = compile('<t>', 'namespace t { type hand : enum varint { main=0; }; type pkt { h : hand; }; };')
+	assert ns['t']['pkt'].fields['h'].field_type is ns['t']['hand']
+	with pytest.raises(ValueError, match='unknown type'):
+		compile('<t>', 'namespace t { type point { x : int; }; type pkt { p : point; }; };')
@@ -0,0 +1,64 @@
+import time
+import tracemalloc
+
+import pytest
+
+import mcproto
+from mcproto import Instrument
+from mcproto.instrument import count_nodes
+from mcproto.parser import parse
+
+from conftest import HANDSHAKE, MC315
+
+def test_nested():
+	instrument = Instrument(memory=False)
+	with instrument.measure('outer', 'things') as outer:
+		outer.count += 2
+		time.sleep(0.02)
+		for _ in range(2):
+			with instrument.measure('inner'):
+				time.sleep(0.02)
+
+	report = instrument.report()
+	outer, inner = report['passes']
+	assert (outer['name'], outer['calls'], outer['count'], outer['unit']) == ('outer', 1, 2, 'things')
+	assert inner['calls'] == 2
+	# nested time is not counted twice
+	assert outer['time'] >= 0.015 and inner['time'] >= 0.035
+	assert outer['time'] < inner['time']
+	assert report['time'] == pytest.approx(outer['time'] + inner['time'])
+	assert outer['peak'] == 0 and not report['memory']
+
+def test_memory():
+	assert not tracemalloc.is_tracing()
+	instrument = Instrument()
+	with instrument.measure('outer'):
+		with instrument.measure('inner'):
+			data = bytearray(1 << 20)
+		del data
+	outer, inner = instrument.passes.values()
+	assert inner.peak >= 1 << 20 and outer.peak >= inner.peak
+	assert tracemalloc.is_tracing()
+	instrument.close()
+	assert not tracemalloc.is_tracing()
+
+def test_compiler():
+	instrument = Instrument()
+	compiler = mcproto.MCProtoCompiler(instrument=instrument)
+	compiler.compile_many([HANDSHAKE, MC315])
+	compiler.generate(mcproto.PyGenerator())
+	instrument.close()
+
+	passes = instrument.passes
+	assert list(passes) == ['lex', 'parse', 'build_namespace', 'build_type', 'codegen']
+	assert passes['lex'].calls == passes['parse'].calls == 2
+	nodes = count_nodes(parse(HANDSHAKE)) + count_nodes(parse(MC315))
+	assert passes['parse'].count == nodes
+	assert passes['codegen'].count > 1000 and passes['build_type'].count > 0
+	assert 'codegen' in instrument.format()
+
+def test_untouched():
+	# without an instrument the compiler measures nothing
+	compiler = mcproto.MCProtoCompiler()
+	compiler.compile(HANDSHAKE)
+	assert compiler.instrument is None and not tracemalloc.is_tracing()
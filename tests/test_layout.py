@@ -0,0 +1,98 @@
+import pytest
+
+from mcproto.compiler import compile
+from mcproto.layout import size_bounds, bit_runs
+
+from conftest import MC315
+
+SCHEMA = """
+namespace t {
+	type point {
+		x, y : int;
+		flag : bool;
+	};
+	type pkt {
+		a : ubyte;
+		p : { x, y : int; flag : bool; };
+		name : string;
+		b : short;
+		n : varint;
+		c : long;
+	};
+	type three {
+		items : array 3 { x, y : int; flag : bool; };
+	};
+	type msg {
+		id : varint;
+		variant empty { id=0; };
+		variant ping { id=1; timestamp : long; };
+		variant text { id=2; text : string; };
+	};
+	type flagged {
+		kind : unsigned 3;
+		more : unsigned 5;
+		variant one { kind=1; v : varint; };
+		variant two { kind=2; lo : unsigned 4; hi : unsigned 4; };
+	};
+};
+"""
+
+@pytest.fixture(scope='module')
+def t():
+	return compile('<t>', SCHEMA)['t']
+
+def test_fixed(t):
+	layout = t['point'].layout
+	assert layout.fixed and layout.min_size == layout.max_size == layout.prefix == 9
+	assert dict(layout.offsets) == {'x': 0, 'y': 4, 'flag': 8}
+	assert layout.variable == []
+	assert layout.possible(9) and not layout.possible(8) and not layout.possible(10)
+
+	layout = t['three'].layout
+	assert layout.fixed and layout.min_size == 27
+
+def test_variable(t):
+	layout = t['pkt'].layout
+	assert not layout.fixed
+	assert (layout.min_size, layout.max_size, layout.prefix) == (22, None, 10)
+	assert layout.variable == ['name', 'n']
+	assert dict(layout.offsets) == {'a': 0, 'p': 1, 'name': 10}
+	# fields after a variable field are placed relative to it
+	assert layout.positions['b'] == ('name', 0)
+	assert layout.positions['c'] == ('n', 0)
+	assert layout.sizes['n'] == (1, 5) and layout.sizes['p'] == (9, 9)
+	assert not layout.possible(21) and layout.possible(10 ** 6)
+
+def test_branches(t):
+	msg = t['msg']
+	assert (msg.layout.min_size, msg.layout.max_size) == (1, None)
+	ping = msg['ping'].layout
+	assert (ping.min_size, ping.max_size) == (9, 13)
+	assert ping.positions['timestamp'] == ('id', 0)
+	assert msg['empty'].layout.fixed is False
+
+	flagged = t['flagged']
+	assert list(bit_runs(flagged)) == [('kind', 'more')]
+	# a variant's run does not reach into the fields of its base
+	assert list(bit_runs(flagged['two'])) == [('kind', 'more'), ('lo', 'hi')]
+	two = flagged['two'].layout
+	assert two.fixed and two.min_size == 2
+	assert two.sizes['lo'] == (0, 0) and two.sizes['hi'] == (1, 1)
+	# as small as its smallest branch
+	assert (flagged.layout.min_size, flagged.layout.max_size) == (2, 6)
+
+def test_size_bounds(t):
+	fields = t['pkt'].fields
+	assert size_bounds(fields['name'].field_type) == (1, None)
+	assert size_bounds(fields['c'].field_type) == (8, 8)
+	assert size_bounds(t['point']) == (9, 9)
+
+def test_partial_bytes():
+	ns = compile('<t>', 'namespace t { type bad { a : unsigned 3; b : unsigned 4; }; };')
+	with pytest.raises(ValueError):
+		ns['t']['bad'].layout
+
+def test_protocol():
+	keepalive = compile(MC315)['play315']['cb']['client']['keepalive'].layout
+	assert (keepalive.min_size, keepalive.max_size) == (2, 10)
+	assert keepalive.variable == ['id', 'timestamp'] and keepalive.prefix == 0
@@ -0,0 +1,86 @@
+import io
+import uuid
+
+import pytest
+
+from mcproto import metadata
+from mcproto.lib import DecodeError
+from mcproto.metadata import (Metadata, METADATA_BYTE, METADATA_VARINT,
+			      METADATA_STRING, METADATA_BOOL, METADATA_ROTATION,
+			      METADATA_OPT_POSITION, METADATA_OPT_UUID)
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture
+def meta():
+	meta = Metadata()
+	meta.set(0, METADATA_BYTE, 0)
+	meta.set(2, METADATA_STRING, 'name')
+	meta.set(6, METADATA_BOOL, False)
+	meta.set(7, METADATA_ROTATION, (1.0, 2.0, 3.0))
+	meta.set(9, METADATA_OPT_POSITION, None)
+	meta.set(11, METADATA_OPT_UUID, uuid.UUID(int=1234))
+	return meta
+
+def test_container(meta):
+	assert list(meta) == [0, 2, 6, 7, 9, 11] and len(meta) == 6
+	assert meta[2] == 'name' and meta.type(7) == METADATA_ROTATION
+	assert 1 not in meta and meta.get(1, 'x') == 'x'
+	with pytest.raises(KeyError):
+		meta[1] = 0
+	with pytest.raises(IndexError):
+		meta.set(0xff, METADATA_BYTE, 0)
+	with pytest.raises(ValueError):
+		meta.set(1, 13, 0)
+
+	del meta[2]
+	assert 2 not in meta and 2 not in set(meta.dirty_indexes())
+
+def test_delta(meta):
+	assert list(meta.dirty_indexes()) == [0, 2, 6, 7, 9, 11]
+	assert meta.delta() == meta and not meta.dirty
+
+	# equal values are not changes
+	meta[0] = 0
+	assert not meta.dirty
+	meta[0] = 0x20
+	meta[6] = True
+	meta.set(6, METADATA_VARINT, 1)
+	delta = meta.delta()
+	assert list(delta.items()) == [(0, METADATA_BYTE, 0x20), (6, METADATA_VARINT, 1)]
+	assert not meta.dirty
+
+def test_packet(mc, meta):
+	cb = mc.play315.cb
+	full = encode(cb.world.entity.meta(5, meta))
+	received, off = cb.load(full)
+	assert off == len(full) and received.entity == 5 and received.meta == meta
+
+	meta.delta()
+	meta[0] = 0x20
+	meta[11] = None
+	delta = encode(cb.world.entity.meta(5, meta.delta()))
+	assert len(delta) < len(full)
+	changes, _ = cb.load(delta)
+	assert list(changes.meta) == [0, 11]
+	received.meta.update(changes.meta)
+	assert received.meta == meta
+	assert encode(received) == encode(cb.world.entity.meta(5, meta))
+
+def test_skip(meta):
+	f = io.BytesIO()
+	metadata.dump(meta, f)
+	data = b'\x01\x02' + f.getvalue()
+	assert metadata.skip(data, 2) == len(data)
+	loaded, off = metadata.load(data, 2)
+	assert off == len(data) and loaded == meta
+
+@pytest.mark.parametrize('data', [b'', b'\x00\x00', b'\x00\x0d\x00\xff', b'\x00\x03\x05ab'])
+def test_rejects(data):
+	with pytest.raises(DecodeError):
+		metadata.load(data)
+	with pytest.raises(DecodeError):
+		metadata.skip(data)
@@ -0,0 +1,118 @@
+import io
+import struct
+
+import pytest
+
+from mcproto import nbt
+from mcproto.lib import DecodeError
+
+VALUE = {
+	'id': 'minecraft:chest', 'x': 5, 'y': 64, 'z': -3, 'big': 2 ** 40, 'f': 1.5,
+	'name': 'a\x00b\U0001F600',
+	'Items': [{'Slot': 1, 'id': 'stone', 'Count': 3},
+		  {'Slot': 2, 'id': 'dirt', 'Count': 1, 'tag': {'ench': [1, 2]}}],
+	'arr': b'\x01\x02',
+	'nested': {'deep': {'v': 1}},
+}
+
+def dumps(val):
+	f = io.BytesIO()
+	nbt.dump(val, f)
+	return f.getvalue()
+
+@pytest.fixture
+def data():
+	return dumps(VALUE)
+
+def test_round_trip(data):
+	compound, off = nbt.load(memoryview(data))
+	assert off == len(data) == nbt.skip(data)
+	assert list(compound) == list(VALUE)
+	assert compound['name'] == VALUE['name']
+	assert compound['Items'][1]['tag']['ench'] == [1, 2]
+	assert compound['nested']['deep']['v'] == 1
+	assert compound['big'] == 2 ** 40
+	assert bytes(compound['arr']) == b'\x01\x02'
+	# nothing changed, the compound is copied as it was
+	assert not compound.modified
+	assert dumps(compound) == data
+
+def test_lazy_index(data):
+	compound, _ = nbt.load(data)
+	assert compound._index is None
+	compound['x']
+	assert compound._index is not None and compound._values.keys() == {'x'}
+
+def test_modify(data):
+	compound, _ = nbt.load(data)
+	compound['nested']['deep']['v'] = 7
+	compound['x'] = 10
+	del compound['f']
+	compound['new'] = 'hello'
+	assert compound.modified and compound.raw is None
+
+	out, _ = nbt.load(dumps(compound))
+	assert out['nested']['deep']['v'] == 7
+	assert out['x'] == 10 and out['new'] == 'hello' and 'f' not in out
+	assert out.tag('x') == nbt.TAG_INT and out['Items'][0]['id'] == 'stone'
+
+def test_empty():
+	assert nbt.load(b'\x00') == (None, 1)
+	assert dumps(None) == b'\x00'
+	assert not nbt.NBTCompound().modified
+
+def test_typed_arrays():
+	compound = nbt.NBTCompound()
+	compound.set('ints', nbt.TAG_INT_ARRAY, [1, -2, 3])
+	compound.set('longs', nbt.TAG_LONG_ARRAY, [2 ** 40])
+	compound.set('shorts', nbt.TAG_LIST, nbt.NBTList(nbt.TAG_SHORT, [1, 2]))
+	out, _ = nbt.load(dumps(compound))
+	assert out['ints'] == [1, -2, 3] and out['longs'] == [2 ** 40]
+	assert out['shorts'] == [1, 2] and out['shorts'].tag == nbt.TAG_SHORT
+
+def entry(tag, payload, name=b''):
+	return bytes((tag,)) + struct.pack('>H', len(name)) + name + payload
+
+@pytest.mark.parametrize('payload', [
+	# negative counts used to move the offset back and loop forever
+	entry(nbt.TAG_BYTE_ARRAY, struct.pack('>i', -7)),
+	entry(nbt.TAG_INT_ARRAY, struct.pack('>i', -1)),
+	entry(nbt.TAG_LIST, b'\x01' + struct.pack('>i', -3)),
+	entry(nbt.TAG_LIST, b'\x0a' + struct.pack('>i', -1)),
+	# ends past the buffer
+	entry(nbt.TAG_LONG_ARRAY, struct.pack('>i', 1000)),
+	entry(nbt.TAG_STRING, b'\x10\x00abc'),
+	entry(nbt.TAG_LIST, b'\x08' + struct.pack('>i', 0x7fffffff)),
+	entry(nbt.TAG_LIST, b'\x00' + struct.pack('>i', 2)),
+	entry(nbt.TAG_INT, b'\x00'),
+	entry(nbt.TAG_COMPOUND, b''),
+	entry(13, b''),
+])
+def test_rejects(payload):
+	data = entry(nbt.TAG_COMPOUND, payload + b'\x00')
+	with pytest.raises(DecodeError):
+		nbt.load(data)
+	with pytest.raises(DecodeError):
+		nbt.skip(data)
+
+def test_rejects_lazy_entries():
+	# entries are only bounds checked when their compound is scanned,
+	# decoding them on access checks again
+	data = entry(nbt.TAG_BYTE_ARRAY, struct.pack('>i', -7), b'a')
+	for tag in (nbt.TAG_BYTE_ARRAY, nbt.TAG_INT_ARRAY, nbt.TAG_LIST):
+		with pytest.raises(DecodeError):
+			nbt.load_payload(tag, data, 4)
+
+def test_nested_too_deep():
+	data = b''.join(entry(nbt.TAG_COMPOUND, b'') for _ in range(5000)) + b'\x00' * 5001
+	with pytest.raises(DecodeError):
+		nbt.load(data)
+	with pytest.raises(DecodeError):
+		nbt.skip(data)
+
+def test_field(mc, data):
+	world = mc.play315.cb.world
+	f = io.BytesIO()
+	world.update_tile((1, 2, 3), nbt.load(data)[0]).dump(f)
+	packet, off = mc.play315.cb.load(f.getvalue())
+	assert off == len(f.getvalue()) and packet.tile['Items'][1]['tag']['ench'] == [1, 2]
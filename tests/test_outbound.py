@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from mcproto import OutboundQueue
+from mcproto.lib import pack_varint
+
+class Transport:
+	def __init__(self):
+		self.writes = []
+
+	def writelines(self, frames):
+		self.writes.append(b''.join(frames))
+
+def test_flush(mc_strict):
+	transport = Transport()
+	out = OutboundQueue(transport)
+	keepalive = mc_strict.play315.cb.client.keepalive
+	out.send(keepalive(1))
+	out.send_raw(b'\x01\x02')
+	assert len(out) == 2 and transport.writes == []
+	out.flush()
+	assert transport.writes == [b'\x02\x1f\x01' + b'\x02\x01\x02']
+	assert len(out) == 0 and out.pending == 0
+	out.flush()
+	assert len(transport.writes) == 1
+
+def test_threshold():
+	transport = Transport()
+	out = OutboundQueue(transport, threshold=10, limit=20)
+	out.send_raw(b'x' * 5)
+	assert transport.writes == []
+	out.send_raw(b'y' * 5)
+	assert transport.writes == [b'\x05xxxxx\x05yyyyy']
+	with pytest.raises(ValueError):
+		OutboundQueue(transport, threshold=10, limit=5)
+
+def test_copies_buffers():
+	transport = Transport()
+	out = OutboundQueue(transport)
+	buf = bytearray(b'abc')
+	out.send_raw(buf)
+	out.send_raw(memoryview(buf)[1:])
+	buf[:] = b'xyz'
+	out.flush()
+	assert transport.writes == [b'\x03abc\x02bc']
+
+def test_paused():
+	transport = Transport()
+	out = OutboundQueue(transport, threshold=4, limit=8)
+	out.pause_writing()
+	out.send_raw(b'abc')
+	out.send_raw(b'def')
+	assert transport.writes == []
+	with pytest.raises(BufferError):
+		out.send_raw(b'ghi')
+
+	async def producer():
+		await out.drain()
+		out.send_raw(b'ghi')
+
+	async def main():
+		task = asyncio.ensure_future(producer())
+		await asyncio.sleep(0)
+		assert not task.done()
+		out.resume_writing()
+		await task
+
+	asyncio.run(main())
+	# queued packets go out on resume, the next one passes the threshold
+	assert transport.writes == [b'\x03abc\x03def', pack_varint(3) + b'ghi']
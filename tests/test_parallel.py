@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+import mcproto
+from mcproto import ParallelDecoder, Slot
+from mcproto.lib import RawFrame
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module')
+def frames(mc_strict):
+	cb = mc_strict.play315.cb
+	world = cb.world
+	frames = [encode(world.update_blocks(num, 2, [world.update_blocks.records_item(1, 2, num)] * 5))
+		  for num in range(500)]
+	frames.append(encode(cb.gui.window.items(0, [Slot(276, 1, 5, {'ench': [{'lvl': 5}]}), None])))
+	frames.append(encode(cb.client.plugin_message('MC|Brand', b'vanilla')))
+	return frames
+
+def check(frames, packets):
+	assert len(packets) == len(frames)
+	assert all(encode(packet) == frame for packet, frame in zip(packets, frames))
+	assert packets[3].x == 3 and packets[3].records[0].block == 3
+	# bytes fields come back as bytes, not views of the workers' blocks
+	assert packets[-1].data == b'vanilla'
+	assert packets[-2].items[0].nbt['ench'][0]['lvl'] == 5
+
+def test_map(mc_strict, frames):
+	with ParallelDecoder(mc_strict.__name__, 'play315.cb', processes=2, chunksize=64) as decoder:
+		check(frames, decoder.map(frames))
+		packets = list(decoder.imap(frames, ordered=False))
+		assert sorted(map(encode, packets)) == sorted(frames)
+		assert not decoder._blocks
+
+def test_interest(mc_strict, frames):
+	with ParallelDecoder(mc_strict.__name__, 'play315.cb', processes=2, chunksize=64,
+			     interest=['play315.cb.world.*']) as decoder:
+		packets = decoder.map(frames)
+	assert type(packets[0]) is mc_strict.play315.cb.world.update_blocks
+	assert isinstance(packets[-1], RawFrame) and packets[-1].payload == frames[-1]
+
+def test_bounded(mc_strict, frames):
+	# the pool reads frames only as far as the chunks in flight allow
+	pulled = []
+	def source():
+		for frame in frames:
+			pulled.append(frame)
+			yield frame
+
+	with ParallelDecoder(mc_strict.__name__, 'play315.cb', processes=2, chunksize=10,
+			     max_chunks=3) as decoder:
+		count = 0
+		for _ in decoder.imap(source()):
+			count += 1
+			assert len(decoder._blocks) <= 3
+			assert len(pulled) - count <= 4 * 10
+		assert count == len(frames)
+
+def test_stop_early(mc_strict, frames):
+	with ParallelDecoder(mc_strict.__name__, 'play315.cb', processes=2, chunksize=10,
+			     max_chunks=2) as decoder:
+		packets = decoder.imap(iter(frames))
+		assert next(packets).x == 0
+		packets.close()
+		assert decoder.map(frames[:5])[4].x == 4
+
+def test_capture(mc_strict, frames, tmp_path):
+	path = str(tmp_path / 'p.cap')
+	with mcproto.CaptureWriter(path) as writer:
+		for num, frame in enumerate(frames):
+			writer.write('play315', 'cb', frame, timestamp=num)
+		writer.write('status', 'cb', b'\x00', timestamp=len(frames))
+
+	with ParallelDecoder(mc_strict.__name__, processes=2, chunksize=64) as decoder:
+		out = list(decoder.decode_capture(path, {('play315', 'cb'): 'play315.cb'}))
+	check(frames, [packet for _, packet in out[:-1]])
+	record, packet = out[-1]
+	assert record.state == 'status' and record.payload is None and packet is None
@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+from mcproto.lib import DecodeError, splice
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+BITS = """
+namespace t {
+	type pkt {
+		id : varint;
+		variant b { id=2; f1, f2, f3 : unsigned 1; rest : signed 5; n : signed 24; s : string (unsigned 16); };
+		variant d { id=4; big : unsigned 40; y : signed 12; z : signed 12; w : varint; at : position; };
+	};
+};
+"""
+
+PATCHERS = {
+	'play315.cb.world.entity.move': ['entity', 'dy', 'on_ground'],
+	'play315.cb.gui.message': ['message', 'location'],
+	't.pkt.b': ['f2', 'n', 's'],
+	't.pkt.d': ['y', 'at'],
+}
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def patched(request, generate):
+	mc = generate('patched_%s' % request.param, tier=request.param, patchers=PATCHERS)
+	bits = generate('patched_bits_%s' % request.param, source=BITS,
+			tier=request.param, patchers=PATCHERS)
+	return mc, bits
+
+def test_splice():
+	buf = bytearray(b'abcdef')
+	assert splice(buf, 1, 3, b'XYZ') is buf and buf == b'aXYZdef'
+	view = memoryview(bytearray(b'abc'))
+	assert splice(view, 0, 1, b'Z') is view and bytes(view) == b'Zbc'
+	assert splice(b'abc', 0, 1, b'ZZ') == b'ZZbc'
+
+def test_fixed_in_place(patched):
+	mc, _ = patched
+	cb = mc.play315.cb
+	move = cb.world.entity.move
+	buf = bytearray(encode(move(1, 2, 3, 4, True)))
+	assert move.patch_dy(buf, -9) is buf
+	assert move.patch_on_ground(buf, False) is buf
+	out, _ = cb.load(buf)
+	assert (out.entity, out.dx, out.dy, out.dz, out.on_ground) == (1, 2, -9, 4, False)
+
+def test_resized(patched):
+	mc, _ = patched
+	cb = mc.play315.cb
+	move = cb.world.entity.move
+	data = encode(move(1, 2, 3, 4, True))
+	# the varint grows, fields after it move
+	out = move.patch_entity(data, 300)
+	assert isinstance(out, bytes) and len(out) == len(data) + 1
+	assert vars(cb.load(out)[0]) == vars(move(300, 2, 3, 4, True))
+
+	message = cb.gui.message
+	data = b'\x00' + encode(message('hi', 1))
+	out = message.patch_message(data, 'hello there', 1)
+	out = message.patch_location(out, 2, 1)
+	packet, _ = cb.load(out, 1)
+	assert (packet.message, packet.location) == ('hello there', 2)
+
+def test_bits(patched):
+	_, bits = patched
+	pkt = bits.t.pkt
+	packet = pkt.b(1, 0, 1, -3, -70000, 'x')
+	buf = bytearray(encode(packet))
+	assert pkt.b.patch_f2(buf, 1) is buf
+	pkt.b.patch_n(buf, 12345)
+	buf = pkt.b.patch_s(buf, 'longer')
+	assert vars(pkt.load(buf)[0]) == vars(pkt.b(1, 1, 1, -3, 12345, 'longer'))
+
+	packet = pkt.d(2 ** 40 - 1, -5, 7, 300, (1, -2, 3))
+	data = pkt.d.patch_y(encode(packet), 100)
+	data = pkt.d.patch_at(data, (-5, 6, -7))
+	assert vars(pkt.load(data)[0]) == vars(pkt.d(2 ** 40 - 1, 100, 7, 300, (-5, 6, -7)))
+
+def test_strict_checks(generate):
+	message = generate('patched_strict', patchers=PATCHERS).play315.cb.gui.message
+	data = encode(message('hi', 1))
+	with pytest.raises(DecodeError):
+		message.patch_location(data[:2] + b'\x05', 2)
+
+	bits = generate('patched_bits_strict', source=BITS, patchers=PATCHERS).t.pkt
+	data = encode(bits.b(0, 0, 0, 0, 0, ''))
+	with pytest.raises(ValueError):
+		bits.b.patch_f2(data, 2)
+	with pytest.raises(DecodeError):
+		bits.d.patch_at(b'\x04\x00', (0, 0, 0))
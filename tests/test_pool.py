@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def pooled(request, generate):
+	return generate('pooled_%s' % request.param, tier=request.param,
+			pooled=['play315.cb.world.entity.move'], pool_size=2)
+
+def test_reuse(pooled):
+	cb = pooled.play315.cb
+	move = cb.world.entity.move
+	first, _ = cb.load(encode(move(1, 2, 3, 4, True)))
+	first.release()
+	second, _ = cb.load(encode(move(5, 6, 7, 8, False)))
+	# the released instance is filled again
+	assert second is first
+	assert (second.entity, second.dx, second.dz, second.on_ground) == (5, 6, 8, False)
+	third, _ = cb.load(encode(move(1, 2, 3, 4, True)))
+	assert third is not second
+
+def test_bounded(pooled):
+	move = pooled.play315.cb.world.entity.move
+	move._free.clear()
+	for packet in [move(num, 0, 0, 0, True) for num in range(5)]:
+		packet.release()
+	assert len(move._free) == 2
+
+def test_not_pooled(pooled):
+	cb = pooled.play315.cb
+	assert not hasattr(cb.client.keepalive, 'release')
+	data = encode(cb.client.keepalive(5))
+	assert cb.load(data)[0] is not cb.load(data)[0]
@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+from mcproto import CodecProfiler
+from mcproto.lib import Decoder
+
+@pytest.fixture
+def prof(generate):
+	module = generate('prof')
+	profiler = CodecProfiler(module)
+	yield module, profiler
+	profiler.set_mode('off')
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def test_off_is_generated_code(prof):
+	module, profiler = prof
+	move = module.play315.cb.world.entity.move
+	original = vars(move)['_load_from']
+	profiler.set_mode('full')
+	assert vars(move)['_load_from'] is not original
+	profiler.set_mode('off')
+	assert vars(move)['_load_from'] is original
+	assert module.play315.cb._branches[move.id] == move._load_from
+
+def test_full(prof):
+	module, profiler = prof
+	cb = module.play315.cb
+	data = encode(cb.world.entity.move(1, 2, 3, 4, True))
+
+	profiler.set_mode('full')
+	decoder = Decoder(cb)
+	for _ in range(10):
+		decoder(data)
+		cb.load(data)
+	encode(cb.world.entity.move(1, 2, 3, 4, True))
+
+	codecs = profiler.snapshot()['codecs']
+	decode = codecs['play315.cb.world.entity.move']['decode']
+	assert decode['calls'] == decode['sampled'] == 20
+	# the id is read by the dispatching struct
+	assert decode['bytes'] == 20 * (len(data) - 1)
+	encode_stats = codecs['play315.cb.world.entity.move']['encode']
+	assert encode_stats['calls'] == 1 and encode_stats['bytes'] == len(data)
+	assert 'play315.cb.client.keepalive' not in codecs
+
+	profiler.reset()
+	assert profiler.snapshot()['codecs'] == {}
+
+def test_sampled(prof):
+	module, profiler = prof
+	cb = module.play315.cb
+	data = encode(cb.client.keepalive(5))
+
+	profiler.set_mode('sampled', 4)
+	for _ in range(10):
+		assert cb.load(data)[0].timestamp == 5
+	decode = profiler.snapshot()['codecs']['play315.cb.client.keepalive']['decode']
+	assert decode['calls'] == 10 and decode['sampled'] == 2
+
+def test_bad_mode(prof):
+	_, profiler = prof
+	with pytest.raises(ValueError):
+		profiler.set_mode('sometimes')
+	with pytest.raises(ValueError):
+		profiler.set_mode('sampled', 0)
@@ -0,0 +1,87 @@
+import io
+import uuid
+
+import pytest
+
+from mcproto.lib import DecodeError, load_varint, pack_varint, pack_varlong, skip_bytes, skip_varint, skip_varlong
+
+PROJECTIONS = {
+	'play315.cb.world.entity.spawn_object': [('x', 'y', 'z', 'data')],
+	'play315.cb.world.entity.move': [('dx', 'dy', 'dz')],
+	'play315.cb.world.entity.properties': [('properties', 'entity')],
+	'play315.cb.world.explosion': [('vz',)],
+	'play315.cb.world.update_blocks': [('z',)],
+	'play315.cb.gui.team.create': [('color',)],
+}
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def proj(request, generate):
+	return generate('proj_%s' % request.param, tier=request.param, projections=PROJECTIONS)
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def test_fixed_fields(proj):
+	entity = proj.play315.cb.world.entity
+	data = encode(entity.spawn_object(300, uuid.UUID(int=9), 3, 1.5, 2.5, 3.5, 10, 20, 77, 1, 2, 3))
+	assert entity.spawn_object.project_x_y_z_data(data) == (1.5, 2.5, 3.5, 77)
+	assert entity.move.project_dx_dy_dz(memoryview(encode(entity.move(5, -1, 2, 3, True)))) == (-1, 2, 3)
+
+def test_skip_arrays(proj):
+	world = proj.play315.cb.world
+	records = [world.explosion.records_item(1, 2, 3)] * 5
+	assert world.explosion.project_vz(encode(world.explosion(1, 2, 3, 4, records, 7, 8, 9))) == (9,)
+
+	prop = world.entity.properties
+	item = prop.properties_item
+	packet = prop(7, [item('k', 1.0, [item.modifiers_item(uuid.UUID(int=1), 1.0, 2)] * 3)] * 2)
+	properties, entity = prop.project_properties_entity(encode(packet))
+	assert entity == 7 and len(properties) == 2 and len(properties[1].modifiers) == 3
+
+def test_skip_strings(proj):
+	team = proj.play315.cb.gui.team
+	assert team.create.project_color(encode(team.create('n', 'd', 'p', 's', 1, 'a', 'b', 5, ['x']))) == (5,)
+
+def test_projection_matches_decode(proj):
+	update = proj.play315.cb.world.update_blocks
+	data = encode(update(1, 2, []))
+	assert update.project_z(data) == (proj.play315.cb.load(data)[0].z,)
+
+def test_skip_negative_count(generate):
+	# the count of an array of fixed size items is skipped by arithmetic
+	proj = generate('proj_strict', tier='strict', projections=PROJECTIONS)
+	world = proj.play315.cb.world
+	data = encode(world.explosion(1, 2, 3, 4, [], 7, 8, 9))
+	# after the id and four floats
+	count = 1 + 4 * 4
+	assert data[count:count + 4] == bytes(4)
+	with pytest.raises(DecodeError):
+		world.explosion.project_vz(data[:count] + b'\xff\xff\xff\xff' + data[count + 4:])
+
+def test_unknown_field(generate):
+	with pytest.raises(ValueError):
+		generate('proj_bad', projections={'play315.cb.world.explosion': [('nope',)]})
+
+@pytest.mark.parametrize('val', [0, 127, 300, -1, 2 ** 31 - 1, -2 ** 31])
+def test_skip_varint(val):
+	data = pack_varint(val)
+	assert skip_varint(data) == len(data)
+	assert skip_varlong(pack_varlong(val)) == len(pack_varlong(val))
+
+@pytest.mark.parametrize('skip, data', [
+	(skip_varint, b'\xff\xff\xff\xff\x1f'),
+	(skip_varint, b'\xff\xff\xff\xff\xff\x01'),
+	(skip_varint, b'\x80\x80'),
+	(skip_varlong, b'\xff' * 9 + b'\x02'),
+	(skip_varlong, b'\xff' * 10 + b'\x01'),
+])
+def test_skip_bad_varint(skip, data):
+	with pytest.raises(DecodeError):
+		skip(data)
+
+def test_skip_truncated_bytes():
+	assert skip_bytes(load_varint, b'\x02ab') == 3
+	with pytest.raises(DecodeError):
+		skip_bytes(load_varint, b'\x05ab')
@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+from mcproto.lib import Decoder, DecodeError, RawFrame
+
+SELECT = ['play315.cb.world.entity.*', 'play315.sb.player.move']
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def pruned(request, generate):
+	return generate('pruned_%s' % request.param, tier=request.param, select=SELECT)
+
+def test_selected(mc_strict, pruned):
+	data = encode(mc_strict.play315.cb.world.entity.move(5, 1, 2, 3, True))
+	out, off = pruned.play315.cb.load(data)
+	assert type(out).__qualname__ == 'play315.cb.world.entity.move'
+	assert off == len(data) and (out.entity, out.dx, out.dz) == (5, 1, 3)
+
+	data = encode(mc_strict.play315.sb.player.move(1.0, 2.0, 3.0, True))
+	assert pruned.play315.sb.load(data)[0].y == 2.0
+
+def test_passthrough(mc_strict, pruned):
+	cb = mc_strict.play315.cb
+	for packet in (cb.client.keepalive(7), cb.gui.window.items(1, [None, None]),
+		       cb.client.plugin_message('MC|Brand', b'vanilla')):
+		data = encode(packet)
+		for buf in (data, bytearray(data)):
+			frame, off = pruned.play315.cb.load(buf)
+			assert isinstance(frame, RawFrame) and off == len(data)
+			assert frame.id == packet.id and bytes(frame.payload) == data
+			# a passthrough is sent on as it was received
+			assert encode(frame) == data
+
+	# skipped ids still go through the selective decoder
+	decoder = Decoder(pruned.play315.cb)
+	assert isinstance(decoder(encode(cb.client.keepalive(7))), RawFrame)
+	assert decoder(encode(cb.world.entity.move(5, 1, 2, 3, True))).dz == 3
+
+def test_pruned_types(pruned):
+	cb = pruned.play315.cb
+	assert not hasattr(cb, 'client') and not hasattr(cb, 'gui')
+	assert not hasattr(cb.world, 'block_break')
+	assert not hasattr(pruned.play315.sb, 'gui')
+
+def test_unknown_id(pruned):
+	# ids the schema does not know are still errors
+	with pytest.raises(DecodeError):
+		pruned.play315.cb.load(b'\x7f')
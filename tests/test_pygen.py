@@ -0,0 +1,56 @@
+import io
+import uuid
+
+import pytest
+
+import mcproto
+from mcproto.lib import DecodeError
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def test_unknown_tier():
+	with pytest.raises(ValueError):
+		mcproto.PyGenerator(tier='fast')
+
+def test_fixed_width_run(mc):
+	spawn = mc.play315.cb.world.entity.spawn_object
+	packet = spawn(1, uuid.UUID(int=5), 2,
+		       1.0, 2.0, 3.0, 0.5, 0.25, 7, -1, 0, 1)
+	data = encode(packet)
+	out, off = mc.play315.cb.load(data)
+	assert off == len(data) and encode(out) == data
+	assert (out.x, out.y, out.z, out.data, out.vx) == (1.0, 2.0, 3.0, 7, -1)
+
+def test_varint_inline(mc):
+	keepalive = mc.play315.cb.client.keepalive
+	for val in (0, 0x7f, 0x80, 2 ** 31 - 1, -1):
+		out, _ = mc.play315.cb.load(encode(keepalive(val)))
+		assert out.timestamp == val
+
+def test_strict_checks(mc_strict):
+	sb = mc_strict.play315.sb
+	sign = sb.gui.update_sign
+	data = encode(sign((1, 2, 3), ['a', 'b', 'c', 'd']))
+	assert sb.load(data)[0].lines == ['a', 'b', 'c', 'd']
+
+	# fixed lengths on encode
+	with pytest.raises(ValueError):
+		encode(sign((1, 2, 3), ['a', 'b']))
+	# truncated input
+	for end in range(1, len(data)):
+		with pytest.raises(DecodeError):
+			sb.load(data[:end])
+	# string encodings
+	bad = data[:-2] + b'\x01\xff'
+	with pytest.raises(DecodeError):
+		sb.load(bad)
+
+def test_trusted_skips_checks(generate):
+	sb = generate('mc_trusted', tier='trusted').play315.sb
+	data = encode(sb.gui.update_sign((1, 2, 3), ['a', 'b', 'c', 'd']))
+	# the end of the buffer is not checked, slicing past it reads nothing
+	out, off = sb.load(data[:-1])
+	assert out.lines == ['a', 'b', 'c', ''] and off == len(data)
@@ -0,0 +1,146 @@
+import io
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mcproto import FrameRing, ring
+from mcproto.lib import RawFrame
+
+from conftest import ROOT
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+def payload(num, size):
+	return bytes([num % 0x80]) + bytes((num + i) & 0xff for i in range(size))
+
+def test_decode(mc_strict):
+	cb = mc_strict.play315.cb
+	with FrameRing(size=4096) as producer:
+		consumer = FrameRing(producer.name, roots={'play315': cb})
+		assert producer.put('play315', encode(cb.client.keepalive(7)))
+		assert producer.put('status', b'\x01abc')
+		first, second = consumer.frames()
+		assert first.decode().timestamp == 7 and first.id == cb.client.keepalive.id
+		assert second.state == 'status' and isinstance(second.decode(), RawFrame)
+		assert bytes(second.payload) == b'\x01abc'
+		assert consumer.get() is None
+		consumer.done()
+		consumer.close()
+
+def test_wraparound():
+	with FrameRing(size=256) as producer:
+		consumer = FrameRing(producer.name)
+		# records of 12 + 1 + 60 bytes take 80
+		for num in range(3):
+			assert producer.put('s', payload(num, 60))
+		assert not producer.put('s', payload(3, 60))
+		assert [bytes(frame.payload) for frame in consumer.frames()] == [payload(num, 60) for num in range(3)]
+		consumer.done()
+
+		# 16 bytes are left before the end, the next record wraps
+		assert producer.put('s', payload(3, 60))
+		buf = producer._buf
+		assert ring.LENGTH.unpack_from(buf, ring.DATA + 240)[0] == ring.WRAP
+		assert producer._head == 256 + 80
+		frame = consumer.get()
+		assert bytes(frame.payload) == payload(3, 60) and frame.id == 3
+		assert consumer._read == producer._head
+		consumer.done()
+		consumer.close()
+
+def test_limits():
+	with FrameRing(size=256) as producer:
+		with pytest.raises(ValueError):
+			producer.put('s', payload(0, 128))
+		with pytest.raises(ValueError):
+			producer.put('x' * 40, payload(0, 1))
+
+	block = ring.shared_memory.SharedMemory(create=True, size=ring.DATA + 64)
+	try:
+		with pytest.raises(ValueError):
+			FrameRing(block.name)
+	finally:
+		block.close()
+		block.unlink()
+
+def produce(name, count, lock=None):
+	with FrameRing(name, lock=lock) as producer:
+		for num in range(count):
+			data = payload(num, num % 97)
+			while not producer.put('state%d' % (num % 3), data):
+				pass
+
+def test_stress():
+	count = 5000
+	with FrameRing(size=1024) as consumer:
+		process = multiprocessing.get_context('fork').Process(target=produce, args=(consumer.name, count))
+		process.start()
+		num = 0
+		while num < count:
+			for frame in consumer.frames():
+				assert frame.state == 'state%d' % (num % 3)
+				assert bytes(frame.payload) == payload(num, num % 97)
+				num += 1
+			consumer.done()
+		process.join()
+		assert process.exitcode == 0 and consumer.get() is None
+
+def test_unordered(monkeypatch):
+	# the creator makes the lock, rings attaching must be given it
+	monkeypatch.setattr(ring, 'ORDERED', False)
+	with FrameRing(size=1024) as consumer:
+		assert consumer.lock is not None
+		with pytest.raises(ValueError):
+			FrameRing(consumer.name)
+
+		count = 2000
+		process = multiprocessing.get_context('fork').Process(target=produce,
+			args=(consumer.name, count, consumer.lock))
+		process.start()
+		num = 0
+		while num < count:
+			for frame in consumer.frames():
+				assert bytes(frame.payload) == payload(num, num % 97)
+				num += 1
+			consumer.done()
+		process.join()
+		assert process.exitcode == 0
+
+TRACKER = """
+import multiprocessing, os, subprocess, sys
+from multiprocessing import shared_memory
+from mcproto import FrameRing
+
+def child(name):
+	FrameRing(name).close()
+
+if __name__ == '__main__':
+	ring = FrameRing(size=1024)
+	# an unrelated process attaching and leaving
+	subprocess.run([sys.executable, '-c', 'from mcproto import FrameRing; FrameRing(%r).close()' % ring.name], check=True)
+	process = multiprocessing.get_context('fork').Process(target=child, args=(ring.name,))
+	process.start()
+	process.join()
+	# neither unlinked the block
+	shared_memory.SharedMemory(ring.name).close()
+	ring.close()
+	if os.name == 'posix':
+		assert not os.path.exists('/dev/shm/' + ring.name.lstrip('/'))
+"""
+
+def test_tracker(tmp_path):
+	# the block is unlinked once, by its creator. Before python 3.13 the
+	# shared tracker may complain of the second unregister, but no
+	# tracker reports the block as leaked
+	path = tmp_path / 'tracker.py'
+	path.write_text(TRACKER)
+	env = dict(os.environ, PYTHONPATH=ROOT)
+	out = subprocess.run([sys.executable, str(path)], env=env, capture_output=True, text=True)
+	assert out.returncode == 0, out.stderr
+	assert 'leaked' not in out.stderr, out.stderr
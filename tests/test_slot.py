@@ -0,0 +1,76 @@
+import io
+import pickle
+
+import pytest
+
+from mcproto import Slot, Metadata, METADATA_SLOT
+from mcproto import metadata, slot
+from mcproto.lib import DecodeError
+
+def encode(val):
+	f = io.BytesIO()
+	val.dump(f)
+	return f.getvalue()
+
+ITEMS = [None, Slot(1, 64), Slot(276, 1, 5, {'ench': [{'id': 16, 'lvl': 5}]})] * 10
+
+@pytest.fixture
+def window(mc):
+	window = mc.play315.cb.gui.window
+	data = encode(window.items(0, ITEMS))
+	packet, off = mc.play315.cb.load(memoryview(data))
+	assert off == len(data)
+	return mc, data, packet
+
+def test_round_trip(window):
+	_, data, packet = window
+	assert packet.items[0] is None and packet.items[1] == Slot(1, 64)
+	assert packet.items[2].raw is not None
+	assert encode(packet) == data
+	# reading the nbt alone does not modify the slot
+	assert packet.items[2].nbt['ench'][0]['lvl'] == 5
+	assert not packet.items[2].modified and encode(packet) == data
+
+def test_modify(window):
+	mc, data, packet = window
+	packet.items[2].nbt['ench'][0]['lvl'] = 3
+	packet.items[1].count = 2
+	assert packet.items[2].raw is None and packet.items[1].raw is None
+
+	out, _ = mc.play315.cb.load(encode(packet))
+	assert out.items[2].nbt['ench'][0]['lvl'] == 3 and out.items[1].count == 2
+	assert out.items[5] == ITEMS[5]
+
+def test_assign_nbt(window):
+	mc, _, packet = window
+	packet.items[2].nbt = None
+	packet.items[4].nbt = {'display': {'Name': 'x'}}
+	packet.items[5].nbt = packet.items[8].nbt
+	assert packet.items[2].modified and packet.items[4].modified
+
+	out, _ = mc.play315.cb.load(encode(packet))
+	assert out.items[2].nbt is None and out.items[2].item == 276
+	assert out.items[4].nbt['display']['Name'] == 'x'
+	assert out.items[5] == ITEMS[8]
+
+def test_pickle(window):
+	_, _, packet = window
+	packet.items[4].nbt = {'a': 1}
+	for val in filter(None, packet.items[1:6]):
+		copy = pickle.loads(pickle.dumps(val))
+		assert copy == val and encode(copy) == encode(val)
+	assert pickle.loads(pickle.dumps(Slot(2, nbt={'b': 'c'}))).nbt['b'] == 'c'
+
+def test_metadata():
+	meta = Metadata()
+	meta.set(5, METADATA_SLOT, Slot(3, 1, nbt={'x': 1}))
+	meta.set(6, METADATA_SLOT, None)
+	loaded, _ = metadata.load(encode(meta))
+	assert loaded == meta and loaded[6] is None
+
+@pytest.mark.parametrize('data', [b'', b'\x00', b'\x00\x01\x01\x00', b'\x00\x01\x01\x00\x00\x0a'])
+def test_rejects(data):
+	with pytest.raises(DecodeError):
+		slot.load(data)
+	with pytest.raises(DecodeError):
+		slot.skip(data)
@@ -0,0 +1,48 @@
+import io
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, HANDSHAKE, MC315
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module')
+def package(generate):
+	return generate('split_proto', srcs=(HANDSHAKE, MC315), split=True)
+
+LAZY = """
+import sys
+import split_proto
+assert not [name for name in sys.modules if name.startswith('split_proto._')]
+split_proto.status
+assert 'split_proto._status' in sys.modules
+assert 'split_proto._play315' not in sys.modules
+from split_proto import play315
+assert 'split_proto._play315' in sys.modules
+"""
+
+def test_lazy(package, gendir):
+	# a fresh interpreter, this one may have loaded submodules already
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join([gendir, ROOT]))
+	subprocess.run([sys.executable, '-c', LAZY], env=env, check=True)
+
+def test_submodules(package):
+	ping = package.status.sb.ping
+	assert package.status.sb.load(encode(ping(42)))[0].timestamp == 42
+	assert type(ping(42)).__module__ == 'split_proto._status'
+
+	move = package.play315.sb.player.move(1.0, 2.0, 3.0, True)
+	out, _ = package.play315.sb.load(encode(move))
+	assert out.y == 2.0 and pickle.loads(pickle.dumps(out)).z == 3.0
+
+def test_names(package):
+	assert {'handshake', 'status', 'login', 'play315'} <= set(dir(package))
+	with pytest.raises(AttributeError):
+		package.nope
@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+from mcproto.lib import StringCache, DecodeError
+
+SCHEMA = """
+namespace t {
+	type pkt {
+		id : varint;
+		variant a { id=1; name : string nul; wide : string nul utf16; after : ushort; };
+		variant b { id=2; w : string short utf16; fixed : string 3 utf16; tail : string; };
+		variant c { id=3; nick : string; items : array varint (string nul); x : byte; };
+	};
+};
+"""
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def strings(request, generate):
+	return generate('strings_%s' % request.param, source=SCHEMA, tier=request.param,
+			interned=['t.pkt.c.nick'], cache_size=2)
+
+def test_round_trip(strings):
+	t = strings.t
+	for packet in (t.pkt.a('h\xe9llo', 'w\xedde\U0001F600Ā', 7), t.pkt.b('ab\U0001F600', 'xyz', 'tail'),
+		       t.pkt.c('steve', ['a', '', 'ccc'], -3)):
+		data = encode(packet)
+		for buf in (data, bytearray(data), memoryview(data)):
+			out, off = t.pkt.load(buf)
+			assert off == len(data) and vars(out) == vars(packet)
+
+def test_encodings(strings):
+	t = strings.t
+	assert encode(t.pkt.a('ab', 'c', 1)) == b'\x01ab\x00\x00c\x00\x00\x00\x01'
+	# utf16 lengths count code units, a surrogate pair is two
+	assert encode(t.pkt.b('\U0001F600', 'xyz', ''))[:7] == b'\x02\x00\x02\xd8\x3d\xde\x00'
+
+def test_interned(strings):
+	t = strings.t
+	data = encode(t.pkt.c('steve', [], 0))
+	first = t.pkt.load(data)[0].nick
+	assert t.pkt.load(bytearray(data))[0].nick is first
+	cache = strings._strings0
+	assert isinstance(cache, StringCache) and len(cache) == 1
+	for name in ('alex', 'herobrine', 'notch'):
+		t.pkt.load(encode(t.pkt.c(name, [], 0)))
+	# bounded, the oldest is dropped first
+	assert len(cache) == 2 and b'steve' not in cache.strings
+
+def test_cache():
+	cache = StringCache(size=1)
+	assert cache.get(b'abc') is cache.get(b'abc')
+	assert cache.load(lambda buf, off: (buf[off], off + 1), b'\x02hi') == ('hi', 3)
+	with pytest.raises(DecodeError):
+		cache.get(b'\xff')
+
+def test_strict(generate):
+	t = generate('strings_strict', source=SCHEMA, interned=['t.pkt.c.nick'], cache_size=2).t
+	with pytest.raises(ValueError):
+		encode(t.pkt.a('a\x00b', '', 0))
+	with pytest.raises(ValueError):
+		encode(t.pkt.b('', 'xy', ''))
+	# no terminator
+	with pytest.raises(DecodeError):
+		t.pkt.load(b'\x01abc')
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from mcproto.lib import Transcoder, DecodeError
+
+from conftest import MC315
+
+# the changes of the next version
+CHANGES = [
+	('x, y, z, r : float;', 'x, y, z, r : float; power : varint;'),
+	('id=0x25;\n\t\t\t\t\tentity : varint;\n\t\t\t\t\tdx, dy, dz : short;',
+	 'id=0x25;\n\t\t\t\t\tentity : varint;\n\t\t\t\t\tdx : int; dy, dz : short;'),
+	('id=0x1f;\n\t\t\t\ttimestamp', 'id=0x70;\n\t\t\t\ttimestamp'),
+	('id=0x1a;\n\t\t\t\tmessage : string;', 'id=0x1a;\n\t\t\t\tmessage : varint;'),
+]
+
+def encode(packet):
+	f = io.BytesIO()
+	packet.dump(f)
+	return f.getvalue()
+
+@pytest.fixture(scope='module', params=['strict', 'trusted'])
+def versions(request, generate, tmp_path_factory):
+	with open(MC315) as f:
+		src = f.read().replace('play315', 'play316')
+	for old, new in CHANGES:
+		assert src.count(old) == 1, old
+		src = src.replace(old, new)
+	path = tmp_path_factory.mktemp('mc316') / 'mc316.mcproto'
+	path.write_text(src)
+
+	return generate('transcode_%s' % request.param, srcs=(MC315, str(path)), tier=request.param,
+			transcoders=[('play315.cb', 'play316.cb'), ('play316.sb', 'play315.sb')])
+
+def test_id_changed(versions):
+	old, new = versions.play315, versions.play316
+	transcoder = versions.play315_cb_to_play316_cb
+	data = encode(old.cb.client.keepalive(99))
+	out = bytes(transcoder(data))
+	assert out[0] == 0x70 and out[1:] == data[1:]
+	packet, _ = new.cb.load(out)
+	assert type(packet) is new.cb.client.keepalive and packet.timestamp == 99
+
+def test_converted(versions):
+	old, new = versions.play315, versions.play316
+	transcoder = versions.play315_cb_to_play316_cb
+	explosion = old.cb.world.explosion(1.0, 2.0, 3.0, 4.0, [], 0.5, 0.25, 0.125)
+	packet, _ = new.cb.load(transcoder(encode(explosion)))
+	# new fields take a default
+	assert (packet.x, packet.power, packet.vz) == (1.0, 0, 0.125)
+
+	move = old.cb.world.entity.move(5, -3, 2, 1, True)
+	packet, _ = new.cb.load(transcoder(encode(move)))
+	assert (packet.dx, packet.dy) == (-3, 2)
+	assert transcoder.convert(move).dx == -3
+
+def test_unchanged(versions):
+	old, new = versions.play315, versions.play316
+	transcoder = versions.play316_sb_to_play315_sb
+	data = encode(new.sb.player.use_entity.interact_at(7, 1.0, 2.0, 3.0, 1))
+	assert bytes(transcoder(data)) == data
+	# copied packets are not decoded, they need no converter
+	assert not any(cls.__qualname__.startswith('play316.sb.player.use_entity')
+		       for cls in transcoder.converters)
+	packet, _ = old.sb.load(bytes(transcoder(data)))
+	assert type(packet) is old.sb.player.use_entity.interact_at and packet.hand == 1
+
+def test_unconvertible(versions):
+	old = versions.play315
+	transcoder = versions.play315_cb_to_play316_cb
+	kick = old.cb.client.kick('bye')
+	assert type(kick) not in transcoder.converters
+	with pytest.raises(ValueError):
+		transcoder(encode(kick))
+
+	dropping = Transcoder(transcoder.source, transcoder.ids, transcoder.converters, 'drop')
+	assert dropping(encode(kick)) is None and dropping.convert(kick) is None
+	with pytest.raises(ValueError):
+		Transcoder(transcoder.source, {}, {}, 'ignore')
+
+def test_unknown_id(versions):
+	with pytest.raises(DecodeError):
+		versions.play315_cb_to_play316_cb(b'\x7f\x00')
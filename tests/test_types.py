@@ -0,0 +1,70 @@
+import gc
+
+from mcproto import MCProtoCompiler, MCProtoTypePool
+
+from conftest import MC315
+
+SCHEMA = """
+namespace t {
+	type a {
+		name : string;
+		data : bytes;
+		items : array varint { x : int; };
+	};
+	type b {
+		name : string;
+		other : bytes;
+	};
+};
+"""
+
+def field_type(namespace, path, name):
+	obj = namespace
+	for part in path.split('.'):
+		obj = obj[part]
+	return obj.fields[name].field_type
+
+def test_interned_per_compiler():
+	first = MCProtoCompiler()
+	first.compile('<t>', SCHEMA)
+	second = MCProtoCompiler()
+	second.compile('<t>', SCHEMA)
+
+	# equal specs share a type within a compiler, not across compilers
+	assert field_type(first.namespace, 't.a', 'name') is field_type(first.namespace, 't.b', 'name')
+	assert field_type(first.namespace, 't.a', 'data') is field_type(first.namespace, 't.b', 'other')
+	assert field_type(first.namespace, 't.a', 'name') is not field_type(second.namespace, 't.a', 'name')
+	assert first.pool is not second.pool
+
+	stats = first.pool.stats()
+	assert stats['hits'] >= 2 and stats['misses'] == len(first.pool) == stats['types']
+	assert stats['by_type']['MCProtoStringType'] == 1
+
+def test_shared_pool():
+	pool = MCProtoTypePool()
+	first = MCProtoCompiler(pool)
+	first.compile('<t>', SCHEMA)
+	second = MCProtoCompiler(pool)
+	second.compile('<t>', SCHEMA)
+	assert field_type(first.namespace, 't.a', 'name') is field_type(second.namespace, 't.a', 'name')
+
+def test_pool_is_weak():
+	compiler = MCProtoCompiler()
+	compiler.compile(MC315)
+	pool = compiler.pool
+	assert len(pool) > 0
+
+	del compiler
+	gc.collect()
+	assert len(pool) == 0
+
+def test_pool_is_weak_with_struct_arrays():
+	# array types hold their struct, which holds its namespace
+	pool = MCProtoTypePool()
+	compiler = MCProtoCompiler(pool)
+	compiler.compile('<t>', SCHEMA)
+	assert pool.stats()['by_type']['MCProtoArrayType'] == 1
+
+	del compiler
+	gc.collect()
+	assert len(pool) == 0